@@ -0,0 +1,342 @@
+"""
+Benchmarks of stats, storage and chart hot paths on synthetic outage histories.
+
+Every case is timed `repeat` times (best run is reported) and run once more under tracemalloc for peak memory.
+Results are compared with `benchmarks/baseline.json`, and the script exits with non-zero status when any case is
+slower or takes more memory than baseline by more than `--tolerance`, or takes more memory than its budget:
+
+    poetry run python benchmarks/run.py
+    poetry run python benchmarks/run.py --filter chart
+    poetry run python benchmarks/run.py --update  # store current results as new baseline
+
+Times are not compared as they are: calibration, plain Python code that does not change with the bot, is timed
+right before every run of a case, and baseline time of the case is scaled by how much faster or slower calibration
+ran than when baseline was stored. So a case fails when it got slower relative to the machine it runs on, however
+fast the machine is or how busy it was meanwhile, and the same baseline serves a laptop and a CI runner. Peak memory
+is what tracemalloc sees, it does not depend on the machine and is compared as it is; memory allocated by
+C libraries (matplotlib's Agg buffers) is not counted.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from time import perf_counter, time
+from typing import Callable, NamedTuple
+from unittest.mock import AsyncMock
+
+os.environ.setdefault("API_TOKEN", "benchmark")
+os.environ.setdefault("CHAT_ID", "@benchmark")
+os.environ.setdefault("IP_TO_CHECK", "10.0.0.1")
+
+from electricitybot.bot import ElectricityChecker, UKRAINE_TZ  # noqa: E402
+from electricitybot.chart import build_chart, build_report  # noqa: E402
+from electricitybot.intervals import daily_stats  # noqa: E402
+from electricitybot.settings import Target  # noqa: E402
+from electricitybot.simulation import Simulation, Timeline  # noqa: E402
+from electricitybot.storage import OutageStore  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+TARGET = Target(ip_to_check="10.0.0.1", chat_id="@benchmark")
+# differences smaller than these are noise whatever the ratio is
+NOISE = {"seconds": 1e-4, "peak_bytes": 64 * 1024}
+# reports are rendered on small hosts next to the bot, heatmap must not be resampled to figure pixels again
+REPORT_MEMORY_BUDGET = 16 * 1024 * 1024
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+class Case(NamedTuple):
+    name: str
+    # returns function to time, called before every run so runs do not affect each other
+    setup: Callable[[], Callable[[], object]]
+    # calls of timed function per run, for cases too fast to time one call
+    number: int = 1
+    # peak memory the case must fit into whatever the baseline is
+    max_peak_bytes: int | None = None
+
+
+def calibration() -> Callable[[], object]:
+    """
+    Machine speed reference: sorting, arithmetic and dict lookups in plain Python, about what stats and storage
+    code spends its time on.
+    """
+    generator = random.Random(0)
+    values = [generator.random() for _ in range(50_000)]
+
+    def run():
+        counts: dict[int, int] = {}
+        for value in sorted(values):
+            bucket = int(value * 1000)
+            counts[bucket] = counts.get(bucket, 0) + 1
+        return sum(count * count for count in counts.values())
+
+    return run
+
+
+def outage_history(since: float, until: float, seed: int) -> list[tuple[float, float]]:
+    """
+    Random outages between `since` and `until`: few hours long with few hours of power between them,
+    and a multi-day outage now and then.
+    """
+    generator = random.Random(seed)
+    intervals = []
+    at = since + generator.uniform(0, 6 * HOUR)
+    while at < until:
+        if generator.random() < 0.01:
+            length = generator.uniform(1, 4) * DAY
+        else:
+            length = generator.uniform(0.5, 6) * HOUR
+        intervals.append((at, min(at + length, until)))
+        at += length + generator.uniform(1, 20) * HOUR
+    return intervals
+
+
+def fill_store(path: str, intervals: list[tuple[float, float]]):
+    store = OutageStore(path)
+    for start, end in intervals:
+        store.append(TARGET.ip_to_check, False, start)
+        store.append(TARGET.ip_to_check, True, end)
+    store.close()
+
+
+class Histories:
+    """
+    Stores with outage history of a week, a year and 10 years up to now, created once and copied for every run.
+    """
+
+    spans = {"week": 7, "year": 365, "10y": 3652}
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.now = time()
+        self.intervals = {
+            name: outage_history(self.now - days * DAY, self.now, seed=days) for name, days in self.spans.items()
+        }
+        self.paths = {}
+        for name, intervals in self.intervals.items():
+            self.paths[name] = os.path.join(directory, f"{name}.sqlite3")
+            fill_store(self.paths[name], intervals)
+        self.copies = 0
+
+    def store(self, name: str) -> OutageStore:
+        self.copies += 1
+        path = os.path.join(self.directory, f"copy-{self.copies}.sqlite3")
+        shutil.copy(self.paths[name], path)
+        return OutageStore(path)
+
+    def checker(self, name: str) -> ElectricityChecker:
+        checker = ElectricityChecker(TARGET, tg_bot=AsyncMock(), store=self.store(name))
+        checker.stats_due = lambda: True
+        return checker
+
+    def week_intervals(self) -> tuple[list[tuple[float, float]], object, object]:
+        today = datetime.now(UKRAINE_TZ).date()
+        first_day, last_day = today - timedelta(days=7), today - timedelta(days=1)
+        since = UKRAINE_TZ.localize(datetime.combine(first_day, datetime.min.time())).timestamp()
+        until = UKRAINE_TZ.localize(datetime.combine(today, datetime.min.time())).timestamp()
+        intervals = [
+            (max(start, since), min(end, until))
+            for start, end in self.intervals["year"]
+            if end > since and start < until
+        ]
+        return intervals, first_day, last_day
+
+
+def dst_week() -> list[tuple[float, float]]:
+    """
+    Outages of a week with DST change (2025-10-26 is 25 hours long in Kyiv) and one outage lasting over it.
+    """
+    since = UKRAINE_TZ.localize(datetime(2025, 10, 22)).timestamp()
+    until = UKRAINE_TZ.localize(datetime(2025, 10, 29)).timestamp()
+    intervals = outage_history(since, until, seed=2025)
+    dst_outage_start = UKRAINE_TZ.localize(datetime(2025, 10, 25, 22)).timestamp()
+    intervals = [(start, end) for start, end in intervals if end < dst_outage_start or start > dst_outage_start + DAY]
+    return sorted(intervals + [(dst_outage_start, dst_outage_start + DAY)])
+
+
+def report(intervals: list[tuple[float, float]], days: int, renderer: str):
+    today = datetime.now(UKRAINE_TZ).date()
+    first_day, last_day = today - timedelta(days=days), today - timedelta(days=1)
+    return lambda: build_report(intervals, first_day, last_day, renderer=renderer)
+
+
+def cases(histories: Histories) -> list[Case]:
+    def save_stat():
+        checker = histories.checker("year")
+
+        def run():
+            checker.save_stat(False)
+            checker.save_stat(True)
+
+        return run
+
+    def stats_tick(name: str):
+        checker = histories.checker(name)
+        return lambda: asyncio.run(checker.stats_tick())
+
+    def intervals(name: str):
+        store = histories.store(name)
+        return lambda: store.intervals(TARGET.ip_to_check)
+
+    def history(name: str):
+        store = histories.store(name)
+        return lambda: store.history(TARGET.ip_to_check)
+
+    def compact(name: str):
+        store = histories.store(name)
+        cutoff = UKRAINE_TZ.localize(
+            datetime.combine(datetime.now(UKRAINE_TZ) - timedelta(days=90), datetime.min.time())
+        )
+        return lambda: store.compact(TARGET.ip_to_check, cutoff.timestamp())
+
+    def chart(renderer: str):
+        intervals, first_day, last_day = histories.week_intervals()
+        return lambda: build_chart(intervals, first_day, last_day, renderer=renderer)
+
+    def append():
+        store = histories.store("week")
+        events = iter(range(10**9))
+        return lambda: store.append(TARGET.ip_to_check, bool(next(events) % 2), histories.now)
+
+    def simulate(days: int):
+        since = UKRAINE_TZ.localize(datetime(2025, 10, 1)).timestamp()
+        timeline = Timeline.generate(since, since + days * DAY, seed=days, noise=0.01)
+        return lambda: Simulation(timeline, since, since + days * DAY).run()
+
+    def stats(intervals: list[tuple[float, float]]):
+        return lambda: lambda: daily_stats(intervals, UKRAINE_TZ)
+
+    return [
+        Case("save_stat[year]", save_stat, number=100),
+        *(Case(f"stats_tick[{name}]", lambda name=name: stats_tick(name)) for name in Histories.spans),
+        Case("build_chart[matplotlib]", lambda: chart("matplotlib")),
+        Case("build_chart[lite]", lambda: chart("lite")),
+        # the same year of outages, month and year reports differ only in days drawn
+        Case(
+            "build_report[month,matplotlib]",
+            lambda: report(histories.intervals["year"], 30, "matplotlib"),
+            max_peak_bytes=REPORT_MEMORY_BUDGET,
+        ),
+        Case(
+            "build_report[year,matplotlib]",
+            lambda: report(histories.intervals["year"], 365, "matplotlib"),
+            max_peak_bytes=REPORT_MEMORY_BUDGET,
+        ),
+        Case("build_report[month,lite]", lambda: report(histories.intervals["year"], 30, "lite")),
+        Case("build_report[year,lite]", lambda: report(histories.intervals["year"], 365, "lite")),
+        Case("storage.append", append, number=200),
+        *(Case(f"storage.intervals[{name}]", lambda name=name: intervals(name)) for name in Histories.spans),
+        *(Case(f"storage.history[{name}]", lambda name=name: history(name)) for name in Histories.spans),
+        Case("storage.compact[10y]", lambda: compact("10y")),
+        Case("daily_stats[dst-week]", stats(dst_week()), number=100),
+        Case("daily_stats[10y]", stats(histories.intervals["10y"])),
+        # whole pipeline, a month of probes at adaptive interval
+        Case("simulate[month]", lambda: simulate(30)),
+    ]
+
+
+def measure(case: Case, repeat: int) -> dict:
+    reference = calibration()
+    seconds, calibration_seconds = [], []
+    for _ in range(repeat):
+        started = perf_counter()
+        reference()
+        calibration_seconds.append(perf_counter() - started)
+
+        function = case.setup()
+        started = perf_counter()
+        for _ in range(case.number):
+            function()
+        seconds.append((perf_counter() - started) / case.number)
+
+    function = case.setup()
+    tracemalloc.start()
+    for _ in range(case.number):
+        function()
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {"seconds": min(seconds), "calibration": min(calibration_seconds), "peak_bytes": peak_bytes}
+
+
+def expected(baseline: dict, result: dict) -> dict:
+    """
+    Baseline of a case on this machine: its time scaled by how long calibration took with the case now and when
+    baseline was stored.
+    """
+    return {
+        "seconds": baseline["seconds"] * result["calibration"] / baseline["calibration"],
+        "calibration": result["calibration"],
+        "peak_bytes": baseline["peak_bytes"],
+    }
+
+
+def over_budget(case: Case, result: dict) -> list[str]:
+    if case.max_peak_bytes is None or result["peak_bytes"] <= case.max_peak_bytes:
+        return []
+    return [f"peak_bytes over budget of {case.max_peak_bytes / 1024:.0f} KiB"]
+
+
+def compare(result: dict, baseline: dict | None, tolerance: float) -> list[str]:
+    if baseline is None:
+        return []
+    return [
+        f"{metric} {result[metric] / baseline[metric]:.2f}x of baseline"
+        for metric in ("seconds", "peak_bytes")
+        if result[metric] > baseline[metric] * (1 + tolerance) and result[metric] - baseline[metric] > NOISE[metric]
+    ]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="run only cases with this substring in name")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs of every case, best one is reported")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown, 0.5 is 50%%")
+    parser.add_argument("--update", action="store_true", help="store results as new baseline")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    results = {}
+    regressions = 0
+    with tempfile.TemporaryDirectory() as directory:
+        histories = Histories(directory)
+        print(f"{'case':<34} {'time, ms':>10} {'baseline':>10} {'peak, KiB':>10} {'baseline':>10}")
+        for case in cases(histories):
+            if args.filter not in case.name:
+                continue
+            result = results[case.name] = measure(case, args.repeat)
+            case_baseline = expected(baseline[case.name], result) if case.name in baseline else None
+            problems = over_budget(case, result) + (
+                [] if args.update else compare(result, case_baseline, args.tolerance)
+            )
+            regressions += bool(problems)
+            print(
+                f"{case.name:<34} {result['seconds'] * 1000:>10.3f}"
+                f" {case_baseline['seconds'] * 1000 if case_baseline else float('nan'):>10.3f}"
+                f" {result['peak_bytes'] / 1024:>10.1f}"
+                f" {case_baseline['peak_bytes'] / 1024 if case_baseline else float('nan'):>10.1f}"
+                + ("  SLOWER: " + ", ".join(problems) if problems else "")
+            )
+
+    if args.update and not regressions:
+        with open(BASELINE, "w") as baseline_file:
+            json.dump({**baseline, **results}, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+        return 0
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
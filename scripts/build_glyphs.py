@@ -0,0 +1,51 @@
+"""
+Builds glyph atlas used by lite chart renderer (src/electricitybot/glyphs.bin).
+
+Glyphs are rasterized from DejaVu Sans shipped with matplotlib, so this script needs matplotlib and pillow,
+while the renderer itself needs neither. Run it again only when character set or sizes should change:
+
+    poetry run python scripts/build_glyphs.py
+"""
+
+import os
+import struct
+import zlib
+
+import matplotlib
+from PIL import Image, ImageDraw, ImageFont
+
+SIZES = (11, 14, 22)
+CHARACTERS = (
+    [chr(code) for code in range(0x20, 0x7F)]
+    + [chr(code) for code in range(0x400, 0x460)]
+    + ["Ґ", "ґ", "’", "–", "—", "«", "»", "№", "°"]
+)
+OUTPUT = os.path.join(os.path.dirname(__file__), "..", "src", "electricitybot", "glyphs.bin")
+
+
+def build_font(size: int) -> bytes:
+    font = ImageFont.truetype(os.path.join(matplotlib.get_data_path(), "fonts", "ttf", "DejaVuSans.ttf"), size)
+    ascent, descent = font.getmetrics()
+    glyphs = []
+    for character in CHARACTERS:
+        x0, y0, x1, y1 = font.getbbox(character, anchor="ls")
+        width, height = max(x1 - x0, 0), max(y1 - y0, 0)
+        image = Image.new("L", (width, height))
+        if width and height:
+            ImageDraw.Draw(image).text((-x0, -y0), character, font=font, fill=255, anchor="ls")
+        glyphs.append(
+            struct.pack("<IHhhHH", ord(character), round(font.getlength(character) * 64), x0, y0, width, height)
+            + image.tobytes()
+        )
+
+    return struct.pack("<HHHH", size, ascent, descent, len(glyphs)) + b"".join(glyphs)
+
+
+def main():
+    fonts = [build_font(size) for size in SIZES]
+    with open(OUTPUT, "wb") as output:
+        output.write(zlib.compress(b"EBG1" + struct.pack("<B", len(fonts)) + b"".join(fonts), 9))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,8 @@
-from .bot import ElectricityChecker
+def __getattr__(name: str):
+    # bot module is loaded on first use, so probe process does not import Telegram along with the package
+    if name != "ElectricityChecker":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# flake8: noqa
+    from .bot import ElectricityChecker
+
+    return ElectricityChecker
@@ -1,24 +1,70 @@
 import asyncio
-import shelve
-import subprocess
+import calendar
+import logging
+import multiprocessing
+import os
 from datetime import date, datetime, timedelta
-from time import sleep, time
-from typing import Any
+from multiprocessing.process import BaseProcess
+from typing import NamedTuple, TYPE_CHECKING
 
-import pytz
-import telegram
+from electricitybot.clock import Clock, wall_clock
+from electricitybot.commands import CommandHandler, REPORT_PERIODS
+from electricitybot.detector import run_probe, TargetDetector, watch_process
+from electricitybot.intervals import DailyStats, UKRAINE_TZ
+from electricitybot.metrics import serve_metrics
+from electricitybot.outbox import Outbox
+from electricitybot.profiling import install_signal_handler, profiled
+from electricitybot.scheduler import run_every
+from electricitybot.settings import settings, Target
+from electricitybot.storage import OutageStore
 
-from electricitybot.chart import build_chart
-from electricitybot.settings import settings
+if TYPE_CHECKING:  # pragma: no cover
+    import telegram
 
-UKRAINE_TZ = pytz.timezone("Europe/Kyiv")  # <3
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+
+def telegram_bot() -> "telegram.Bot":
+    import telegram
+    from telegram.request import HTTPXRequest
+
+    # concurrent sends to several chats share one sized connection pool
+    return telegram.Bot(
+        token=settings.api_token, request=HTTPXRequest(connection_pool_size=settings.telegram_pool_size)
+    )
+
+
+class LazyTelegramBot:
+    """
+    Telegram bot created on first call of its methods. python-telegram-bot with httpx is the largest part
+    of start time and memory of the bot, so they are loaded when the first message is sent, not before the first probe.
+    """
+
+    def __init__(self):
+        self._bot: "telegram.Bot | None" = None
+
+    def __getattr__(self, name: str):
+        if self._bot is None:
+            self._bot = telegram_bot()
+        return getattr(self._bot, name)
 
 
 class PowerOutageInterval:
+    __slots__ = ("_start_time", "_end_time")
+
     def __init__(self, start_time: datetime, end_time: datetime | None = None):
         self._start_time = start_time
         self._end_time = end_time
 
+    def __getstate__(self):
+        return {"_start_time": self._start_time, "_end_time": self._end_time}
+
+    def __setstate__(self, state: dict):
+        # same state as pickled __dict__ of previous versions, so their shelves stay readable
+        self._start_time = state["_start_time"]
+        self._end_time = state.get("_end_time")
+
     def __repr__(self):
         return f"{self.__class__.__name__} (start_time={self.start_time}, end_time={self.end_time})"
 
@@ -34,149 +80,577 @@ class PowerOutageInterval:
         self._end_time = end_time
 
 
+def format_duration(seconds: float) -> str:
+    return f"{int(seconds // 3600)} год. {int(seconds % 3600) // 60} хв."
+
+
+class WeeklyChart(NamedTuple):
+    """
+    Everything weekly chart is rendered from.
+    """
+
+    intervals: list[tuple[float, float]]
+    first_day: date
+    last_day: date
+    title: str
+    renderer: str
+    stats: list[DailyStats]
+
+
+class Report(NamedTuple):
+    """
+    Everything monthly or yearly report is rendered from.
+    """
+
+    intervals: list[tuple[float, float]]
+    first_day: date
+    last_day: date
+    title: str
+    renderer: str
+    stats: list[DailyStats]
+    hourly_since: date | None
+
+
+def report_first_day(period: str, stats_day: date) -> date:
+    """
+    Same day of the month (or year) before `stats_day`, or the last day of that month when it is shorter.
+    """
+    year, month = (stats_day.year, stats_day.month - 1) if period == "month" else (stats_day.year - 1, stats_day.month)
+    if not month:
+        year, month = year - 1, 12
+    return date(year, month, min(stats_day.day, calendar.monthrange(year, month)[1]))
+
+
 class ElectricityChecker:
     power_messages = {
         True: "🔋Є світло",
         False: "🪫Відключено електропостачання",
     }
 
-    def __init__(self):
-        self._loop = asyncio.new_event_loop()
-        self.chat_id = settings.chat_id
-        self.ip_to_check = settings.ip_to_check
-        self.retries_count = settings.retries_count
+    def __init__(
+        self,
+        target: Target | None = None,
+        tg_bot: "telegram.Bot | LazyTelegramBot | None" = None,
+        store: OutageStore | None = None,
+        outbox: Outbox | None = None,
+        clock: Clock = wall_clock,
+    ):
+        self.clock = clock
+        # previous versions kept history of the only address in shelve, that is the checker without explicit target
+        migrate_shelve = target is None
+        target = target or settings.default_target
+        self.chat_id = target.chat_id
+        self.ip_to_check = target.ip_to_check
+        self.key = target.ip_to_check
+        self.store = store or OutageStore(settings.storage_path, clock=clock)
+        if migrate_shelve:
+            self.store.migrate_shelve(self.key, "power_outage_intervals")
+        self.thread_id = target.thread_id
+        self.destinations = [(self.chat_id, self.thread_id)] + [
+            (destination.chat_id, destination.thread_id) for destination in target.destinations
+        ]
+        self.label = target.label
+        self.chart_title = target.chart_title or (
+            f"Статистика світла (за адресою {self.label}) за тиждень" if self.label else "Статистика світла за тиждень"
+        )
+        self.report_titles = {
+            period: (
+                f"Статистика світла (за адресою {self.label}) за {name}"
+                if self.label
+                else f"Статистика світла за {name}"
+            )
+            for period, name in REPORT_PERIODS.items()
+        }
         self.timeout = settings.timeout
-        self.thread_id = settings.thread_id
-        self.tg_bot = telegram.Bot(token=settings.api_token)
-        self.previous_e_state = self.check_electricity()
+        self.tg_bot = tg_bot or LazyTelegramBot()
+        self.outbox = outbox
+        # probes are not scheduled by worker of split mode, its detector only reads probe log of the probe process
+        self.detector = TargetDetector(target, self.store, self.apply_state, clock)
+        self.previous_e_state: bool | None = None
         self.last_state_change_time = None
+        self.restore_state()
         self.stats_last_send_date = None
+        self.compacted_date: date | None = None
+        # start of the current hour in Kyiv and its timestamp
+        self._hour: tuple[datetime, float] | None = None
+        self.rendered_chart: tuple[WeeklyChart, bytes] | None = None
+        # (stats day of week and hour, next stats time, its timestamp)
+        self._next_stats_time: tuple[tuple[int, int], datetime, float] | None = None
+        # answers to commands: (read at, today's stats, start of outage going on) and (day, chart of week before it)
+        self.today_cache: tuple[float, DailyStats, float | None] | None = None
+        self.week_cache: tuple[date, bytes | None] | None = None
+        self.report_cache: dict[str, tuple[date, bytes | None]] = {}
+
+    def restore_state(self):
+        """
+        Takes state saved before restart instead of probing on start: durations go on, and the first probes
+        are compared with it by the detector, so a change that happened while the bot was down is announced and stored.
+        """
+        snapshot = self.store.runtime_state(self.key)
+        if snapshot is None:
+            return
+
+        self.previous_e_state = snapshot.state
+        self.last_state_change_time = snapshot.changed_at
+
+    async def apply_state(self, current_e_state: bool, at: float | None = None):
+        """
+        First known state is taken silently, a different one is announced. `at` is when the state was decided,
+        now by default.
+        """
+        if self.previous_e_state is None:
+            self.previous_e_state = current_e_state
+            self.store.save_runtime_state(self.key, current_e_state, None)
+        elif self.previous_e_state != current_e_state:
+            await self.notify(current_e_state, at)
 
-    @property
-    def db(self) -> shelve.Shelf[Any]:
-        return shelve.open("power_outage_intervals")
-
-    def ping(self) -> bool:
-        result = subprocess.run(["ping", "-c", "1", self.ip_to_check], capture_output=True)
-        return result.returncode == 0
-
-    def check_electricity(self) -> bool:
-        if not self.ping():
-            for i in range(self.retries_count):
-                sleep(settings.sleep_between_retry)
-                if self.ping():
-                    return True
-            return False
-        else:
-            return True
-
-    def build_message(self, current_e_state: bool) -> str:
+    def build_message(self, current_e_state: bool, at: float | None = None) -> str:
         message = self.power_messages[current_e_state]
+        if self.label:
+            message = f"{self.label}: {message}"
         if self.last_state_change_time:
-            delay = time() - self.last_state_change_time
-            delay_hours = int(delay // 3600)
-            delay_minutes = int(delay % 3600) // 60
-            stat = f"{delay_hours} год. {delay_minutes} хв."
+            stat = format_duration((at or self.clock()) - self.last_state_change_time)
             message += f"\n(світла не було {stat})" if current_e_state else f"\n(світло було {stat})"
 
         return message
 
-    def save_stat(self, current_e_state: bool):
-        intervals: list[PowerOutageInterval] = self.db.get("intervals", [])
+    def save_stat(self, current_e_state: bool, at: float | None = None):
         if not current_e_state:
-            intervals.append(PowerOutageInterval(datetime.now(UKRAINE_TZ)))
-        elif intervals:
-            last_interval = intervals[-1]
-            if not last_interval.end_time:
-                last_interval.finalize(datetime.now(UKRAINE_TZ))
-
-        self.db["intervals"] = intervals
+            self.store.append(self.key, current_e_state, at or self.clock())
+        else:
+            last_event = self.store.last_event(self.key)
+            if last_event and not last_event[1]:
+                self.store.append(self.key, current_e_state, at or self.clock())
 
-    def check_and_send_stats(self):
-        ukraine_now = datetime.now(UKRAINE_TZ)
-        week_ago = UKRAINE_TZ.localize(datetime.combine(ukraine_now - timedelta(days=7), datetime.min.time()))
-        day_start = UKRAINE_TZ.localize(datetime.combine(ukraine_now, datetime.min.time()))
+    def stats_due(self) -> bool:
+        hour = self.ukraine_hour()
 
         if not self.stats_last_send_date:
-            self.stats_last_send_date: date = self.db.get(
-                "stats_last_sent_date", (ukraine_now - timedelta(days=1)).date()
+            stats_last_sent_date = self.store.get_value(self.key, "stats_last_sent_date")
+            self.stats_last_send_date: date = (
+                date.fromisoformat(stats_last_sent_date) if stats_last_sent_date else (hour - timedelta(days=1)).date()
             )
 
-        if (
-            ukraine_now.date() != self.stats_last_send_date
-            and ukraine_now.isoweekday() == settings.stats_day_of_week
-            and ukraine_now.hour == settings.stats_hour
-        ):
-            self.db["stats_last_sent_date"] = ukraine_now.date()
-            self.stats_last_send_date = ukraine_now.date()
-
-            intervals: list[PowerOutageInterval] = self.db.get("intervals", [])
-            filtered_intervals = []
-            intervals_to_save = []
-            if intervals:
-                for i in range(7):
-                    dummy_interval = week_ago + timedelta(days=i)
-                    intervals.append(PowerOutageInterval(dummy_interval, dummy_interval))
-
-                for interval in intervals:
-                    # cut out intervals to work only with past week
-                    if interval.start_time.date() < week_ago.date():
-                        if interval.end_time.date() < week_ago.date():
-                            continue
-
-                        new_interval = PowerOutageInterval(week_ago, interval.end_time)
-                        interval = new_interval
-
-                    if interval.start_time.date() < ukraine_now.date():
-                        if interval.end_time.date() >= ukraine_now.date():
-                            new_interval = PowerOutageInterval(day_start, interval.end_time)
-                            intervals_to_save.append(new_interval)
-
-                            interval.finalize(day_start)
-
-                        filtered_intervals.append((interval.start_time, interval.end_time))
-                    else:
-                        intervals_to_save.append(interval)
-
-            if filtered_intervals:
-                stats_image = build_chart(filtered_intervals)
-                self._loop.run_until_complete(
-                    self.tg_bot.send_photo(
-                        chat_id=self.chat_id,
-                        message_thread_id=self.thread_id,
-                        disable_notification=True,
-                        caption="📊Статистика світла за тиждень",
-                        photo=stats_image,
-                    )
-                )
-
-            self.db["intervals"] = intervals_to_save
-
-    def check_e_state_and_send(self):
-        if settings.send_weekly_stats:
-            self.check_and_send_stats()
-
-        current_e_state = self.check_electricity()
-
-        if self.previous_e_state != current_e_state:
-            if settings.send_weekly_stats:
-                self.save_stat(current_e_state)
-
-            message = self.build_message(current_e_state)
-            self._loop.run_until_complete(
-                self.tg_bot.send_message(chat_id=self.chat_id, message_thread_id=self.thread_id, text=message)
+        return (
+            hour.date() != self.stats_last_send_date
+            and hour.isoweekday() == settings.stats_day_of_week
+            and hour.hour == settings.stats_hour
+        )
+
+    def next_stats_time(self) -> datetime:
+        """
+        Start of the next stats hour, computed once and reused until it comes (or schedule changes).
+        """
+        schedule = (settings.stats_day_of_week, settings.stats_hour)
+        if self._next_stats_time and self._next_stats_time[0] == schedule and self._next_stats_time[2] > self.clock():
+            return self._next_stats_time[1]
+
+        ukraine_now = self.ukraine_now()
+        for days in range(8):
+            day = ukraine_now.date() + timedelta(days=days)
+            stats_time = UKRAINE_TZ.localize(
+                datetime.combine(day, datetime.min.time()) + timedelta(hours=settings.stats_hour)
             )
-            self.previous_e_state = current_e_state
-            self.last_state_change_time = time()
+            if day.isoweekday() == settings.stats_day_of_week and stats_time > ukraine_now:
+                self._next_stats_time = (schedule, stats_time, stats_time.timestamp())
+                return stats_time
+
+    def weekly_chart(self, stats_day: date) -> WeeklyChart:
+        """
+        Chart of the week before `stats_day`, outage going on ends at its day start (or now, if it is earlier).
+        """
+        week_ago = UKRAINE_TZ.localize(datetime.combine(stats_day - timedelta(days=7), datetime.min.time()))
+        day_start = UKRAINE_TZ.localize(datetime.combine(stats_day, datetime.min.time()))
+        return WeeklyChart(
+            self.store.clipped_intervals(self.key, week_ago.timestamp(), day_start.timestamp()),
+            week_ago.date(),
+            (day_start - timedelta(days=1)).date(),
+            self.chart_title,
+            settings.chart_renderer,
+            self.store.daily_stats(
+                self.key, week_ago.date(), day_start.date(), now=min(self.clock(), day_start.timestamp())
+            ),
+        )
+
+    async def render_weekly_chart(self, chart: WeeklyChart) -> bytes:
+        """
+        Returns chart rendered before when nothing has changed since then, renders it again otherwise.
+        """
+        if self.rendered_chart and self.rendered_chart[0] == chart:
+            return self.rendered_chart[1]
+
+        # charting code is loaded when the first chart is rendered
+        from electricitybot.chart import build_chart
+
+        # chart is rendered in a thread, so probes keep running on the loop meanwhile
+        image = await asyncio.to_thread(
+            build_chart,
+            chart.intervals,
+            chart.first_day,
+            chart.last_day,
+            title=chart.title,
+            renderer=chart.renderer,
+            stats=chart.stats,
+        )
+        self.rendered_chart = (chart, image)
+        return image
+
+    async def prerender_stats(self):
+        """
+        Renders weekly chart ahead of time, within `stats_prerender_minutes` before it is sent,
+        so sending is just an upload. Chart is rendered again only if an outage changed it meanwhile.
+        """
+        stats_time = self.next_stats_time()
+        # its timestamp is cached along with it
+        if self._next_stats_time[2] - self.clock() > settings.stats_prerender_minutes * 60:
+            return
+
+        if self.store.last_event(self.key):
+            await self.render_weekly_chart(self.weekly_chart(stats_time.date()))
+
+    async def send_stats(self):
+        ukraine_now = self.ukraine_now()
+
+        self.store.set_value(self.key, "stats_last_sent_date", ukraine_now.date().isoformat())
+        self.stats_last_send_date = ukraine_now.date()
+
+        if self.store.last_event(self.key):
+            stats_image = await self.render_weekly_chart(self.weekly_chart(ukraine_now.date()))
+            self.rendered_chart = None
+            await self.broadcast(
+                "send_photo",
+                disable_notification=True,
+                caption="📊Статистика світла за тиждень",
+                photo=stats_image,
+            )
+
+    def compact_history(self):
+        """
+        Keeps raw history only for retention window, older days stay as daily stats. Done once a day, whichever
+        stats are sent.
+        """
+        hour = self.ukraine_hour()
+        if self.compacted_date == hour.date():
+            return
+
+        retention_start = UKRAINE_TZ.localize(
+            datetime.combine(hour - timedelta(days=settings.raw_history_days), datetime.min.time())
+        )
+        self.store.compact(self.key, retention_start.timestamp())
+        self.store.set_value(self.key, "raw_history_since", retention_start.date().isoformat())
+        self.compacted_date = hour.date()
+
+    def report_due(self, period: str) -> bool:
+        """
+        Monthly report is due on the first day of month, yearly one on the first day of year, at `stats_hour`.
+        """
+        if not {"month": settings.send_monthly_stats, "year": settings.send_yearly_stats}[period]:
+            return False
+        hour = self.ukraine_hour()
+        return (
+            hour.day == 1
+            and (period == "month" or hour.month == 1)
+            and hour.hour == settings.stats_hour
+            and self.store.get_value(self.key, f"{period}_stats_last_sent_date") != hour.date().isoformat()
+        )
+
+    def report(self, period: str, stats_day: date) -> Report:
+        """
+        Report of the month or year before `stats_day`. Hourly cells are left empty for days which raw history
+        is compacted already, daily availability of them comes from daily stats.
+        """
+        raw_history_since = self.store.get_value(self.key, "raw_history_since")
+        first_day = report_first_day(period, stats_day)
+        since = UKRAINE_TZ.localize(datetime.combine(first_day, datetime.min.time()))
+        day_start = UKRAINE_TZ.localize(datetime.combine(stats_day, datetime.min.time()))
+        last_day = stats_day - timedelta(days=1)
+        return Report(
+            self.store.clipped_intervals(self.key, since.timestamp(), day_start.timestamp()),
+            first_day,
+            last_day,
+            f"{self.report_titles[period]} ({first_day:%d.%m.%Y} – {last_day:%d.%m.%Y})",
+            settings.chart_renderer,
+            self.store.daily_stats(self.key, first_day, stats_day, now=min(self.clock(), day_start.timestamp())),
+            date.fromisoformat(raw_history_since) if raw_history_since else None,
+        )
+
+    async def render_report(self, report: Report) -> bytes:
+        from electricitybot.chart import build_report
+
+        # cells are aggregated before drawing, so a year renders as fast as a month, still in a thread
+        return await asyncio.to_thread(
+            build_report,
+            report.intervals,
+            report.first_day,
+            report.last_day,
+            title=report.title,
+            renderer=report.renderer,
+            stats=report.stats,
+            hourly_since=report.hourly_since,
+        )
+
+    async def send_report(self, period: str):
+        ukraine_now = self.ukraine_now()
+        self.store.set_value(self.key, f"{period}_stats_last_sent_date", ukraine_now.date().isoformat())
+
+        if self.store.has_history(self.key):
+            await self.broadcast(
+                "send_photo",
+                disable_notification=True,
+                caption=f"📊Статистика світла за {REPORT_PERIODS[period]}",
+                photo=await self.render_report(self.report(period, ukraine_now.date())),
+            )
+
+    async def cached_report(self, period: str) -> bytes | None:
+        """
+        Report of the month or year before today, None without outage history. Rendered once a day, like week chart.
+        """
+        today = self.ukraine_now().date()
+        if self.report_cache.get(period, (None,))[0] != today:
+            image = await self.render_report(self.report(period, today)) if self.store.has_history(self.key) else None
+            self.report_cache[period] = (today, image)
+        return self.report_cache[period][1]
+
+    def today_stats(self) -> DailyStats:
+        """
+        Outages of today so far, outage going on is counted up to now.
+        """
+        today = self.ukraine_now().date()
+        stats = self.store.daily_stats(self.key, today, today + timedelta(days=1))
+        return stats[0] if stats else DailyStats(today, 0.0, 0, 0.0)
+
+    def cached_today_stats(self) -> DailyStats:
+        """
+        Today's stats are read from storage once per state change (or day), outage going on is extended up to now
+        in memory.
+        """
+        now = self.clock()
+        today = datetime.fromtimestamp(now, UKRAINE_TZ).date()
+        if self.today_cache is None or self.today_cache[1].day != today:
+            self.today_cache = (now, self.today_stats(), self.store.outage_start(self.key))
+
+        read_at, stats, outage_start = self.today_cache
+        if outage_start is None:
+            return stats
+        day_start = UKRAINE_TZ.localize(datetime.combine(today, datetime.min.time())).timestamp()
+        return stats._replace(
+            outage_seconds=stats.outage_seconds + now - read_at,
+            longest_outage=max(stats.longest_outage, now - max(outage_start, day_start)),
+        )
+
+    async def cached_week_chart(self) -> bytes | None:
+        """
+        Chart of the week before today, None without outage history. The week is over, so the chart is rendered
+        once a day.
+        """
+        today = self.ukraine_now().date()
+        if self.week_cache is None or self.week_cache[0] != today:
+            image = (
+                await self.render_weekly_chart(self.weekly_chart(today)) if self.store.last_event(self.key) else None
+            )
+            self.week_cache = (today, image)
+        return self.week_cache[1]
+
+    def status_message(self) -> str:
+        if self.previous_e_state is None:
+            message = "Стан світла ще невідомий"
+        else:
+            message = self.power_messages[self.previous_e_state]
+            if self.last_state_change_time:
+                message += f" (вже {format_duration(self.clock() - self.last_state_change_time)})"
+        return f"{self.label}: {message}" if self.label else message
+
+    def today_message(self) -> str:
+        stats = self.cached_today_stats()
+        if stats.outage_count:
+            message = (
+                f"Сьогодні світла не було {format_duration(stats.outage_seconds)}, відключень: {stats.outage_count}, "
+                f"найдовше {format_duration(stats.longest_outage)}"
+            )
+        else:
+            message = "Сьогодні відключень не було"
+        return f"{self.label}: {message}" if self.label else message
+
+    def ukraine_now(self) -> datetime:
+        return datetime.fromtimestamp(self.clock(), UKRAINE_TZ)
+
+    def ukraine_hour(self) -> datetime:
+        """
+        Start of the current hour in Kyiv. Schedule checked every stats tick depends only on date and hour,
+        so time is converted once an hour, not every tick. Kyiv offset is whole hours, so its hours start
+        with UTC ones.
+        """
+        now = self.clock()
+        if self._hour is None or not self._hour[1] <= now < self._hour[1] + HOUR:
+            start = now - now % HOUR
+            self._hour = (datetime.fromtimestamp(start, UKRAINE_TZ), start)
+        return self._hour[0]
+
+    def probe_message(self) -> str:
+        """
+        Packet loss and round trip times of probes of the last day, and the hour with most loss.
+        """
+        now = self.clock()
+        probe_log = self.detector.probe_log
+        summary = probe_log.summary(now - DAY, now) if probe_log else None
+        if not summary or not summary.probes:
+            message = "Перевірок за добу ще немає"
+        else:
+            message = f"За добу перевірок: {summary.probes}, втрачено {summary.loss:.1%}"
+            if summary.rtt_p50 is not None:
+                message += f", затримка {summary.rtt_p50 * 1000:.1f} мс (p95 {summary.rtt_p95 * 1000:.1f} мс)"
+            worst_hour = max(probe_log.hourly(now - DAY, now), key=lambda hour: hour.loss)
+            if worst_hour.loss:
+                hour_start = datetime.fromtimestamp(worst_hour.start, UKRAINE_TZ)
+                message += f"\nНайбільше втрат о {hour_start:%H:%M}: {worst_hour.loss:.0%}"
+        return f"{self.label}: {message}" if self.label else message
+
+    @profiled
+    async def stats_tick(self):
+        self.compact_history()
+        if settings.send_weekly_stats and self.stats_due():
+            await self.send_stats()
+        elif settings.send_weekly_stats:
+            await self.prerender_stats()
+
+        for period in REPORT_PERIODS:
+            if self.report_due(period):
+                await self.send_report(period)
+
+    async def send(self, method: str, coalesce_key: str | None = None, **kwargs):
+        """
+        Calls `method` of Telegram bot with `kwargs`, or puts the call to outbox when checker has one.
+        """
+        if self.outbox is not None:
+            self.outbox.put(method, coalesce_key, **kwargs)
+        else:
+            await getattr(self.tg_bot, method)(**kwargs)
+
+    async def broadcast(self, method: str, coalesce: bool = False, **kwargs):
+        """
+        Makes the same call to every destination of the target, concurrently. Photo is uploaded only once,
+        other destinations get `file_id` of the first upload.
+        """
+        calls = [dict(kwargs, chat_id=chat_id, message_thread_id=thread_id) for chat_id, thread_id in self.destinations]
+        if self.outbox is not None:
+            for index, call in enumerate(calls):
+                # first destination keeps key of single chat versions, so their last message can still be edited
+                coalesce_key = self.key if index == 0 else f"{self.key}:{call['chat_id']}:{call['message_thread_id']}"
+                self.outbox.put(method, coalesce_key if coalesce else None, **call)
+            return
+
+        if method == "send_photo" and len(calls) > 1:
+            message = await self.tg_bot.send_photo(**calls.pop(0))
+            calls = [dict(call, photo=message.photo[-1].file_id) for call in calls]
+        await asyncio.gather(*(getattr(self.tg_bot, method)(**call) for call in calls))
+
+    async def notify(self, current_e_state: bool, at: float | None = None):
+        if settings.keeps_stats:
+            self.save_stat(current_e_state, at)
+
+        message = self.build_message(current_e_state, at)
+        await self.broadcast("send_message", coalesce=True, text=message)
+        self.previous_e_state = current_e_state
+        self.last_state_change_time = at or self.clock()
+        self.store.save_runtime_state(self.key, current_e_state, self.last_state_change_time)
+        self.today_cache = None
+
+
+class ElectricityMonitor:
+    """
+    Watches all configured targets from one process. Probing, stats reports and Telegram delivery are separate tasks
+    on one event loop: every target is probed by its own task at adaptive rate, messages go through persistent
+    outbox, so a slow upload or Telegram outage never delays the next probe.
+
+    Without `probe` it is the worker of split mode: states are decided by a separate probe process
+    (`detector.ProbeProcess`) and taken from the queue in storage instead. When worker is given `probe_process`
+    it started, it stops as soon as that process exits.
+    """
+
+    def __init__(self, probe: bool = True, probe_process: BaseProcess | None = None):
+        self.probe = probe
+        self.probe_process = probe_process
+        self._loop = asyncio.new_event_loop()
+        self.timeout = settings.timeout
+        self.tg_bot = LazyTelegramBot()
+        self.store = OutageStore(settings.storage_path)
+        self.outbox = Outbox(
+            self.tg_bot,
+            self.store,
+            settings.coalesce_window,
+            max_retry_delay=settings.max_retry_delay,
+            max_concurrency=settings.telegram_pool_size,
+        )
+        self.checkers = [
+            ElectricityChecker(
+                target,
+                tg_bot=self.tg_bot,
+                store=self.store,
+                outbox=self.outbox,
+            )
+            for target in settings.targets or [None]
+        ]
+        self.commands = CommandHandler(self.tg_bot, self.checkers)
+
+    async def stats_tick(self):
+        for checker in self.checkers:
+            await checker.stats_tick()
+
+    @profiled
+    async def apply_state_changes(self):
+        """
+        Announces states queued by probe process, in order they were decided. A change is removed from the queue
+        only after it is handled, so none is lost if worker stops meanwhile.
+        """
+        checkers = {checker.key: checker for checker in self.checkers}
+        for change in self.store.state_changes():
+            if change.target in checkers:
+                await checkers[change.target].apply_state(change.state, change.time)
+            self.store.ack_state_change(change.id)
+
+    async def serve(self):
+        if self.probe:
+            tasks = [
+                run_every(checker.detector.probe_interval, checker.detector.probe_tick) for checker in self.checkers
+            ]
+        else:
+            tasks = [run_every(settings.state_poll_interval, self.apply_state_changes)]
+        if self.probe_process is not None:
+            tasks.append(watch_process(self.probe_process, settings.state_poll_interval))
+        tasks.append(self.outbox.deliver_forever())
+        if settings.keeps_stats:
+            tasks.append(run_every(self.timeout, self.stats_tick))
+        if settings.handle_commands:
+            tasks.append(self.commands.poll_forever())
+        if settings.metrics_port:
+            tasks.append(serve_metrics(settings.metrics_host, settings.metrics_port))
+
+        await asyncio.gather(*tasks)
 
     def run(self):  # pragma: no cover
-        while True:
-            self.check_e_state_and_send()
-            sleep(self.timeout)
+        self._loop.run_until_complete(self.serve())
 
 
 def run_bot():  # pragma: no cover
-    ElectricityChecker().run()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    install_signal_handler()
+    if settings.process_mode == "split":
+        # probe process is started from scratch, so it does not carry Telegram and chart modules of the worker
+        probe_process = multiprocessing.get_context("spawn").Process(
+            target=run_probe, name="electricitybot-probe", daemon=True
+        )
+        probe_process.start()
+        run_worker(probe_process)
+    else:
+        ElectricityMonitor().run()
+
+
+def run_worker(probe_process: BaseProcess | None = None):  # pragma: no cover
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    install_signal_handler()
+    # rendering and uploads give way to probe process on a busy host
+    os.nice(settings.worker_niceness)
+    ElectricityMonitor(probe=False, probe_process=probe_process).run()
 
 
 if __name__ == "__main__":  # pragma: nocover
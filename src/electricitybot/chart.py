@@ -1,9 +1,13 @@
 import io
-from collections import defaultdict
-from datetime import datetime, timedelta
+import threading
+from datetime import date
+from time import perf_counter
+from typing import NamedTuple, Sequence
 
-import matplotlib.pyplot as plt
-import pytz
+import numpy as np
+
+from electricitybot.intervals import DailyStats, hourly_outage_hours, split_by_days, UKRAINE_TZ, wall_clock_hours
+from electricitybot.metrics import CHART_RENDER, CHART_SIZE
 
 weekdays_map = {
     1: "пн.",
@@ -30,118 +34,365 @@ months_map = {
     12: "груд.",
 }
 
-UKRAINE_TZ = pytz.timezone("Europe/Kyiv")  # <3
 
+class ChartDay(NamedTuple):
+    day: date
+    outages: list[tuple[float, float]]  # (local start hour, duration in hours)
+    outage_hours: float
+    free_hours: float
+    availability: float
 
-def build_chart(intervals: list) -> bytes:  # pragma: nocover
-    def to_hours(dt):
-        return dt.hour + dt.minute / 60 + dt.second / 3600
 
-    days_data = defaultdict(list)
+class Heatmap(NamedTuple):
+    """
+    Monthly or yearly report: percent of every local hour of every day with power (NaN for days without hourly
+    history) and percent of every day with power.
+    """
 
-    for start, end in intervals:
-        current_day = start.date()
-        last_day = end.date()
+    days: list[date]
+    hourly: np.ndarray  # (days, 24)
+    daily: np.ndarray
 
-        while current_day <= last_day:
-            day_start = UKRAINE_TZ.localize(datetime.combine(current_day, datetime.min.time()))
-            day_end = day_start + timedelta(days=1)
 
-            interval_start = max(start, day_start)
-            interval_end = min(end, day_end)
+class ChartTemplate:
+    """
+    Pre-styled weekly chart figure. Figure is not registered in pyplot, so it is never leaked,
+    and only bars, percentage line and labels are redrawn on each render.
+    """
 
-            if interval_start <= interval_end:
-                start_h = to_hours(interval_start)
-                duration_h = (interval_end - interval_start).total_seconds() / 3600
-                days_data[current_day].append((start_h, duration_h))
+    def __init__(self):
+        # imported here, so lite renderer works without loading matplotlib at all
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
 
-            current_day += timedelta(days=1)
+        self.figure = Figure(figsize=(14, 10))
+        self.figure.patch.set_facecolor("#f0f0f0")
+        FigureCanvasAgg(self.figure)
+        self.hours_ax, self.percent_ax = self.figure.subplots(2, 1, gridspec_kw={"height_ratios": [3, 1]})
+        self._lock = threading.Lock()
+        # tight layout depends on subplot params it starts from, reset them so every render is the same
+        self._subplot_params = {
+            name: getattr(self.figure.subplotpars, name)
+            for name in ("left", "bottom", "right", "top", "wspace", "hspace")
+        }
 
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(14, 10), gridspec_kw={"height_ratios": [3, 1]})
-    fig.suptitle("Статистика світла (за адресою Ващенка 3) за тиждень", fontsize=16)
-    fig.patch.set_facecolor("#f0f0f0")
+        self.hours_ax.set_facecolor("#fff3e0")
+        self.hours_ax.grid(True, axis="y", linestyle="--", alpha=0.5)
+        self.hours_ax.set_ylim(0, 24)
+        self.hours_ax.set_ylabel("Світло погодинно")
+        self.hours_ax.set_yticks(range(0, 25, 2))
+        self.hours_ax.set_yticklabels([f"{h:02d}:00" for h in range(0, 25, 2)])
 
-    days = sorted(days_data.keys())
+        self.percent_ax.set_facecolor("#fff3e0")
+        self.percent_ax.grid(True, axis="y", linestyle=":", alpha=0.3)
+        self.percent_ax.set_ylim(-40, 160)
+        self.percent_ax.set_xlabel("Дата")
+        self.percent_ax.set_ylabel("Світло у %")
+        self.percent_ax.set_yticks(range(0, 101, 20))
+        self.percent_ax.set_yticklabels([f"{v}%" for v in range(0, 101, 20)])
 
-    ax1.set_facecolor("#fff3e0")
-    ax1.grid(True, axis="y", linestyle="--", alpha=0.5)
-    ax1.set_xlim(-0.2, (len(days) or 1) - 0.2)
-    ax1.set_ylim(0, 24)
-    ax1.set_ylabel("Світло погодинно")
-    ax1.set_xticks([i + 0.4 for i in range(len(days))])
-    ax1.set_xticklabels([])
-    ax1.set_yticks(range(0, 25, 2))
-    ax1.set_yticklabels([f"{h:02d}:00" for h in range(0, 25, 2)])
+    def render(self, chart_days: list[ChartDay], title: str, dpi: int = 300) -> bytes:
+        with self._lock:
+            artists = []
+            try:
+                self._draw(chart_days, title, artists)
 
-    percentages = []
-    occupied_hours_list = []
+                buffer = io.BytesIO()
+                self.figure.subplots_adjust(**self._subplot_params)
+                self.figure.tight_layout(rect=[0, 0, 1, 0.96])
+                self.figure.savefig(buffer, format="png", dpi=dpi, bbox_inches="tight", pad_inches=0.35)
+                return buffer.getvalue()
+            finally:
+                for artist in artists:
+                    artist.remove()
 
-    for day in days:
-        occupied = sum(duration for _, duration in days_data[day])
-        occupied_hours_list.append(occupied)
-        percentages.append((24 - occupied) / 24 * 100)
+    def _draw(self, chart_days: list[ChartDay], title: str, artists: list):
+        ax1, ax2 = self.hours_ax, self.percent_ax
+        self.figure.suptitle(title, fontsize=16)
 
-    x = [i + 0.4 for i in range(len(days))]
+        x = [i + 0.4 for i in range(len(chart_days))]
 
-    ax2.set_facecolor("#fff3e0")
-    ax2.grid(True, axis="y", linestyle=":", alpha=0.3)
-    ax2.plot(x, percentages, marker="o")
-    ax2.set_xlim(-0.2, (len(days) or 1) - 0.2)
-    ax2.set_ylim(-40, 160)
-    ax2.set_xlabel("Дата")
-    ax2.set_ylabel("Світло у %")
-    ax2.set_xticks(x)
-    ax2.set_xticklabels(
-        [f"{day.day} {months_map[day.month]} {day.year} ({weekdays_map[day.isoweekday()]})" for day in days]
-    )
-    ax2.set_yticks(range(0, 101, 20))
-    ax2.set_yticklabels([f"{v}%" for v in range(0, 101, 20)])
+        ax1.set_xlim(-0.2, (len(chart_days) or 1) - 0.2)
+        ax1.set_xticks(x)
+        ax1.set_xticklabels([])
 
-    for i, day in enumerate(days):
-        ax1.broken_barh([(i, 0.8)], (0, 24), facecolors="green")
+        artists.extend(ax2.plot(x, [chart_day.availability for chart_day in chart_days], marker="o", color="C0"))
+        ax2.set_xlim(-0.2, (len(chart_days) or 1) - 0.2)
+        ax2.set_xticks(x)
+        ax2.set_xticklabels(
+            [
+                f"{day.day} {months_map[day.month]} {day.year} ({weekdays_map[day.isoweekday()]})"
+                for day, *_ in chart_days
+            ]
+        )
 
-        for start_h, duration_h in days_data[day]:
-            ax1.broken_barh([(i, 0.8)], (start_h, duration_h), facecolors="red")
+        for i, chart_day in enumerate(chart_days):
+            artists.append(ax1.broken_barh([(i, 0.8)], (0, 24), facecolors="green"))
 
-    for i, (pct, occupied) in enumerate(zip(percentages, occupied_hours_list)):
-        free = 24 - occupied
+            for start_h, duration_h in chart_day.outages:
+                artists.append(ax1.broken_barh([(i, 0.8)], (start_h, duration_h), facecolors="red"))
 
-        occ_h = int(occupied)
-        occ_m = int((occupied - occ_h) * 60)
+        for i, (_, _, occupied, free, pct) in enumerate(chart_days):
+            occ_h = int(occupied)
+            occ_m = int((occupied - occ_h) * 60)
 
-        free_h = int(free)
-        free_m = int((free - free_h) * 60)
+            free_h = int(free)
+            free_m = int((free - free_h) * 60)
+
+            artists.append(
+                ax2.text(
+                    i + 0.4,
+                    pct + 10,
+                    f"{pct:.0f}%",
+                    ha="center",
+                    va="bottom",
+                    fontsize=8,
+                )
+            )
+
+            artists.append(
+                ax2.text(
+                    i + 0.4,
+                    -30,
+                    f"{occ_h}г. {occ_m}хв.",
+                    ha="center",
+                    va="bottom",
+                    bbox=dict(boxstyle="round,pad=0.3", facecolor="orange", alpha=0.7),
+                )
+            )
+
+            artists.append(
+                ax2.text(
+                    i + 0.4,
+                    150,
+                    f"{free_h}г. {free_m}хв.",
+                    ha="center",
+                    va="top",
+                    bbox=dict(boxstyle="round,pad=0.3", facecolor="lightgreen", alpha=0.7),
+                )
+            )
+
+
+_template: ChartTemplate | None = None
+_template_lock = threading.Lock()
+
+
+def get_template() -> ChartTemplate:
+    global _template
+    with _template_lock:
+        if _template is None:
+            _template = ChartTemplate()
+        return _template
 
-        ax2.text(
-            i + 0.4,
-            pct + 10,
-            f"{pct:.0f}%",
-            ha="center",
-            va="bottom",
-            fontsize=8,
-        )
 
-        ax2.text(
-            i + 0.4,
-            -30,
-            f"{occ_h}г. {occ_m}хв.",
-            ha="center",
-            va="bottom",
-            bbox=dict(boxstyle="round,pad=0.3", facecolor="orange", alpha=0.7),
+def chart_days(
+    intervals: Sequence[tuple[float, float]],
+    first_day: date,
+    last_day: date,
+    tz=UKRAINE_TZ,
+    stats: Sequence[DailyStats] | None = None,
+) -> list[ChartDay]:
+    """
+    Days of chart, outage hours are taken from `stats` when given (intervals are used only to draw bars then).
+    """
+    parts = split_by_days(intervals, tz, first_day, last_day)
+    start_hours = wall_clock_hours(parts, parts.start, tz)
+    duration_hours = (parts.end - parts.start) / 3600
+    day_hours = parts.day_seconds() / 3600
+    if stats is None:
+        outage_hours = parts.outage_seconds() / 3600
+    else:
+        outage_seconds = {stat.day: stat.outage_seconds for stat in stats}
+        outage_hours = np.array([outage_seconds.get(day, 0.0) for day in parts.days]) / 3600
+
+    outages = [[] for _ in parts.days]
+    for day, start_h, duration_h in zip(parts.day_index.tolist(), start_hours.tolist(), duration_hours.tolist()):
+        outages[day].append((start_h, duration_h))
+
+    return [
+        ChartDay(day, day_outages, float(occupied), float(length - occupied), float(pct))
+        for day, day_outages, occupied, length, pct in zip(
+            parts.days, outages, outage_hours, day_hours, (1 - outage_hours / day_hours) * 100
         )
+    ]
+
+
+def build_chart(
+    intervals: Sequence[tuple[float, float]],
+    first_day: date,
+    last_day: date,
+    title: str = "Статистика світла за тиждень",
+    dpi: int = 300,
+    renderer: str = "matplotlib",
+    stats: Sequence[DailyStats] | None = None,
+) -> bytes:
+    """
+    Renders chart of (start, end) epoch outage intervals with a column for every day from `first_day`
+    to `last_day` inclusive. Daily totals are taken from `stats` when given.
+    """
+    started = perf_counter()
+    days = chart_days(intervals, first_day, last_day, stats=stats)
+
+    if renderer == "lite":
+        from electricitybot.lite_chart import render_chart
+
+        image = render_chart(days, title)
+    else:
+        image = get_template().render(days, title, dpi)
+
+    CHART_RENDER.observe(perf_counter() - started, renderer)
+    CHART_SIZE.observe(len(image), renderer)
+    return image
+
+
+class HeatmapTemplate:
+    """
+    Pre-styled report figure: availability heatmap of days by hours of day above daily availability line.
+    Heatmap is a single mesh of one cell per hour and line has one point per day, so render time depends
+    on figure size, not on how many outages the period had. Cells are drawn as they are, not resampled to
+    figure pixels like an image is, so memory does not grow with dpi.
+    """
 
-        ax2.text(
-            i + 0.4,
-            150,
-            f"{free_h}г. {free_m}хв.",
-            ha="center",
-            va="top",
-            bbox=dict(boxstyle="round,pad=0.3", facecolor="lightgreen", alpha=0.7),
+    def __init__(self):
+        from matplotlib import colormaps
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.cm import ScalarMappable
+        from matplotlib.colors import Normalize
+        from matplotlib.figure import Figure
+
+        # constrained layout keeps room for the colorbar shared by both axes
+        self.figure = Figure(figsize=(14, 10), layout="constrained")
+        self.figure.patch.set_facecolor("#f0f0f0")
+        FigureCanvasAgg(self.figure)
+        self.hours_ax, self.percent_ax = self.figure.subplots(2, 1, sharex=True, gridspec_kw={"height_ratios": [3, 1]})
+        self._lock = threading.Lock()
+
+        self.colors = ScalarMappable(Normalize(0, 100), colormaps["RdYlGn"].with_extremes(bad="#d0d0d0"))
+        # replaced on every render, as number of days differs
+        self.mesh = None
+        # one colorbar for both axes keeps them equally wide, so days of heatmap and line are aligned
+        self.figure.colorbar(self.colors, ax=[self.hours_ax, self.percent_ax], format="%d%%", pad=0.01)
+        self.hours_ax.set_ylim(0, 24)
+        self.hours_ax.set_ylabel("Світло погодинно")
+        self.hours_ax.set_yticks(range(0, 25, 2))
+        self.hours_ax.set_yticklabels([f"{h:02d}:00" for h in range(0, 25, 2)])
+
+        (self.line,) = self.percent_ax.plot([], [], color="C0")
+        self.percent_ax.set_facecolor("#fff3e0")
+        self.percent_ax.grid(True, axis="y", linestyle=":", alpha=0.3)
+        self.percent_ax.set_ylim(-5, 105)
+        self.percent_ax.set_xlabel("Дата")
+        self.percent_ax.set_ylabel("Світло у %")
+        self.percent_ax.set_yticks(range(0, 101, 20))
+        self.percent_ax.set_yticklabels([f"{v}%" for v in range(0, 101, 20)])
+
+    def render(self, heatmap: Heatmap, title: str, dpi: int = 300) -> bytes:
+        with self._lock:
+            self.figure.suptitle(title, fontsize=16)
+            days = len(heatmap.days) or 1
+            if self.mesh is not None:
+                self.mesh.remove()
+            self.mesh = self.hours_ax.pcolormesh(
+                np.arange(days + 1),
+                np.arange(25),
+                np.ma.masked_invalid(heatmap.hourly.T if len(heatmap.days) else np.full((24, 1), np.nan)),
+                cmap=self.colors.cmap,
+                norm=self.colors.norm,
+            )
+            self.line.set_data(np.arange(len(heatmap.days)) + 0.5, heatmap.daily)
+            self.percent_ax.set_xlim(0, days)
+
+            ticks = heatmap_ticks(heatmap.days)
+            self.percent_ax.set_xticks([index + 0.5 for index, _ in ticks])
+            self.percent_ax.set_xticklabels([label for _, label in ticks])
+
+            buffer = io.BytesIO()
+            self.figure.savefig(buffer, format="png", dpi=dpi, bbox_inches="tight", pad_inches=0.35)
+            return buffer.getvalue()
+
+
+_heatmap_template: HeatmapTemplate | None = None
+
+
+def get_heatmap_template() -> HeatmapTemplate:
+    global _heatmap_template
+    with _template_lock:
+        if _heatmap_template is None:
+            _heatmap_template = HeatmapTemplate()
+        return _heatmap_template
+
+
+def heatmap_ticks(days: list[date]) -> list[tuple[int, str]]:
+    """
+    (day index, label) of days labeled on report axis: every day of a month long report (period is in the title),
+    first days of months of a longer one.
+    """
+    if len(days) <= 31:
+        return [(i, str(day.day)) for i, day in enumerate(days)]
+    months = [i for i, day in enumerate(days) if day.day == 1]
+    return [
+        (
+            i,
+            (
+                f"{months_map[days[i].month]} {days[i].year}"
+                if i == months[0] or days[i].month == 1
+                else months_map[days[i].month]
+            ),
         )
+        for i in months
+    ]
+
+
+def heatmap(
+    intervals: Sequence[tuple[float, float]],
+    first_day: date,
+    last_day: date,
+    tz=UKRAINE_TZ,
+    stats: Sequence[DailyStats] | None = None,
+    hourly_since: date | None = None,
+) -> Heatmap:
+    """
+    Heatmap of days from `first_day` to `last_day` inclusive. Daily availability is taken from `stats` when given,
+    days before `hourly_since` have no hourly cells, as their raw history is compacted to daily stats.
+    """
+    parts = split_by_days(intervals, tz, first_day, last_day)
+    hourly = (1 - hourly_outage_hours(parts, tz)) * 100
+    if hourly_since is not None:
+        hourly[: max((hourly_since - first_day).days, 0)] = np.nan
+    if stats is None:
+        daily = parts.availability()
+    else:
+        outage_seconds = {stat.day: stat.outage_seconds for stat in stats}
+        outages = np.array([outage_seconds.get(day, 0.0) for day in parts.days])
+        daily = (1 - outages / parts.day_seconds()) * 100
+
+    return Heatmap(parts.days, hourly, daily)
+
+
+def build_report(
+    intervals: Sequence[tuple[float, float]],
+    first_day: date,
+    last_day: date,
+    title: str = "Статистика світла за місяць",
+    dpi: int = 300,
+    renderer: str = "matplotlib",
+    stats: Sequence[DailyStats] | None = None,
+    hourly_since: date | None = None,
+) -> bytes:
+    """
+    Renders monthly or yearly report of (start, end) epoch outage intervals from `first_day` to `last_day`
+    inclusive, see `heatmap`.
+    """
+    started = perf_counter()
+    report = heatmap(intervals, first_day, last_day, stats=stats, hourly_since=hourly_since)
+
+    if renderer == "lite":
+        from electricitybot.lite_chart import render_heatmap
 
-    buffer = io.BytesIO()
-    plt.tight_layout(rect=[0, 0, 1, 0.96])
-    plt.savefig(buffer, format="png", dpi=300, bbox_inches="tight", pad_inches=0.35)
-    buffer.seek(0)
+        image = render_heatmap(report, title)
+    else:
+        image = get_heatmap_template().render(report, title, dpi)
 
-    return buffer.getvalue()
+    CHART_RENDER.observe(perf_counter() - started, renderer)
+    CHART_SIZE.observe(len(image), renderer)
+    return image
@@ -0,0 +1,14 @@
+"""
+Current time for everything that reads it. Checker, detector and storage take a clock (a callable returning epoch
+seconds), so the simulation runs them on virtual time instead of patching modules.
+"""
+
+from time import time
+from typing import Callable
+
+Clock = Callable[[], float]
+
+
+def wall_clock() -> float:
+    # `time` is looked up on every call, so objects created before time is frozen in tests see the frozen time too
+    return time()
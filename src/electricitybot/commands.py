@@ -0,0 +1,116 @@
+import asyncio
+import logging
+from typing import TYPE_CHECKING
+
+from electricitybot.metrics import COMMANDS
+
+if TYPE_CHECKING:  # pragma: no cover
+    import telegram
+
+    from electricitybot.bot import ElectricityChecker
+
+logger = logging.getLogger(__name__)
+
+NO_STATS_MESSAGE = "Статистики за {} ще немає"
+# monthly and yearly report periods and how they are named in titles
+REPORT_PERIODS = {"month": "місяць", "year": "рік"}
+
+
+def parse_command(text: str, username: str | None = None) -> str | None:
+    """
+    Returns command name of `/command` or `/command@bot` message text, None when it is not a command
+    or is addressed to another bot.
+    """
+    if not text.startswith("/"):
+        return None
+    command, _, mention = text.split()[0][1:].partition("@")
+    if mention and username and mention.lower() != username.lower():
+        return None
+    return command.lower()
+
+
+class CommandHandler:
+    """
+    Answers /status, /today, /week, /month, /year and /ping commands in chats of monitored targets. Answers are built
+    from state the checkers keep in memory, from their cached stats, charts and reports and from probe log, so a burst
+    of commands in a large group never probes, scans storage or renders a chart again.
+
+    Updates are long polled by the same event loop that probes, answers go through checkers' outbox.
+    """
+
+    def __init__(
+        self,
+        tg_bot: "telegram.Bot",
+        checkers: list["ElectricityChecker"],
+        poll_timeout: int = 30,
+        retry_delay: float = 5,
+    ):
+        self.tg_bot = tg_bot
+        self.checkers = checkers
+        self.poll_timeout = poll_timeout
+        self.retry_delay = retry_delay
+        self.username: str | None = None
+
+    def checkers_for(self, chat: "telegram.Chat") -> list["ElectricityChecker"]:
+        names = {str(chat.id)}
+        if chat.username:
+            names.add(f"@{chat.username.lower()}")
+        return [checker for checker in self.checkers if checker.chat_id.lower() in names]
+
+    async def handle_update(self, update: "telegram.Update"):
+        message = update.message
+        if not message or not message.text:
+            return
+        command = parse_command(message.text, self.username)
+        checkers = self.checkers_for(message.chat)
+        if command not in ("status", "today", "week", "month", "year", "ping") or not checkers:
+            return
+
+        COMMANDS.inc(command)
+        send = checkers[0].send
+        reply = dict(
+            chat_id=message.chat_id,
+            message_thread_id=message.message_thread_id,
+            reply_to_message_id=message.message_id,
+        )
+        if command == "status":
+            await send("send_message", text="\n".join(checker.status_message() for checker in checkers), **reply)
+        elif command == "today":
+            await send("send_message", text="\n".join(checker.today_message() for checker in checkers), **reply)
+        elif command == "ping":
+            await send("send_message", text="\n".join(checker.probe_message() for checker in checkers), **reply)
+        else:
+            for checker in checkers:
+                if command == "week":
+                    image, caption, period = await checker.cached_week_chart(), checker.chart_title, "тиждень"
+                else:
+                    image = await checker.cached_report(command)
+                    caption, period = checker.report_titles[command], REPORT_PERIODS[command]
+                if image:
+                    await send("send_photo", caption=caption, photo=image, **reply)
+                else:
+                    text = NO_STATS_MESSAGE.format(period)
+                    await send("send_message", text=f"{checker.label}: {text}" if checker.label else text, **reply)
+
+    async def poll_forever(self):
+        from telegram.error import TelegramError
+
+        offset = None
+        while True:
+            try:
+                if self.username is None:
+                    self.username = (await self.tg_bot.get_me()).username
+                updates = await self.tg_bot.get_updates(
+                    offset=offset, timeout=self.poll_timeout, allowed_updates=["message"]
+                )
+            except TelegramError:
+                logger.warning("Failed to get updates, retrying in %s s", self.retry_delay, exc_info=True)
+                await asyncio.sleep(self.retry_delay)
+                continue
+
+            for update in updates:
+                offset = update.update_id + 1
+                try:
+                    await self.handle_update(update)
+                except Exception:
+                    logger.exception("Failed to answer update %s", update.update_id)
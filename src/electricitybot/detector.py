@@ -0,0 +1,150 @@
+"""
+Detection of target state: probes decided by hysteresis at adaptive rate. The single process bot announces
+state changes right away, the probe process of split mode (`PROCESS_MODE=split`) queues them in storage
+for the worker. Outage history, weekly charts and Telegram delivery are left to the worker, so only probes run
+there and their cadence does not depend on the worker's load. Telegram and chart modules are not even imported.
+"""
+
+import asyncio
+import functools
+import logging
+from multiprocessing.process import BaseProcess
+from typing import Awaitable, Callable
+
+from electricitybot.clock import Clock, wall_clock
+from electricitybot.hysteresis import Hysteresis
+from electricitybot.metrics import serve_metrics
+from electricitybot.probe import Prober, ProbeResult, system_ping
+from electricitybot.probe_log import probe_log_path, ProbeLog
+from electricitybot.profiling import install_signal_handler, profiled
+from electricitybot.scheduler import AdaptiveInterval, run_every
+from electricitybot.settings import settings, Target
+from electricitybot.storage import OutageStore
+
+
+class Downtime:
+    """
+    Time the bot was down, from `start` (last time state saved before restart was seen) until a probe confirms
+    that state again. A state that changes before that has changed while the bot was down, outage that started
+    then is counted from `start`, as there is no way to tell when exactly it started.
+    """
+
+    def __init__(self, start: float | None = None):
+        self.start = start
+
+    def change_time(self, success: bool, previous_state: bool | None, current_e_state: bool) -> float | None:
+        """
+        When state changed for the probe that made `current_e_state`, None means now.
+        """
+        at = (
+            self.start if self.start is not None and current_e_state != previous_state and not current_e_state else None
+        )
+        if success == previous_state or current_e_state != previous_state:
+            self.start = None
+        return at
+
+
+class TargetDetector:
+    """
+    Probes one target and calls `on_state_change` with the new state and the time it changed, the first known
+    state included, when hysteresis decides the state has changed.
+    """
+
+    def __init__(
+        self,
+        target: Target,
+        store: OutageStore,
+        on_state_change: Callable[[bool, float], Awaitable[None]],
+        clock: Clock = wall_clock,
+    ):
+        self.key = target.ip_to_check
+        self.clock = clock
+        self.store = store
+        self.on_state_change = on_state_change
+        self.seen_saved_at = 0.0
+        self.prober = (
+            None
+            if settings.probe_method == "ping"
+            else Prober(settings.probe_method, settings.probe_timeout, settings.tcp_probe_port)
+        )
+        self.last_probe_result: ProbeResult | None = None
+        self.probe_log = (
+            ProbeLog(probe_log_path(settings.probe_log_dir, self.key), settings.probe_log_size)
+            if settings.probe_log_dir
+            else None
+        )
+        self.hysteresis = Hysteresis(settings.hysteresis_window, settings.hysteresis_threshold)
+        self.probe_interval = AdaptiveInterval(
+            settings.fast_probe_interval,
+            settings.timeout,
+            settings.slowest_probe_interval,
+            settings.probe_interval_growth,
+        )
+        # state saved before restart, changing it needs confirmation as usual
+        snapshot = self.store.runtime_state(self.key)
+        if snapshot:
+            self.hysteresis.restore(snapshot.state)
+        self.downtime = Downtime(snapshot.seen_at if snapshot else None)
+
+    async def probe_once(self) -> bool:
+        if not self.prober:
+            self.last_probe_result = await asyncio.to_thread(system_ping, self.key)
+        else:
+            self.last_probe_result = await self.prober.probe(self.key)
+        return self.last_probe_result.success
+
+    @profiled
+    async def probe_tick(self):
+        """
+        Single probe without retries: state is decided by hysteresis, and suspicious probe makes next ones come sooner.
+        """
+        success = await self.probe_once()
+        now = self.clock()
+        if self.probe_log is not None:
+            self.probe_log.append(now, success, self.last_probe_result.rtt if self.last_probe_result else None)
+        previous_state = self.hysteresis.state
+        current_e_state = self.hysteresis.update(success)
+        self.probe_interval.update(calm=previous_state is None or success == current_e_state == previous_state)
+
+        at = self.downtime.change_time(success, previous_state, current_e_state)
+        if current_e_state != previous_state:
+            await self.on_state_change(current_e_state, at or now)
+        if now - self.seen_saved_at >= settings.state_snapshot_interval:
+            self.seen_saved_at = now
+            self.store.save_seen_at(self.key, self.seen_saved_at)
+
+
+class ProbeProcess:
+    def __init__(self):
+        self.store = OutageStore(settings.storage_path)
+        self.detectors = [
+            TargetDetector(target, self.store, functools.partial(self.queue_state_change, target.ip_to_check))
+            for target in settings.targets or [settings.default_target]
+        ]
+
+    async def queue_state_change(self, key: str, state: bool, at: float):
+        # first state is queued too, worker takes it silently like single process bot does
+        self.store.push_state_change(key, state, at)
+
+    async def serve(self):
+        tasks = [run_every(detector.probe_interval, detector.probe_tick) for detector in self.detectors]
+        if settings.probe_metrics_port:
+            tasks.append(serve_metrics(settings.metrics_host, settings.probe_metrics_port))
+
+        await asyncio.gather(*tasks)
+
+
+async def watch_process(process: BaseProcess, interval: float):
+    """
+    Raises when `process` exits. Worker of split mode can not go on without its probe process, so it stops too,
+    with non-zero status, and both are started again by whatever restarts the bot (e.g. container restart policy).
+    """
+    while process.is_alive():
+        await asyncio.sleep(interval)
+    raise RuntimeError(f"Probe process {process.name} exited with code {process.exitcode}")
+
+
+def run_probe():  # pragma: no cover
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    install_signal_handler()
+    asyncio.run(ProbeProcess().serve())
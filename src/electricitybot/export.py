@@ -0,0 +1,147 @@
+"""
+Export of outage history kept by the bot:
+
+    electricitybot-export intervals --since 2024-01-01 --until 2024-02-01 > outages.csv
+    electricitybot-export daily --format jsonl --target 10.0.0.1 -o daily.jsonl
+    electricitybot-export intervals --format parquet -o outages.parquet  # needs pyarrow
+
+Rows are streamed from the database to the output in batches, so memory use does not depend on history size,
+and the bot can keep running meanwhile. Raw intervals are kept for `RAW_HISTORY_DAYS` only, daily stats for
+the whole history.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+from datetime import date, datetime, timedelta
+from itertools import islice
+from typing import Callable, IO, Iterable, Iterator
+
+from dotenv import dotenv_values
+
+from electricitybot.intervals import day_start, UKRAINE_TZ
+from electricitybot.storage import OutageStore
+
+FIELDS = {
+    "intervals": ("target", "start", "end", "outage_seconds"),
+    "daily": ("target", "day", "outage_seconds", "outage_count", "longest_outage"),
+}
+BATCH_SIZE = 10_000
+# same as default of `Settings.storage_path`
+DEFAULT_STORAGE_PATH = "power_outage_intervals.sqlite3"
+
+
+def default_storage_path() -> str:
+    """
+    STORAGE_PATH of the bot from environment or `.env`. Bot settings are not loaded, so export does not need
+    Telegram token and targets.
+    """
+    return os.environ.get("STORAGE_PATH") or dotenv_values(".env").get("STORAGE_PATH") or DEFAULT_STORAGE_PATH
+
+
+def interval_rows(store: OutageStore, targets: list[str], since: date, until: date) -> Iterator[dict]:
+    """
+    Outages that overlap [since, until), end is None for outage going on.
+    """
+    for target in targets:
+        for start, end in store.iter_intervals(target, day_start(since, UKRAINE_TZ), day_start(until, UKRAINE_TZ)):
+            yield {
+                "target": target,
+                "start": datetime.fromtimestamp(start, UKRAINE_TZ),
+                "end": None if end is None else datetime.fromtimestamp(end, UKRAINE_TZ),
+                "outage_seconds": None if end is None else end - start,
+            }
+
+
+def daily_rows(store: OutageStore, targets: list[str], since: date, until: date) -> Iterator[dict]:
+    for target in targets:
+        for stat in store.iter_daily_stats(target, since, until):
+            yield {"target": target, **stat._asdict()}
+
+
+def to_text(value) -> str | float | int | None:
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def write_csv(rows: Iterable[dict], fields: tuple[str, ...], output: IO[str]):
+    writer = csv.DictWriter(output, fields)
+    writer.writeheader()
+    writer.writerows({name: to_text(value) for name, value in row.items()} for row in rows)
+
+
+def write_jsonl(rows: Iterable[dict], fields: tuple[str, ...], output: IO[str]):
+    for row in rows:
+        output.write(json.dumps({name: to_text(value) for name, value in row.items()}, ensure_ascii=False) + "\n")
+
+
+def write_parquet(rows: Iterable[dict], fields: tuple[str, ...], output: str):
+    """
+    Writes rows in row groups of `BATCH_SIZE` rows, only one of them is in memory at once.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet export needs pyarrow, install electricitybot[parquet]")
+
+    timestamp = pa.timestamp("us", tz=UKRAINE_TZ.zone)
+    types = {
+        "target": pa.string(),
+        "start": timestamp,
+        "end": timestamp,
+        "day": pa.date32(),
+        "outage_seconds": pa.float64(),
+        "outage_count": pa.int64(),
+        "longest_outage": pa.float64(),
+    }
+    schema = pa.schema([(name, types[name]) for name in fields])
+    rows = iter(rows)
+    with pq.ParquetWriter(output, schema) as writer:
+        while batch := list(islice(rows, BATCH_SIZE)):
+            writer.write_table(pa.Table.from_pylist(batch, schema))
+
+
+WRITERS: dict[str, Callable] = {"csv": write_csv, "jsonl": write_jsonl, "parquet": write_parquet}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("kind", choices=FIELDS, help="outage intervals or daily stats")
+    parser.add_argument("--format", choices=WRITERS, default="csv")
+    parser.add_argument("--since", type=date.fromisoformat, default=date(1970, 1, 1), help="first day, YYYY-MM-DD")
+    parser.add_argument("--until", type=date.fromisoformat, help="day after the last one, tomorrow by default")
+    parser.add_argument("--target", action="append", help="IP address, all addresses by default, can be repeated")
+    parser.add_argument("--storage", help="database, STORAGE_PATH by default")
+    parser.add_argument("-o", "--output", help="output file, stdout by default")
+    args = parser.parse_args(argv)
+
+    if args.format == "parquet" and not args.output:
+        parser.error("Parquet is written to a file, set --output")
+    until = args.until or datetime.now(UKRAINE_TZ).date() + timedelta(days=1)
+
+    storage = args.storage or default_storage_path()
+    try:
+        # export never writes to the database of running bot, nor creates empty one for mistyped path
+        store = OutageStore(storage, read_only=True)
+    except sqlite3.OperationalError as error:
+        raise SystemExit(f"Can not open {storage}: {error}")
+    try:
+        rows_of = interval_rows if args.kind == "intervals" else daily_rows
+        rows = rows_of(store, args.target or store.targets(), args.since, until)
+        if args.format == "parquet":
+            write_parquet(rows, FIELDS[args.kind], args.output)
+        elif args.output:
+            with open(args.output, "w", newline="") as output:
+                WRITERS[args.format](rows, FIELDS[args.kind], output)
+        else:
+            WRITERS[args.format](rows, FIELDS[args.kind], sys.stdout)
+    finally:
+        store.close()
+    return 0
+
+
+def run_export():  # pragma: no cover
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import itertools
+import math
+from typing import Iterable, Iterator
+
+import numpy as np
+
+EVENT_DTYPE = np.dtype([("time", "<f8"), ("state", "i1")])
+
+
+class OutageHistory:
+    """
+    Outage intervals kept as two columns of epoch seconds: 16 bytes per outage instead of a tuple of floats
+    (or an object with two datetimes) each. End of outage going on is NaN.
+
+    Intervals are sorted and do not overlap, so both columns are sorted too.
+    """
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray):
+        self.starts = np.asarray(starts, dtype="<f8")
+        self.ends = np.asarray(ends, dtype="<f8")
+
+    @classmethod
+    def from_events(cls, events: Iterable[tuple[float, int]], since: float = float("-inf")) -> "OutageHistory":
+        """
+        Builds history of (time, state) events sorted by time. Repeated starts and ends are ignored,
+        outages that end at or before `since` are dropped.
+        """
+        return cls._from_event_array(np.fromiter(events, dtype=EVENT_DTYPE), since)
+
+    @classmethod
+    def iter_events(
+        cls, events: Iterable[tuple[float, int]], since: float = float("-inf"), batch_size: int = 1024
+    ) -> Iterator[tuple[float, float | None]]:
+        """
+        Same as `from_events` as (start, end) tuples, end is None for outage going on. Events are read `batch_size`
+        at a time, so memory use does not depend on their number, outage going on at the end of a batch is carried
+        over to the next one.
+        """
+        events = iter(events)
+        carried = np.zeros(0, dtype=EVENT_DTYPE)
+        while len(batch := np.fromiter(itertools.islice(events, batch_size), dtype=EVENT_DTYPE)):
+            history = cls._from_event_array(np.concatenate([carried, batch]), since)
+            finished = len(history) - history.is_open
+            yield from cls(history.starts[:finished], history.ends[:finished]).tolist()
+            carried = np.array([(history.starts[finished], 0)] if history.is_open else [], dtype=EVENT_DTYPE)
+        if len(carried):
+            yield float(carried["time"][0]), None
+
+    @classmethod
+    def _from_event_array(cls, events: np.ndarray, since: float) -> "OutageHistory":
+        times, states = events["time"], events["state"]
+        # first event of every run of equal states, so starts and ends alternate
+        changes = np.ones(len(states), dtype=bool)
+        changes[1:] = states[1:] != states[:-1]
+        times, states = times[changes], states[changes]
+        if len(states) and states[0]:
+            times = times[1:]
+
+        finished = len(times) // 2
+        starts, ends = times[0::2], np.full(len(times) - finished, np.nan)
+        ends[:finished] = times[1::2]
+        after_since = ~(ends <= since)
+        return cls(starts[after_since], ends[after_since])
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.tolist()})"
+
+    @property
+    def is_open(self) -> bool:
+        return bool(len(self.ends)) and bool(np.isnan(self.ends[-1]))
+
+    def closed(self) -> np.ndarray:
+        """
+        (start, end) rows of finished outages.
+        """
+        finished = ~np.isnan(self.ends)
+        return np.column_stack([self.starts[finished], self.ends[finished]])
+
+    def clipped(self, since: float | None = None, until: float = float("inf")) -> np.ndarray:
+        """
+        (start, end) rows cut to [since, until), outage going on ends at `until`. Outages are expected
+        to overlap the range, as `OutageStore.history` reads them.
+        """
+        starts = self.starts if since is None else np.maximum(self.starts, since)
+        ends = np.minimum(np.nan_to_num(self.ends, nan=until), until)
+        return np.column_stack([starts, ends])
+
+    def tolist(self) -> list[tuple[float, float | None]]:
+        return [
+            (start, None if math.isnan(end) else end) for start, end in zip(self.starts.tolist(), self.ends.tolist())
+        ]
@@ -0,0 +1,36 @@
+from collections import deque
+
+
+class Hysteresis:
+    """
+    N-of-M debouncer of probe results: state changes only when at least `threshold` of last `window` probes
+    disagree with it, so single lost packet does not report an outage. First probe sets the state.
+    """
+
+    def __init__(self, window: int = 3, threshold: int = 2):
+        if not 1 <= threshold <= window:
+            raise ValueError(f"Threshold should be from 1 to window size {window}, got {threshold}")
+
+        self.threshold = threshold
+        self.results = deque(maxlen=window)
+        self.state: bool | None = None
+
+    def restore(self, state: bool):
+        """
+        Takes state known before restart, changing it takes `threshold` probes as usual.
+        """
+        self.state = state
+        self.results.clear()
+
+    def update(self, success: bool) -> bool:
+        if self.state is None:
+            self.state = success
+            return self.state
+
+        self.results.append(success)
+        if self.results.count(not self.state) >= self.threshold:
+            self.state = not self.state
+            # new state has to be confirmed from scratch before changing back
+            self.results.clear()
+
+        return self.state
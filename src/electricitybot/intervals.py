@@ -0,0 +1,174 @@
+from datetime import date, datetime, time, timedelta, tzinfo
+from typing import NamedTuple, Sequence
+
+import numpy as np
+import pytz
+
+UKRAINE_TZ = pytz.timezone("Europe/Kyiv")  # <3
+
+
+class DailyStats(NamedTuple):
+    day: date
+    outage_seconds: float
+    outage_count: int
+    longest_outage: float
+
+
+class DayParts(NamedTuple):
+    """
+    Intervals split into parts that fit into one local day.
+    `boundaries` has start of every day in `days` plus start of the day after the last one,
+    `day_index` points to the day of each part in `days`.
+    """
+
+    days: list[date]
+    boundaries: np.ndarray
+    day_index: np.ndarray
+    start: np.ndarray
+    end: np.ndarray
+
+    def day_seconds(self) -> np.ndarray:
+        # DST days are 23 or 25 hours long
+        return np.diff(self.boundaries)
+
+    def outage_seconds(self) -> np.ndarray:
+        return np.bincount(self.day_index, weights=self.end - self.start, minlength=len(self.days))
+
+    def availability(self) -> np.ndarray:
+        """
+        Percent of every day with power.
+        """
+        return (1 - self.outage_seconds() / self.day_seconds()) * 100
+
+
+def day_start(day: date, tz: tzinfo) -> float:
+    return tz.localize(datetime.combine(day, time.min)).timestamp()
+
+
+def day_boundaries(first_day: date, days: int, tz: tzinfo) -> np.ndarray:
+    # localize once per day, not per interval, so midnights stay correct across DST changes
+    return np.array([day_start(first_day + timedelta(days=day), tz) for day in range(days + 1)])
+
+
+def as_arrays(intervals: Sequence[tuple[float, float]] | np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    intervals = np.asarray(intervals, dtype=float).reshape(-1, 2)
+    return intervals[:, 0], intervals[:, 1]
+
+
+def split_by_days(
+    intervals: Sequence[tuple[float, float]] | np.ndarray,
+    tz: tzinfo,
+    first_day: date | None = None,
+    last_day: date | None = None,
+) -> DayParts:
+    """
+    Splits (start, end) epoch intervals into parts that fit into one local day of `tz`.
+    Days range from `first_day` to `last_day` inclusive (from day of the earliest start to day of the latest end
+    by default), intervals are clipped to it. Zero length interval gives zero length part, so it marks its day.
+    """
+    starts, ends = as_arrays(intervals)
+    if first_day is None:
+        first_day = datetime.fromtimestamp(starts.min(), tz).date() if len(starts) else date.today()
+    if last_day is None:
+        last_day = datetime.fromtimestamp(ends.max(), tz).date() if len(ends) else first_day - timedelta(days=1)
+
+    days = [first_day + timedelta(days=day) for day in range((last_day - first_day).days + 1)]
+    boundaries = day_boundaries(first_day, len(days), tz)
+
+    inside = (starts < boundaries[-1]) & ((ends > boundaries[0]) | (starts >= boundaries[0]))
+    starts, ends = starts[inside], ends[inside]
+    first = np.clip(np.searchsorted(boundaries, starts, side="right") - 1, 0, None)
+    # interval that ends exactly at midnight does not touch the next day
+    last = np.clip(np.searchsorted(boundaries, ends, side="left") - 1, first, len(days) - 1)
+
+    counts = last - first + 1
+    owner = np.repeat(np.arange(len(starts)), counts)
+    part_number = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    day_index = first[owner] + part_number
+
+    return DayParts(
+        days,
+        boundaries,
+        day_index,
+        np.maximum(starts[owner], boundaries[day_index]),
+        np.minimum(ends[owner], boundaries[day_index + 1]),
+    )
+
+
+def wall_clock_hours(parts: DayParts, times: np.ndarray, tz: tzinfo) -> np.ndarray:
+    """
+    Local time of day in hours for `times` that belong to parts, e.g. 13.5 for 13:30.
+    """
+    hours = (times - parts.boundaries[parts.day_index]) / 3600
+    offsets = np.array(
+        [datetime.fromtimestamp(boundary, tz).utcoffset().total_seconds() for boundary in parts.boundaries]
+    )
+    # only a couple of days a year change UTC offset, local time is taken from tz only for them
+    for i in np.flatnonzero((offsets[:-1] != offsets[1:])[parts.day_index]):
+        local_time = datetime.fromtimestamp(times[i], tz)
+        hours[i] = local_time.hour + local_time.minute / 60 + local_time.second / 3600
+
+    return hours
+
+
+def hourly_outage_hours(parts: DayParts, tz: tzinfo) -> np.ndarray:
+    """
+    (days, 24) array with outage hours within every local hour of every day, one cell per hour whatever many
+    outages it has. Parts are placed by local start hour and length like weekly chart bars, so on DST days
+    an hour may get more or less than an hour of outage.
+    """
+    start_hours = wall_clock_hours(parts, parts.start, tz)
+    end_hours = np.minimum(start_hours + (parts.end - parts.start) / 3600, 24)
+    hours = np.arange(24)
+    overlap = np.minimum(end_hours[:, None], hours + 1) - np.maximum(start_hours[:, None], hours)
+
+    outage_hours = np.zeros((len(parts.days), 24))
+    np.add.at(outage_hours, parts.day_index, np.clip(overlap, 0, 1))
+    return np.minimum(outage_hours, 1)
+
+
+def daily_stats(intervals: Sequence[tuple[float, float]] | np.ndarray, tz: tzinfo) -> list[DailyStats]:
+    """
+    Aggregates outages per local day. Outage that crosses midnight is counted in both days
+    with its part that belongs to the day.
+    """
+    parts = split_by_days(intervals, tz)
+    outage_counts = np.bincount(parts.day_index, minlength=len(parts.days))
+    longest_outages = np.zeros(len(parts.days))
+    np.maximum.at(longest_outages, parts.day_index, parts.end - parts.start)
+
+    return [
+        DailyStats(parts.days[day], float(outage_seconds), int(outage_counts[day]), float(longest_outages[day]))
+        for day, outage_seconds in enumerate(parts.outage_seconds())
+        if outage_counts[day]
+    ]
+
+
+def outage_daily_stats(start: float, end: float, tz: tzinfo) -> list[DailyStats]:
+    """
+    Same as `daily_stats` for a single outage. Plain loop over its days is much faster than building arrays
+    for one interval, and this runs on every outage end.
+    """
+    day = datetime.fromtimestamp(start, tz).date()
+    stats = []
+    while True:
+        next_day = day + timedelta(days=1)
+        day_end = day_start(next_day, tz)
+        part = min(end, day_end) - max(start, day_start(day, tz))
+        stats.append(DailyStats(day, part, 1, part))
+        # outage that ends exactly at midnight does not touch the next day
+        if end <= day_end:
+            return stats
+        day = next_day
+
+
+def merge_daily_stats(first: DailyStats, second: DailyStats) -> DailyStats:
+    """
+    Stats of the same day made of outages of both.
+    """
+    return DailyStats(
+        first.day,
+        first.outage_seconds + second.outage_seconds,
+        first.outage_count + second.outage_count,
+        max(first.longest_outage, second.longest_outage),
+    )
@@ -0,0 +1,434 @@
+"""
+Weekly chart and report renderer that does not need matplotlib: the same layouts are drawn straight into RGB buffer
+and encoded as PNG. Text uses glyph atlas rasterized from DejaVu Sans (see scripts/build_glyphs.py).
+"""
+
+import math
+import os
+import struct
+import zlib
+from functools import lru_cache
+from typing import NamedTuple
+
+from electricitybot.chart import ChartDay, Heatmap, heatmap_ticks, months_map, weekdays_map
+
+WIDTH, HEIGHT = 1400, 1000
+AXES_LEFT, AXES_RIGHT = 120, 1370
+HOURS_AXES_TOP, HOURS_AXES_BOTTOM = 75, 685
+PERCENT_AXES_TOP, PERCENT_AXES_BOTTOM = 715, 918
+HEATMAP_RIGHT = 1300
+COLORBAR_LEFT, COLORBAR_RIGHT = 1315, 1335
+
+FIGURE_BACKGROUND = (0xF0, 0xF0, 0xF0)
+AXES_BACKGROUND = (0xFF, 0xF3, 0xE0)
+BLACK = (0, 0, 0)
+GREEN = (0x00, 0x80, 0x00)
+RED = (0xFF, 0x00, 0x00)
+LINE_COLOR = (0x1F, 0x77, 0xB4)
+GRID_COLOR = (0xB0, 0xB0, 0xB0)
+ORANGE = (0xFF, 0xA5, 0x00)
+LIGHT_GREEN = (0x90, 0xEE, 0x90)
+NO_DATA = (0xD0, 0xD0, 0xD0)
+# red, yellow and green of matplotlib's RdYlGn colormap at 0%, 50% and 100%
+HEATMAP_STOPS = ((0xA5, 0x00, 0x26), (0xFF, 0xFF, 0xBF), (0x00, 0x68, 0x37))
+
+SMALL_FONT, NORMAL_FONT, TITLE_FONT = 11, 14, 22
+
+
+class Glyph(NamedTuple):
+    advance: float
+    x0: int
+    y0: int
+    width: int
+    height: int
+    alpha: bytes
+
+
+class Font(NamedTuple):
+    size: int
+    ascent: int
+    descent: int
+    glyphs: dict[str, Glyph]
+
+    def glyph(self, character: str) -> Glyph:
+        return self.glyphs.get(character) or self.glyphs["?"]
+
+    def text_width(self, text: str) -> int:
+        return round(sum(self.glyph(character).advance for character in text))
+
+
+@lru_cache(maxsize=None)
+def load_fonts() -> dict[int, Font]:
+    with open(os.path.join(os.path.dirname(__file__), "glyphs.bin"), "rb") as glyphs_file:
+        data = zlib.decompress(glyphs_file.read())
+
+    fonts = {}
+    offset = 5
+    for _ in range(data[4]):
+        size, ascent, descent, glyph_count = struct.unpack_from("<HHHH", data, offset)
+        offset += 8
+        glyphs = {}
+        for _ in range(glyph_count):
+            code, advance, x0, y0, width, height = struct.unpack_from("<IHhhHH", data, offset)
+            offset += 14
+            alpha_end = offset + width * height
+            glyphs[chr(code)] = Glyph(advance / 64, x0, y0, width, height, data[offset:alpha_end])
+            offset = alpha_end
+        fonts[size] = Font(size, ascent, descent, glyphs)
+
+    return fonts
+
+
+def blend(color: tuple, background: tuple, alpha: float) -> tuple:
+    return tuple(round(c * alpha + b * (1 - alpha)) for c, b in zip(color, background))
+
+
+def heatmap_color(percent: float) -> tuple:
+    if math.isnan(percent):
+        return NO_DATA
+    position = min(max(percent, 0), 100) / 50
+    low = min(int(position), 1)
+    return blend(HEATMAP_STOPS[low + 1], HEATMAP_STOPS[low], position - low)
+
+
+@lru_cache(maxsize=None)
+def heatmap_palette() -> list[bytes]:
+    """
+    Pixel of every whole percent, heatmap cells are rounded to them.
+    """
+    return [bytes(heatmap_color(percent)) for percent in range(101)]
+
+
+@lru_cache(maxsize=4096)
+def glyph_runs(font_size: int, character: str, color: tuple, background: tuple) -> list[tuple[int, int, bytes]]:
+    """
+    Glyph as (row, column, pixels) runs of visible pixels already blended with background.
+    """
+    glyph = load_fonts()[font_size].glyph(character)
+    runs = []
+    for row in range(glyph.height):
+        row_start, row_end = row * glyph.width, (row + 1) * glyph.width
+        alpha_row = glyph.alpha[row_start:row_end]
+        column = 0
+        while column < glyph.width:
+            if not alpha_row[column]:
+                column += 1
+                continue
+            run_start = column
+            pixels = bytearray()
+            while column < glyph.width and alpha_row[column]:
+                pixels += bytes(blend(color, background, alpha_row[column] / 255))
+                column += 1
+            runs.append((glyph.y0 + row, glyph.x0 + run_start, bytes(pixels)))
+
+    return runs
+
+
+class Canvas:
+    def __init__(self, width: int, height: int, color: tuple):
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(bytes(color) * (width * height))
+
+    def fill_rect(self, x0: int, y0: int, x1: int, y1: int, color: tuple):
+        x0, x1 = max(x0, 0), min(x1, self.width)
+        y0, y1 = max(y0, 0), min(y1, self.height)
+        if x0 >= x1:
+            return
+        row = bytes(color) * (x1 - x0)
+        for y in range(y0, y1):
+            offset = (y * self.width + x0) * 3
+            end = offset + len(row)
+            self.pixels[offset:end] = row
+
+    def fill_rows(self, x: int, y0: int, y1: int, row: bytes):
+        """
+        Copies `row` of pixels to every row from y0 to y1, starting at x.
+        """
+        for y in range(y0, y1):
+            offset = (y * self.width + x) * 3
+            end = offset + len(row)
+            self.pixels[offset:end] = row
+
+    def hline(self, x0: int, x1: int, y: int, color: tuple, alpha: float, dash: tuple[int, int]):
+        """
+        Blends dashed line into whatever is already drawn under it, channel by channel with translation tables.
+        `dash` is (pixels on, pixels off).
+        """
+        start, end = (y * self.width + x0) * 3, (y * self.width + x1) * 3
+        row = self.pixels[start:end]
+        blended = bytearray(len(row))
+        for channel in range(3):
+            table = bytes(round(color[channel] * alpha + value * (1 - alpha)) for value in range(256))
+            blended[channel::3] = row[channel::3].translate(table)
+
+        on, period = dash[0] * 3, sum(dash) * 3
+        for offset in range(0, len(row), period):
+            segment_end = min(offset + on, len(row))
+            pixels_start, pixels_end = start + offset, start + segment_end
+            self.pixels[pixels_start:pixels_end] = blended[offset:segment_end]
+
+    def rect_outline(self, x0: int, y0: int, x1: int, y1: int, color: tuple):
+        self.fill_rect(x0, y0, x1, y0 + 1, color)
+        self.fill_rect(x0, y1 - 1, x1, y1, color)
+        self.fill_rect(x0, y0, x0 + 1, y1, color)
+        self.fill_rect(x1 - 1, y0, x1, y1, color)
+
+    def line(self, x0: int, y0: int, x1: int, y1: int, color: tuple, width: int = 2):
+        steps = max(abs(x1 - x0), abs(y1 - y0), 1)
+        brush = bytes(color) * width
+        for step in range(steps + 1):
+            x = round(x0 + (x1 - x0) * step / steps) - width // 2
+            y = round(y0 + (y1 - y0) * step / steps) - width // 2
+            for row in range(y, y + width):
+                offset = (row * self.width + x) * 3
+                end = offset + len(brush)
+                self.pixels[offset:end] = brush
+
+    def disc(self, cx: int, cy: int, radius: int, color: tuple):
+        for dy in range(-radius, radius + 1):
+            dx = int((radius**2 - dy**2) ** 0.5)
+            self.fill_rect(cx - dx, cy + dy, cx + dx + 1, cy + dy + 1, color)
+
+    def text(
+        self,
+        x: int,
+        y: int,
+        text: str,
+        font_size: int = NORMAL_FONT,
+        background: tuple = FIGURE_BACKGROUND,
+        ha: str = "left",
+        va: str = "baseline",
+        color: tuple = BLACK,
+    ) -> tuple[int, int, int, int]:
+        """
+        Draws text over solid `background` and returns its (x0, y0, x1, y1) box.
+        """
+        font = load_fonts()[font_size]
+        width = font.text_width(text)
+        x -= {"left": 0, "center": width // 2, "right": width}[ha]
+        baseline = (
+            y
+            + {
+                "baseline": 0,
+                "top": font.ascent,
+                "bottom": -font.descent,
+                "center": (font.ascent - font.descent) // 2,
+            }[va]
+        )
+
+        pen = float(x)
+        for character in text:
+            for row, column, pixels in glyph_runs(font_size, character, color, background):
+                py, px = baseline + row, round(pen) + column
+                if 0 <= py < self.height and px >= 0 and px + len(pixels) // 3 <= self.width:
+                    offset = (py * self.width + px) * 3
+                    end = offset + len(pixels)
+                    self.pixels[offset:end] = pixels
+            pen += font.glyph(character).advance
+
+        return x, baseline - font.ascent, x + width, baseline + font.descent
+
+    def vertical_text(self, x: int, y: int, text: str, background: tuple = FIGURE_BACKGROUND):
+        """
+        Draws text rotated by 90 degrees counterclockwise centered at (x, y).
+        """
+        font = load_fonts()[NORMAL_FONT]
+        label = Canvas(font.text_width(text), font.ascent + font.descent, background)
+        label.text(0, 0, text, background=background, va="top")
+
+        left, top = x - label.height // 2, y - label.width // 2
+        stride = label.width * 3
+        for row in range(label.width):
+            # row of rotated label is a column of the original one read from bottom to top
+            column = (label.width - 1 - row) * 3
+            rotated_row = bytearray(label.height * 3)
+            for channel in range(3):
+                channel_start = column + channel
+                rotated_row[channel::3] = label.pixels[channel_start::stride]
+            offset = ((top + row) * self.width + left) * 3
+            end = offset + len(rotated_row)
+            self.pixels[offset:end] = rotated_row
+
+    def badge(self, x: int, y: int, text: str, color: tuple, va: str):
+        """
+        Text in a box like matplotlib `round` bbox with alpha 0.7 over axes.
+        """
+        font = load_fonts()[NORMAL_FONT]
+        width, pad = font.text_width(text), 4
+        top = y if va == "top" else y - font.ascent - font.descent - 2 * pad
+        x0, y0, x1, y1 = x - width // 2 - pad, top, x + width // 2 + pad, top + font.ascent + font.descent + 2 * pad
+        fill = blend(color, AXES_BACKGROUND, 0.7)
+
+        self.fill_rect(x0 + 1, y0 + 1, x1 - 1, y1 - 1, fill)
+        self.rect_outline(x0, y0, x1, y1, blend(BLACK, AXES_BACKGROUND, 0.7))
+        for corner_x, corner_y in ((x0, y0), (x1 - 1, y0), (x0, y1 - 1), (x1 - 1, y1 - 1)):
+            self.fill_rect(corner_x, corner_y, corner_x + 1, corner_y + 1, AXES_BACKGROUND)
+        self.text(x, y0 + pad, text, background=fill, ha="center", va="top")
+
+    def to_png(self) -> bytes:
+        stride = self.width * 3
+        # every scanline starts with filter type byte, 0 means no filter
+        raw = bytearray()
+        for offset in range(0, len(self.pixels), stride):
+            end = offset + stride
+            raw += b"\x00" + self.pixels[offset:end]
+
+        def chunk(kind: bytes, data: bytes) -> bytes:
+            return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+        return (
+            b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 6))
+            + chunk(b"IEND", b"")
+        )
+
+
+def render_chart(chart_days: list[ChartDay], title: str) -> bytes:
+    canvas = Canvas(WIDTH, HEIGHT, FIGURE_BACKGROUND)
+    axes_width = AXES_RIGHT - AXES_LEFT
+    hours_height = HOURS_AXES_BOTTOM - HOURS_AXES_TOP
+    percent_height = PERCENT_AXES_BOTTOM - PERCENT_AXES_TOP
+
+    def to_x(value: float) -> int:
+        return AXES_LEFT + round((value + 0.2) / (len(chart_days) or 1) * axes_width)
+
+    def hours_to_y(value: float) -> int:
+        return HOURS_AXES_BOTTOM - round(value / 24 * hours_height)
+
+    def percent_to_y(value: float) -> int:
+        return PERCENT_AXES_BOTTOM - round((value + 40) / 200 * percent_height)
+
+    canvas.text(WIDTH // 2, 40, title, font_size=TITLE_FONT, ha="center", va="center")
+    canvas.fill_rect(AXES_LEFT, HOURS_AXES_TOP, AXES_RIGHT, HOURS_AXES_BOTTOM, AXES_BACKGROUND)
+    canvas.fill_rect(AXES_LEFT, PERCENT_AXES_TOP, AXES_RIGHT, PERCENT_AXES_BOTTOM, AXES_BACKGROUND)
+
+    for i, chart_day in enumerate(chart_days):
+        canvas.fill_rect(to_x(i), HOURS_AXES_TOP, to_x(i + 0.8), HOURS_AXES_BOTTOM, GREEN)
+        for start_h, duration_h in chart_day.outages:
+            canvas.fill_rect(to_x(i), hours_to_y(start_h + duration_h), to_x(i + 0.8), hours_to_y(start_h), RED)
+
+    for hour in range(0, 25, 2):
+        y = min(hours_to_y(hour), HOURS_AXES_BOTTOM - 1)
+        canvas.hline(AXES_LEFT, AXES_RIGHT, y, GRID_COLOR, alpha=0.5, dash=(4, 2))
+        canvas.fill_rect(AXES_LEFT - 5, y, AXES_LEFT, y + 1, BLACK)
+        canvas.text(AXES_LEFT - 8, y, f"{hour:02d}:00", ha="right", va="center")
+
+    for value in range(0, 101, 20):
+        y = percent_to_y(value)
+        canvas.hline(AXES_LEFT, AXES_RIGHT, y, GRID_COLOR, alpha=0.3, dash=(1, 2))
+        canvas.fill_rect(AXES_LEFT - 5, y, AXES_LEFT, y + 1, BLACK)
+        canvas.text(AXES_LEFT - 8, y, f"{value}%", ha="right", va="center")
+
+    canvas.rect_outline(AXES_LEFT, HOURS_AXES_TOP, AXES_RIGHT, HOURS_AXES_BOTTOM, BLACK)
+    canvas.rect_outline(AXES_LEFT, PERCENT_AXES_TOP, AXES_RIGHT, PERCENT_AXES_BOTTOM, BLACK)
+    canvas.vertical_text(45, (HOURS_AXES_TOP + HOURS_AXES_BOTTOM) // 2, "Світло погодинно")
+    canvas.vertical_text(45, (PERCENT_AXES_TOP + PERCENT_AXES_BOTTOM) // 2, "Світло у %")
+    canvas.text((AXES_LEFT + AXES_RIGHT) // 2, PERCENT_AXES_BOTTOM + 35, "Дата", ha="center", va="top")
+
+    points = [(to_x(i + 0.4), percent_to_y(chart_day.availability)) for i, chart_day in enumerate(chart_days)]
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+        canvas.line(x0, y0, x1, y1, LINE_COLOR)
+
+    for (day, _, occupied, free, pct), (x, y) in zip(chart_days, points):
+        occ_h = int(occupied)
+        occ_m = int((occupied - occ_h) * 60)
+        free_h = int(free)
+        free_m = int((free - free_h) * 60)
+
+        canvas.disc(x, y, 4, LINE_COLOR)
+        for tick_top in (HOURS_AXES_BOTTOM, PERCENT_AXES_BOTTOM):
+            canvas.fill_rect(x, tick_top, x + 1, tick_top + 5, BLACK)
+
+        canvas.text(
+            x,
+            percent_to_y(pct + 10),
+            f"{pct:.0f}%",
+            font_size=SMALL_FONT,
+            background=AXES_BACKGROUND,
+            ha="center",
+            va="bottom",
+        )
+        canvas.badge(x, percent_to_y(-30), f"{occ_h}г. {occ_m}хв.", ORANGE, va="bottom")
+        canvas.badge(x, percent_to_y(150), f"{free_h}г. {free_m}хв.", LIGHT_GREEN, va="top")
+        canvas.text(
+            x,
+            PERCENT_AXES_BOTTOM + 8,
+            f"{day.day} {months_map[day.month]} {day.year} ({weekdays_map[day.isoweekday()]})",
+            ha="center",
+            va="top",
+        )
+
+    return canvas.to_png()
+
+
+def render_heatmap(heatmap: Heatmap, title: str) -> bytes:
+    """
+    Report layout of `chart.HeatmapTemplate`. Every hour of day is one scanline of cells copied to all its pixel rows,
+    so drawing takes the same time for a month and for a year, and does not depend on outages at all.
+    """
+    canvas = Canvas(WIDTH, HEIGHT, FIGURE_BACKGROUND)
+    days = len(heatmap.days)
+    axes_width = HEATMAP_RIGHT - AXES_LEFT
+    hours_height = HOURS_AXES_BOTTOM - HOURS_AXES_TOP
+    percent_height = PERCENT_AXES_BOTTOM - PERCENT_AXES_TOP
+
+    def to_x(value: float) -> int:
+        return AXES_LEFT + round(value / (days or 1) * axes_width)
+
+    def hours_to_y(value: float) -> int:
+        return HOURS_AXES_BOTTOM - round(value / 24 * hours_height)
+
+    def percent_to_y(value: float) -> int:
+        return PERCENT_AXES_BOTTOM - round((value + 5) / 110 * percent_height)
+
+    canvas.text(WIDTH // 2, 40, title, font_size=TITLE_FONT, ha="center", va="center")
+    canvas.fill_rect(AXES_LEFT, HOURS_AXES_TOP, HEATMAP_RIGHT, HOURS_AXES_BOTTOM, NO_DATA)
+    canvas.fill_rect(AXES_LEFT, PERCENT_AXES_TOP, HEATMAP_RIGHT, PERCENT_AXES_BOTTOM, AXES_BACKGROUND)
+
+    palette, no_data = heatmap_palette(), bytes(NO_DATA)
+    widths = [to_x(i + 1) - to_x(i) for i in range(days)]
+    for hour in range(24):
+        cells = heatmap.hourly[:, hour].tolist()
+        row = b"".join(
+            (no_data if math.isnan(cell) else palette[round(cell)]) * width for cell, width in zip(cells, widths)
+        )
+        canvas.fill_rows(AXES_LEFT, hours_to_y(hour + 1), hours_to_y(hour), row)
+
+    for y in range(HOURS_AXES_TOP, HOURS_AXES_BOTTOM):
+        percent = (HOURS_AXES_BOTTOM - y) / hours_height * 100
+        canvas.fill_rect(COLORBAR_LEFT, y, COLORBAR_RIGHT, y + 1, heatmap_color(percent))
+    canvas.rect_outline(COLORBAR_LEFT, HOURS_AXES_TOP, COLORBAR_RIGHT, HOURS_AXES_BOTTOM, BLACK)
+    for percent in range(0, 101, 20):
+        y = min(HOURS_AXES_BOTTOM - round(percent / 100 * hours_height), HOURS_AXES_BOTTOM - 1)
+        canvas.fill_rect(COLORBAR_RIGHT, y, COLORBAR_RIGHT + 4, y + 1, BLACK)
+        canvas.text(COLORBAR_RIGHT + 6, y, f"{percent}%", font_size=SMALL_FONT, va="center")
+
+    for hour in range(0, 25, 2):
+        y = min(hours_to_y(hour), HOURS_AXES_BOTTOM - 1)
+        canvas.fill_rect(AXES_LEFT - 5, y, AXES_LEFT, y + 1, BLACK)
+        canvas.text(AXES_LEFT - 8, y, f"{hour:02d}:00", ha="right", va="center")
+
+    for value in range(0, 101, 20):
+        y = percent_to_y(value)
+        canvas.hline(AXES_LEFT, HEATMAP_RIGHT, y, GRID_COLOR, alpha=0.3, dash=(1, 2))
+        canvas.fill_rect(AXES_LEFT - 5, y, AXES_LEFT, y + 1, BLACK)
+        canvas.text(AXES_LEFT - 8, y, f"{value}%", ha="right", va="center")
+
+    canvas.rect_outline(AXES_LEFT, HOURS_AXES_TOP, HEATMAP_RIGHT, HOURS_AXES_BOTTOM, BLACK)
+    canvas.rect_outline(AXES_LEFT, PERCENT_AXES_TOP, HEATMAP_RIGHT, PERCENT_AXES_BOTTOM, BLACK)
+    canvas.vertical_text(45, (HOURS_AXES_TOP + HOURS_AXES_BOTTOM) // 2, "Світло погодинно")
+    canvas.vertical_text(45, (PERCENT_AXES_TOP + PERCENT_AXES_BOTTOM) // 2, "Світло у %")
+    canvas.text((AXES_LEFT + HEATMAP_RIGHT) // 2, PERCENT_AXES_BOTTOM + 35, "Дата", ha="center", va="top")
+
+    points = [(to_x(i + 0.5), percent_to_y(value)) for i, value in enumerate(heatmap.daily.tolist())]
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+        canvas.line(x0, y0, x1, y1, LINE_COLOR)
+
+    for index, label in heatmap_ticks(heatmap.days):
+        x = to_x(index + 0.5)
+        canvas.fill_rect(x, PERCENT_AXES_BOTTOM, x + 1, PERCENT_AXES_BOTTOM + 5, BLACK)
+        canvas.text(x, PERCENT_AXES_BOTTOM + 8, label, font_size=SMALL_FONT, ha="center", va="top")
+
+    return canvas.to_png()
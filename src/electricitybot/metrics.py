@@ -0,0 +1,182 @@
+"""
+Minimal in-process metrics in Prometheus text format. Recording is a dict lookup, a bisect and a few additions,
+so it is cheap enough to do on every probe; the text is built only when the endpoint is scraped.
+"""
+
+import asyncio
+import bisect
+import math
+from functools import wraps
+from time import perf_counter
+from typing import Callable
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (16_384, 32_768, 65_536, 131_072, 262_144, 524_288, 1_048_576, 2_097_152, 4_194_304)
+
+
+def format_labels(labelnames: tuple[str, ...], labelvalues: tuple[str, ...], **extra: str) -> str:
+    pairs = [*zip(labelnames, labelvalues), *extra.items()]
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{format_labels(self.labelnames, labelvalues)} {format_value(value)}"
+            for labelvalues, value in sorted(self.values.items())
+        ]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # per label values: count in every bucket (not cumulative, last one is +Inf), sum
+        self.values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labelvalues: str):
+        values = self.values.get(labelvalues)
+        if values is None:
+            values = self.values[labelvalues] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = values
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def samples(self) -> list[str]:
+        lines = []
+        for labelvalues, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                labels = format_labels(self.labelnames, labelvalues, le=format_value(float(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {format_value(total[0])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Counter | Histogram] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def exposition(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+PROBE_DURATION = registry.histogram(
+    "electricitybot_probe_duration_seconds", "Time taken by single probe including timeout.", ("method",)
+)
+PROBE_RTT = registry.histogram("electricitybot_probe_rtt_seconds", "Round trip time of successful probes.", ("method",))
+PROBE_RESULTS = registry.counter("electricitybot_probes_total", "Probes made.", ("method", "result"))
+TICK_LAG = registry.histogram(
+    "electricitybot_tick_lag_seconds", "Delay of scheduled job start after its planned time.", ("job",)
+)
+STORAGE_LATENCY = registry.histogram(
+    "electricitybot_storage_seconds", "Time taken by storage operations.", ("operation",)
+)
+CHART_RENDER = registry.histogram("electricitybot_chart_render_seconds", "Time taken to render chart.", ("renderer",))
+CHART_SIZE = registry.histogram(
+    "electricitybot_chart_bytes", "Size of rendered chart image.", ("renderer",), buckets=SIZE_BUCKETS
+)
+TELEGRAM_LATENCY = registry.histogram(
+    "electricitybot_telegram_seconds", "Time taken by Telegram API calls.", ("method",)
+)
+TELEGRAM_ERRORS = registry.counter(
+    "electricitybot_telegram_errors_total", "Failed Telegram API calls.", ("method", "error")
+)
+COMMANDS = registry.counter("electricitybot_commands_total", "Commands answered.", ("command",))
+
+
+def timed(histogram: Histogram, *labelvalues: str) -> Callable:
+    """
+    Records duration of every call of decorated function into `histogram`.
+    """
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.observe(perf_counter() - started, *labelvalues)
+
+        return wrapper
+
+    return decorator
+
+
+async def handle_scrape(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()).strip():
+            # headers are not needed
+            pass
+
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, body = "200 OK", registry.exposition().encode()
+        else:
+            status, body = "404 Not Found", b"Not found\n"
+
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve_metrics(host: str, port: int):
+    server = await asyncio.start_server(handle_scrape, host, port)
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import logging
+from datetime import timedelta
+from time import perf_counter, time
+from typing import TYPE_CHECKING
+
+from electricitybot.metrics import TELEGRAM_ERRORS, TELEGRAM_LATENCY
+from electricitybot.storage import OutageStore, OutboxItem
+
+if TYPE_CHECKING:  # pragma: no cover
+    import telegram
+
+logger = logging.getLogger(__name__)
+
+# pending calls looked at when picking calls to deliver concurrently
+DELIVERY_WINDOW = 100
+# file_id of uploaded photos kept for reuse
+UPLOADS_TO_KEEP = 16
+
+
+class Outbox:
+    """
+    Persistent queue in front of Telegram bot. Calls are kept in the store until delivered, so they survive restart,
+    and are delivered one by one in order they were queued.
+
+    Calls to different chats are delivered concurrently, up to `max_concurrency` at once, calls to the same chat
+    stay in order. Photo is uploaded once: the same image sent to other chats reuses `file_id` of the first upload.
+
+    Failed call is retried with exponential backoff (or after the time Telegram asked to wait on flood control),
+    calls Telegram rejected are dropped. State messages queued with the same coalesce key replace each other while
+    waiting, and message sent less than `coalesce_window` seconds ago is edited instead of sending new one.
+    """
+
+    def __init__(
+        self,
+        tg_bot: "telegram.Bot",
+        store: OutageStore,
+        coalesce_window: float = 120,
+        retry_delay: float = 1,
+        max_retry_delay: float = 300,
+        max_concurrency: int = 1,
+    ):
+        self.tg_bot = tg_bot
+        self.store = store
+        self.coalesce_window = coalesce_window
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_concurrency = max_concurrency
+        self._wakeup = asyncio.Event()
+        # photo digest: file_id once uploaded, future of file_id while the first upload is in progress
+        self._uploads: dict[bytes, str | asyncio.Future] = {}
+
+    def put(self, method: str, coalesce_key: str | None = None, **kwargs):
+        self.store.enqueue(method, kwargs, coalesce_key)
+        self._wakeup.set()
+
+    async def deliver(self, item: OutboxItem):
+        started = perf_counter()
+        try:
+            await self._call(item)
+        except Exception as error:
+            TELEGRAM_ERRORS.inc(item.method, type(error).__name__)
+            self._retry_or_drop(item, error)
+        else:
+            self.store.dequeue(item)
+        finally:
+            TELEGRAM_LATENCY.observe(perf_counter() - started, item.method)
+
+    def _retry_or_drop(self, item: OutboxItem, error: Exception):
+        # Telegram client is imported on first failure, not when the bot starts
+        from telegram.error import BadRequest, NetworkError, RetryAfter
+
+        if isinstance(error, RetryAfter):
+            retry_after = error.retry_after
+            if isinstance(retry_after, timedelta):
+                retry_after = retry_after.total_seconds()
+            logger.warning("Flood control on %s, retrying in %s s", item.method, retry_after)
+            self.store.postpone(item.id, time() + retry_after)
+        elif isinstance(error, BadRequest):
+            logger.exception("Telegram rejected %s to %s, dropping it", item.method, item.kwargs.get("chat_id"))
+            self.store.dequeue(item)
+        elif isinstance(error, NetworkError):
+            delay = min(self.retry_delay * 2**item.attempts, self.max_retry_delay)
+            logger.warning("Failed to deliver %s, retrying in %s s", item.method, delay, exc_info=True)
+            self.store.postpone(item.id, time() + delay)
+        else:
+            logger.exception("Failed to deliver %s to %s, dropping it", item.method, item.kwargs.get("chat_id"))
+            self.store.dequeue(item)
+
+    async def _call(self, item: OutboxItem):
+        if item.method == "send_photo" and isinstance(item.kwargs.get("photo"), bytes):
+            await self._send_photo(item.kwargs)
+            return
+
+        if item.coalesce_key is None or item.method != "send_message":
+            await getattr(self.tg_bot, item.method)(**item.kwargs)
+            return
+
+        last_message = self.store.get_value(item.coalesce_key, "last_message")
+        if last_message:
+            message_id, sent_at = last_message.split(":")
+            if time() - float(sent_at) < self.coalesce_window:
+                from telegram.error import BadRequest
+
+                try:
+                    await self.tg_bot.edit_message_text(
+                        chat_id=item.kwargs["chat_id"], message_id=int(message_id), text=item.kwargs["text"]
+                    )
+                    return
+                except BadRequest as error:
+                    if "not modified" in error.message:
+                        return
+                    # message can not be edited anymore, send new one
+
+        message = await self.tg_bot.send_message(**item.kwargs)
+        self.store.set_value(item.coalesce_key, "last_message", f"{message.message_id}:{time()}")
+
+    async def _send_photo(self, kwargs: dict):
+        digest = hashlib.sha256(kwargs["photo"]).digest()
+        upload = self._uploads.get(digest)
+        while isinstance(upload, asyncio.Future):
+            # shielded, so cancelled delivery does not cancel the upload others wait for
+            await asyncio.shield(upload)
+            # after failed upload the first one to get here uploads the photo again
+            upload = self._uploads.get(digest)
+        if upload is not None:
+            await self.tg_bot.send_photo(**{**kwargs, "photo": upload})
+            return
+
+        future = self._uploads[digest] = asyncio.get_running_loop().create_future()
+        try:
+            message = await self.tg_bot.send_photo(**kwargs)
+        except BaseException:
+            del self._uploads[digest]
+            future.set_result(None)
+            raise
+        file_id = message.photo[-1].file_id
+        future.set_result(file_id)
+        self._uploads[digest] = file_id
+        if len(self._uploads) > UPLOADS_TO_KEEP:
+            del self._uploads[next(iter(self._uploads))]
+
+    async def flush(self):
+        """
+        Tries to deliver every call that is due now.
+        """
+        delivered = set()
+        while (item := self.store.outbox_head()) and item.not_before <= time() and item.id not in delivered:
+            delivered.add(item.id)
+            await self.deliver(item)
+
+    async def deliver_forever(self):
+        deliveries: dict[asyncio.Task, str] = {}
+        try:
+            while True:
+                self._wakeup.clear()
+                next_due = self._start_deliveries(deliveries)
+                wakeup = asyncio.create_task(self._wakeup.wait())
+                try:
+                    done, _ = await asyncio.wait(
+                        [*deliveries, wakeup],
+                        timeout=None if next_due is None else max(next_due - time(), 0),
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                finally:
+                    wakeup.cancel()
+                for task in done - {wakeup}:
+                    deliveries.pop(task)
+                    task.result()
+        finally:
+            for task in deliveries:
+                task.cancel()
+
+    def _start_deliveries(self, deliveries: dict[asyncio.Task, str]) -> float | None:
+        """
+        Starts delivery of due calls to chats that have no call in progress or waiting before them.
+        Returns the time the first postponed call is due at.
+        """
+        busy_chats = set(deliveries.values())
+        next_due = None
+        for item in self.store.outbox_items(DELIVERY_WINDOW):
+            chat_id = str(item.kwargs.get("chat_id"))
+            if chat_id in busy_chats:
+                continue
+            # later calls to this chat wait for this one
+            busy_chats.add(chat_id)
+            if item.not_before > time():
+                next_due = item.not_before if next_due is None else min(next_due, item.not_before)
+            elif len(deliveries) < self.max_concurrency:
+                deliveries[asyncio.create_task(self.deliver(item))] = chat_id
+        return next_due
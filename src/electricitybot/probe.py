@@ -0,0 +1,173 @@
+import asyncio
+import itertools
+import os
+import re
+import socket
+import struct
+import subprocess
+from time import monotonic, perf_counter
+from typing import NamedTuple
+
+from electricitybot.metrics import PROBE_DURATION, PROBE_RESULTS, PROBE_RTT
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+ICMP_PAYLOAD = b"electricitybot"
+PING_TIME = re.compile(rb"time[=<]([\d.]+) ms")
+
+
+class ProbeResult(NamedTuple):
+    success: bool
+    rtt: float | None = None
+
+
+def checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo_request(identifier: int, sequence: int, payload: bytes = ICMP_PAYLOAD) -> bytes:
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, checksum(header + payload), identifier, sequence) + payload
+
+
+def parse_echo_reply(data: bytes, has_ip_header: bool) -> tuple[int, int] | None:
+    """
+    Returns (identifier, sequence) of an ICMP echo reply or None for any other packet.
+    """
+    if has_ip_header:
+        ip_header_length = (data[0] & 0x0F) * 4
+        data = data[ip_header_length:]
+    if len(data) < 8:
+        return None
+    icmp_type, _, _, identifier, sequence = struct.unpack("!BBHHH", data[:8])
+    if icmp_type != ICMP_ECHO_REPLY:
+        return None
+    return identifier, sequence
+
+
+def system_ping(host: str) -> ProbeResult:
+    """
+    Single probe by system `ping` command, blocks until it exits. Round trip time is taken from its output.
+    """
+    started = perf_counter()
+    result = subprocess.run(["ping", "-c", "1", host], capture_output=True)
+    PROBE_DURATION.observe(perf_counter() - started, "ping")
+    PROBE_RESULTS.inc("ping", "success" if result.returncode == 0 else "failure")
+    if result.returncode != 0:
+        return ProbeResult(False)
+
+    match = PING_TIME.search(result.stdout)
+    rtt = float(match.group(1)) / 1000 if match else None
+    if rtt is not None:
+        PROBE_RTT.observe(rtt, "ping")
+    return ProbeResult(True, rtt)
+
+
+def open_icmp_socket() -> socket.socket:
+    """
+    Opens unprivileged ICMP datagram socket (net.ipv4.ping_group_range) and falls back to raw socket.
+    Raises PermissionError when neither is allowed.
+    """
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+    except PermissionError:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+    sock.setblocking(False)
+    return sock
+
+
+async def resolve(host: str) -> str:
+    try:
+        socket.inet_aton(host)
+        return host
+    except OSError:
+        loop = asyncio.get_running_loop()
+        address_info = await loop.getaddrinfo(host, None, family=socket.AF_INET)
+        return address_info[0][4][0]
+
+
+async def icmp_echo(host: str, timeout: float, sequence: int) -> float | None:
+    """
+    Sends one ICMP echo request and returns round trip time in seconds or None when there was no reply.
+    """
+    loop = asyncio.get_running_loop()
+    address = await resolve(host)
+    identifier = os.getpid() & 0xFFFF
+
+    with open_icmp_socket() as sock:
+        is_raw = sock.type == socket.SOCK_RAW
+
+        async def wait_for_reply():
+            while True:
+                reply = parse_echo_reply(await loop.sock_recv(sock, 1024), has_ip_header=is_raw)
+                # datagram sockets get identifier rewritten by kernel, so only sequence is ours
+                if reply and reply[1] == sequence and (not is_raw or reply[0] == identifier):
+                    return
+
+        started = monotonic()
+        try:
+            sock.connect((address, 0))
+            await loop.sock_sendall(sock, build_echo_request(identifier, sequence))
+            await asyncio.wait_for(wait_for_reply(), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return None
+
+        return monotonic() - started
+
+
+async def tcp_connect(host: str, port: int, timeout: float) -> float | None:
+    """
+    Opens TCP connection and returns time it took in seconds or None when host did not answer.
+    Refused connection still means that host is up.
+    """
+    started = monotonic()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except ConnectionRefusedError:
+        return monotonic() - started
+    except (OSError, asyncio.TimeoutError):
+        return None
+
+    rtt = monotonic() - started
+    writer.close()
+    return rtt
+
+
+class Prober:
+    methods = ("icmp", "tcp")
+
+    def __init__(self, method: str = "icmp", timeout: float = 1.0, tcp_port: int = 80):
+        if method not in self.methods:
+            raise ValueError(f"Unknown probe method {method!r}, expected one of {self.methods}")
+
+        self.method = method
+        self.timeout = timeout
+        self.tcp_port = tcp_port
+        self._sequence = itertools.count()
+
+    async def probe(self, host: str) -> ProbeResult:
+        started = perf_counter()
+        result = await self._probe(host)
+        PROBE_DURATION.observe(perf_counter() - started, self.method)
+        PROBE_RESULTS.inc(self.method, "success" if result.success else "failure")
+        if result.success:
+            PROBE_RTT.observe(result.rtt, self.method)
+        return result
+
+    async def _probe(self, host: str) -> ProbeResult:
+        if self.method == "icmp":
+            try:
+                rtt = await icmp_echo(host, self.timeout, next(self._sequence) & 0xFFFF)
+            except PermissionError:
+                # no way to send ICMP from this process, stick to TCP from now on
+                self.method = "tcp"
+            else:
+                return ProbeResult(rtt is not None, rtt)
+
+        rtt = await tcp_connect(host, self.tcp_port, self.timeout)
+        return ProbeResult(rtt is not None, rtt)
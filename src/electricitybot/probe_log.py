@@ -0,0 +1,117 @@
+import math
+import os
+import struct
+import tempfile
+from typing import NamedTuple
+
+import numpy as np
+
+MAGIC = b"EBP1"
+# magic, padding, capacity, count of records ever written
+HEADER = struct.Struct("<4s4xQQ")
+HEADER_SIZE = 32
+RECORD_DTYPE = np.dtype(
+    {"names": ["time", "rtt", "success"], "formats": ["<f8", "<f4", "u1"], "offsets": [0, 8, 12], "itemsize": 16}
+)
+
+
+class ProbeSummary(NamedTuple):
+    """
+    Probes of a time range, `start` is the start of the range (or of the hour for hourly summary).
+    Round trip times are in seconds, None when no probe got a reply.
+    """
+
+    start: float
+    probes: int
+    loss: float
+    rtt_p50: float | None
+    rtt_p95: float | None
+
+
+def summarize(records: np.ndarray, start: float) -> ProbeSummary:
+    rtt = records["rtt"][records["success"].astype(bool) & ~np.isnan(records["rtt"])]
+    p50, p95 = np.percentile(rtt, [50, 95]).tolist() if len(rtt) else (None, None)
+    loss = 1 - np.count_nonzero(records["success"]) / len(records) if len(records) else 0.0
+    return ProbeSummary(start, len(records), float(loss), p50, p95)
+
+
+def probe_log_path(directory: str, target: str) -> str:
+    return os.path.join(directory, f"probes_{target}.ring")
+
+
+class ProbeLog:
+    """
+    Every probe (time, success, round trip time) of a target in a fixed-size ring buffer file mapped to memory:
+    size of the file and memory it takes do not depend on how long the bot runs, the newest `capacity` probes
+    are kept, and they survive restarts.
+
+    Record `i` goes to slot `i % capacity`, header keeps count of records ever written. Writer fills the slot
+    first and bumps the count after, so a reader in another process needs no lock: it reads the count before
+    and after copying slots and drops the ones the writer could be overwriting meanwhile. Only one process
+    should write.
+    """
+
+    def __init__(self, path: str, capacity: int = 2**18, readonly: bool = False):
+        if not readonly and not os.path.exists(path):
+            self._create(path, capacity)
+
+        self.path = path
+        self._buffer = np.memmap(path, dtype=np.uint8, mode="r" if readonly else "r+")
+        magic, self.capacity, _ = HEADER.unpack_from(self._buffer)
+        if magic != MAGIC or len(self._buffer) != HEADER_SIZE + self.capacity * RECORD_DTYPE.itemsize:
+            raise ValueError(f"{path} is not a probe log")
+        self._count = np.ndarray(1, dtype="<u8", buffer=self._buffer, offset=16)
+        self._records = np.ndarray(self.capacity, dtype=RECORD_DTYPE, buffer=self._buffer, offset=HEADER_SIZE)
+
+    @staticmethod
+    def _create(path: str, capacity: int):
+        """
+        File is filled aside and linked in place, so another process never sees it half written,
+        and if both create it at once, one of them just opens the file of the other.
+        """
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".")
+        try:
+            with os.fdopen(descriptor, "wb") as temporary_file:
+                temporary_file.write(HEADER.pack(MAGIC, capacity, 0).ljust(HEADER_SIZE, b"\x00"))
+                temporary_file.truncate(HEADER_SIZE + capacity * RECORD_DTYPE.itemsize)
+            os.link(temporary_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(temporary_path)
+
+    def __len__(self) -> int:
+        return min(int(self._count[0]), self.capacity)
+
+    def append(self, at: float, success: bool, rtt: float | None = None):
+        count = int(self._count[0])
+        self._records[count % self.capacity] = (at, math.nan if rtt is None else rtt, success)
+        self._count[0] = count + 1
+
+    def records(self, since: float = -math.inf, until: float = math.inf) -> np.ndarray:
+        """
+        Copy of probes made within [since, until), oldest first.
+        """
+        before = int(self._count[0])
+        first = max(0, before - self.capacity)
+        records = self._records[np.arange(first, before) % self.capacity]
+        # slots of records written (or being written) meanwhile, the oldest ones, are no longer what was read
+        overwritten = max(0, int(self._count[0]) + 1 - self.capacity - first)
+        records = records[overwritten:]
+        return records[(records["time"] >= since) & (records["time"] < until)]
+
+    def summary(self, since: float, until: float) -> ProbeSummary:
+        return summarize(self.records(since, until), since)
+
+    def hourly(self, since: float, until: float) -> list[ProbeSummary]:
+        """
+        Summary of every hour of [since, until) that has probes. Hours start at whole hours of UTC,
+        which are whole hours of local time too.
+        """
+        records = self.records(since, until)
+        hours = np.floor(records["time"] / 3600) * 3600
+        return [summarize(records[hours == hour], float(hour)) for hour in np.unique(hours)]
+
+    def close(self):
+        self._buffer.flush()
+        del self._count, self._records, self._buffer
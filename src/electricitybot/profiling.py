@@ -0,0 +1,175 @@
+"""
+Opt-in profiling of loop ticks for diagnosing a live bot. Every `PROFILE_EVERY`-th call of each tick decorated
+with `profiled` is run under cProfile and tracemalloc, and its report (wall time, memory, functions that took
+the most time and allocation sites of memory the tick left behind) is written to `PROFILE_DIR`, which keeps only
+`PROFILE_KEEP` newest reports.
+
+Profiling is on when `PROFILING=true`, and `SIGUSR2` flips it in a running process, so a container can be
+diagnosed without restart. Ticks that are not sampled cost a dict lookup.
+"""
+
+import cProfile
+import inspect
+import io
+import logging
+import os
+import pstats
+import resource
+import signal
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from time import perf_counter, time
+from typing import Callable, Iterator
+
+from electricitybot.settings import settings
+
+logger = logging.getLogger(__name__)
+
+REPORT_SUFFIX = ".tick.txt"
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 20
+# allocations made by profiling and tracing itself are not what the tick did
+ALLOCATION_FILTERS = (
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+)
+
+
+class TickProfiler:
+    """
+    Samples ticks by name. Only one tick is profiled at a time: a tick that starts while another one is profiled
+    runs as usual (Python allows one active profiler per thread). An async tick is profiled until it returns,
+    so its report also has whatever other tasks the loop ran while it waited.
+    """
+
+    def __init__(self):
+        self.calls: dict[str, int] = {}
+        self.toggled = False
+        self.busy = False
+
+    @property
+    def active(self) -> bool:
+        return settings.profiling != self.toggled
+
+    def toggle(self, *_):
+        """
+        Flips profiling, handler of `SIGUSR2`.
+        """
+        self.toggled = not self.toggled
+        logger.info("Tick profiling is %s", "on" if self.active else "off")
+
+    @contextmanager
+    def tick(self, name: str) -> Iterator[None]:
+        calls = self.calls[name] = self.calls.get(name, 0) + 1
+        if self.busy or not self.active or calls % settings.profile_every:
+            yield
+            return
+
+        self.busy = True
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        profile = cProfile.Profile()
+        started_at, started = time(), perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            seconds = perf_counter() - started
+            after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if started_tracing:
+                tracemalloc.stop()
+            self.busy = False
+            try:
+                self.write_report(name, started_at, seconds, peak, profile, before, after)
+            except OSError:
+                logger.exception("Failed to write profile of %s", name)
+
+    def write_report(
+        self,
+        name: str,
+        started_at: float,
+        seconds: float,
+        peak: int,
+        profile: cProfile.Profile,
+        before: tracemalloc.Snapshot,
+        after: tracemalloc.Snapshot,
+    ):
+        allocations = after.filter_traces(ALLOCATION_FILTERS).compare_to(
+            before.filter_traces(ALLOCATION_FILTERS), "lineno"
+        )
+        retained = sum(stat.size_diff for stat in allocations)
+        allocations = [stat for stat in allocations if stat.size_diff > 0][:TOP_ALLOCATIONS]
+        functions = io.StringIO()
+        pstats.Stats(profile, stream=functions).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+
+        report = "\n".join(
+            [
+                f"tick: {name}",
+                f"started: {datetime.fromtimestamp(started_at).isoformat()}",
+                f"wall: {seconds * 1000:.3f} ms",
+                f"traced memory: {retained / 1024:.1f} KiB left by tick, peak {peak / 1024:.1f} KiB",
+                # kilobytes on Linux
+                f"max rss: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB",
+                "",
+                "top allocation sites:",
+                *(f"  {stat}" for stat in allocations),
+                "",
+                functions.getvalue(),
+            ]
+        )
+
+        os.makedirs(settings.profile_dir, exist_ok=True)
+        # names start with time, so they sort in order reports were made
+        path = os.path.join(settings.profile_dir, f"{datetime.fromtimestamp(started_at):%Y%m%dT%H%M%S.%f}-{name}")
+        with open(path + REPORT_SUFFIX, "w") as report_file:
+            report_file.write(report)
+        self.rotate()
+
+    def rotate(self):
+        reports = sorted(name for name in os.listdir(settings.profile_dir) if name.endswith(REPORT_SUFFIX))
+        for name in reports[: max(len(reports) - settings.profile_keep, 0)]:
+            os.unlink(os.path.join(settings.profile_dir, name))
+
+
+profiler = TickProfiler()
+
+
+def profiled(function: Callable) -> Callable:
+    """
+    Makes calls of decorated function (or coroutine function) ticks sampled by `profiler`. While profiling
+    is off calls go straight to the function, they are not counted.
+    """
+    name = function.__qualname__
+
+    if inspect.iscoroutinefunction(function):
+
+        @wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            if not profiler.active:
+                return await function(*args, **kwargs)
+            with profiler.tick(name):
+                return await function(*args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        if not profiler.active:
+            return function(*args, **kwargs)
+        with profiler.tick(name):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+def install_signal_handler():
+    signal.signal(signal.SIGUSR2, profiler.toggle)
@@ -0,0 +1,51 @@
+import asyncio
+import logging
+import math
+from typing import Awaitable, Callable
+
+from electricitybot.metrics import TICK_LAG
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveInterval:
+    """
+    Probe interval that grows geometrically up to `slow` while probes agree with known state,
+    and drops to `fast` when a probe disagrees with it or right after the state has changed.
+    """
+
+    def __init__(self, fast: float, initial: float, slow: float, growth: float = 1.5):
+        self.fast = fast
+        self.slow = slow
+        self.growth = growth
+        self.value = initial
+
+    def __call__(self) -> float:
+        return self.value
+
+    def update(self, calm: bool):
+        self.value = min(self.value * self.growth, self.slow) if calm else self.fast
+
+
+async def run_every(interval: float | Callable[[], float], job: Callable[[], Awaitable]):
+    """
+    Runs `job` at fixed rate: next run is started `interval` seconds after start of the previous one no matter
+    how long runs take, so delays do not add up. Runs missed while `job` took longer than `interval` are skipped.
+    `interval` can be a callable, then it is asked for interval after every run.
+    Failed run is logged and does not stop the next ones.
+    """
+    loop = asyncio.get_running_loop()
+    job_name = getattr(job, "__name__", "job")
+    next_run = loop.time()
+    while True:
+        TICK_LAG.observe(loop.time() - next_run, job_name)
+        try:
+            await job()
+        except Exception:
+            logger.exception("%s failed", job_name)
+        current_interval = interval() if callable(interval) else interval
+        next_run += current_interval
+        now = loop.time()
+        if next_run < now:
+            next_run += math.ceil((now - next_run) / current_interval) * current_interval
+        await asyncio.sleep(next_run - now)
@@ -1,22 +1,101 @@
 from contextlib import contextmanager
-from typing import Union
+from typing import Literal, Union
 
+from pydantic import BaseModel, Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+class Destination(BaseModel):
+    chat_id: str
+    thread_id: Union[int, None] = None
+
+
+class Target(BaseModel):
+    ip_to_check: str
+    chat_id: str
+    thread_id: Union[int, None] = None
+    label: str = ""
+    chart_title: Union[str, None] = None
+    # chats notified besides `chat_id`
+    destinations: list[Destination] = []
+
+
 class Settings(BaseSettings):
-    model_config = SettingsConfigDict(env_file=".env")
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
     api_token: str
-    chat_id: str
-    ip_to_check: str
-    retries_count: int = 3
-    sleep_between_retry: int = 2
+    chat_id: Union[str, None] = None
+    ip_to_check: Union[str, None] = None
+    label: str = ""
+    chart_title: Union[str, None] = None
+    targets: list[Target] = []
+    destinations: list[Destination] = []
     timeout: int = 60
     send_weekly_stats: bool = True
-    stats_day_of_week: int = 1
-    stats_hour: int = 12
+    send_monthly_stats: bool = False
+    send_yearly_stats: bool = False
+    stats_day_of_week: int = Field(1, ge=1, le=7)
+    stats_hour: int = Field(12, ge=0, le=23)
+    stats_prerender_minutes: float = Field(30, ge=0)
     thread_id: Union[int, None] = None
+    probe_method: Literal["ping", "icmp", "tcp"] = "ping"
+    probe_timeout: float = 1.0
+    tcp_probe_port: int = 80
+    probe_log_dir: Union[str, None] = None
+    probe_log_size: int = Field(2**18, ge=16)
+    storage_path: str = "power_outage_intervals.sqlite3"
+    raw_history_days: int = Field(90, ge=8)
+    chart_renderer: Literal["matplotlib", "lite"] = "matplotlib"
+    coalesce_window: float = 120
+    max_retry_delay: float = 300
+    telegram_pool_size: int = Field(8, ge=1)
+    fast_probe_interval: float = 5
+    # probes slow down while state is stable only when it is set above TIMEOUT
+    max_probe_interval: Union[float, None] = None
+    probe_interval_growth: float = Field(1.5, ge=1)
+    hysteresis_window: int = Field(3, ge=1)
+    hysteresis_threshold: int = Field(2, ge=1)
+    handle_commands: bool = False
+    metrics_host: str = "127.0.0.1"
+    metrics_port: Union[int, None] = None
+    process_mode: Literal["single", "split"] = "single"
+    state_poll_interval: float = Field(1, gt=0)
+    state_snapshot_interval: float = Field(60, gt=0)
+    worker_niceness: int = Field(10, ge=0, le=19)
+    probe_metrics_port: Union[int, None] = None
+    profiling: bool = False
+    profile_dir: str = "profiles"
+    profile_every: int = Field(10, ge=1)
+    profile_keep: int = Field(50, ge=1)
+
+    @model_validator(mode="after")
+    def check_targets(self):
+        if not self.targets and not (self.ip_to_check and self.chat_id):
+            raise ValueError("Either TARGETS or both IP_TO_CHECK and CHAT_ID should be set")
+        if self.hysteresis_threshold > self.hysteresis_window:
+            raise ValueError("HYSTERESIS_THRESHOLD should not be greater than HYSTERESIS_WINDOW")
+        if self.process_mode == "split" and self.storage_path == ":memory:":
+            raise ValueError("Probe and worker processes share STORAGE_PATH, it should be a file in split mode")
+        return self
+
+    @property
+    def keeps_stats(self) -> bool:
+        return self.send_weekly_stats or self.send_monthly_stats or self.send_yearly_stats
+
+    @property
+    def slowest_probe_interval(self) -> float:
+        return self.timeout if self.max_probe_interval is None else self.max_probe_interval
+
+    @property
+    def default_target(self) -> Target:
+        return Target(
+            ip_to_check=self.ip_to_check,
+            chat_id=self.chat_id,
+            thread_id=self.thread_id,
+            label=self.label,
+            chart_title=self.chart_title,
+            destinations=self.destinations,
+        )
 
 
 settings = Settings()
@@ -0,0 +1,329 @@
+"""
+Replay of a probe timeline through the real detection pipeline on a virtual clock: adaptive probe interval,
+hysteresis, state messages, outage storage, daily stats and weekly charts run as they do in the bot, but probes
+answer from the timeline, Telegram calls are recorded instead of being sent and time jumps to the next timer
+instead of waiting for it. Intervals and hysteresis come from the same settings as the bot's (`TIMEOUT`,
+`FAST_PROBE_INTERVAL`, `HYSTERESIS_WINDOW`...).
+
+    python -m electricitybot.simulation --days 365 --noise 0.01 --max-false-alarms 100
+
+Nothing is sent to Telegram, so `API_TOKEN`, `CHAT_ID` and `IP_TO_CHECK` are not needed.
+"""
+
+import argparse
+import asyncio
+import bisect
+import os
+import random
+import selectors
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from time import perf_counter
+from types import SimpleNamespace
+from typing import NamedTuple
+
+# bot settings are loaded on import of the bot, placeholders stand for credentials that are not set
+for name, placeholder in (("API_TOKEN", "simulation"), ("CHAT_ID", "@simulation"), ("IP_TO_CHECK", "simulation")):
+    os.environ.setdefault(name, placeholder)
+
+from electricitybot.bot import ElectricityChecker, UKRAINE_TZ  # noqa: E402
+from electricitybot.scheduler import run_every  # noqa: E402
+from electricitybot.settings import override_settings, settings, Target  # noqa: E402
+from electricitybot.storage import OutageStore  # noqa: E402
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+class VirtualClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+class VirtualTimeSelector(selectors.DefaultSelector):
+    """
+    Selector that never waits: when the loop would wait for its next timer, `clock` jumps to it instead.
+    Nothing is polled, replay has no sockets and its executor runs jobs inline.
+    """
+
+    def __init__(self, clock: VirtualClock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout: float | None = None) -> list:
+        if timeout:
+            self.clock.now += timeout
+        return []
+
+
+class InlineExecutor(ThreadPoolExecutor):
+    """
+    Runs `asyncio.to_thread` jobs (chart rendering) right away in the loop's thread, so virtual time does not
+    move while they run and the replay is the same every time.
+    """
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as error:
+            future.set_exception(error)
+        return future
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        super().__init__(VirtualTimeSelector(clock))
+        self.set_default_executor(InlineExecutor())
+        # timers due within clock resolution are run; monotonic clock's one is below float precision of epoch time
+        self._clock_resolution = 1e-6
+
+    def time(self) -> float:
+        return self.clock.now
+
+
+class FakeTelegram:
+    """
+    Records Telegram calls with virtual time they were made at. Photos are recorded by size only.
+    """
+
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        self.calls: list[tuple[float, str, dict]] = []
+
+    def _record(self, method: str, kwargs: dict) -> SimpleNamespace:
+        if "photo" in kwargs:
+            kwargs = dict(kwargs, photo=len(kwargs["photo"]))
+        self.calls.append((self.clock.now, method, kwargs))
+        return SimpleNamespace(message_id=len(self.calls), photo=[SimpleNamespace(file_id=f"file-{len(self.calls)}")])
+
+    async def send_message(self, **kwargs) -> SimpleNamespace:
+        return self._record("send_message", kwargs)
+
+    async def send_photo(self, **kwargs) -> SimpleNamespace:
+        return self._record("send_photo", kwargs)
+
+
+class Timeline:
+    """
+    Power state over time: `changes` are sorted (time, power is on) pairs, state before the first one is `initial`.
+    Probe fails while power is off, and also with `noise` probability whatever the state is.
+    """
+
+    def __init__(self, changes: list[tuple[float, bool]], initial: bool = True, noise: float = 0, seed: int = 0):
+        self.times = [at for at, _ in changes]
+        self.states = [state for _, state in changes]
+        self.initial = initial
+        self.noise = noise
+        self._random = random.Random(seed)
+
+    @classmethod
+    def from_outages(cls, outages: list[tuple[float, float]], **kwargs) -> "Timeline":
+        return cls([change for start, end in outages for change in ((start, False), (end, True))], **kwargs)
+
+    @classmethod
+    def generate(cls, since: float, until: float, seed: int = 0, **kwargs) -> "Timeline":
+        """
+        Random outages few hours long with few hours of power between them, multi-day outage now and then,
+        and flaps too short for hysteresis to notice.
+        """
+        generator = random.Random(seed)
+        outages = []
+        at = since + generator.uniform(0, 6 * HOUR)
+        while at < until:
+            kind = generator.random()
+            if kind < 0.01:
+                length = generator.uniform(1, 4) * DAY
+            elif kind < 0.2:
+                length = generator.uniform(10, 50)
+            else:
+                length = generator.uniform(0.5, 6) * HOUR
+            outages.append((at, min(at + length, until)))
+            at += length + generator.uniform(1, 20) * HOUR
+        return cls.from_outages(outages, seed=seed, **kwargs)
+
+    def state_at(self, at: float) -> bool:
+        index = bisect.bisect_right(self.times, at)
+        return self.states[index - 1] if index else self.initial
+
+    def probe(self, at: float) -> bool:
+        return self.state_at(at) != (self.noise > 0 and self._random.random() < self.noise)
+
+    def outages(self, min_length: float = 0) -> list[tuple[float, float | None]]:
+        """
+        Outages at least `min_length` seconds long, end is None for outage going on at the end of timeline.
+        """
+        outages, start = [], None if self.initial else float("-inf")
+        for at, state in zip(self.times, self.states):
+            if not state and start is None:
+                start = at
+            elif state and start is not None:
+                if at - start >= min_length:
+                    outages.append((start, at))
+                start = None
+        if start is not None:
+            outages.append((start, None))
+        return outages
+
+
+class SimulationReport(NamedTuple):
+    probes: int
+    wall_seconds: float
+    messages: int
+    charts: int
+    # outages of the timeline long enough to be noticed, and outages announced by state messages
+    expected: list[tuple[float, float | None]]
+    detected: list[tuple[float, float | None]]
+    # detected outages that do not overlap any real one, expected outages no detected one overlaps
+    false_alarms: list[tuple[float, float | None]]
+    missed: list[tuple[float, float | None]]
+    max_delay: float
+    # total of daily stats minus total length of detected outages
+    stats_error: float
+
+    @property
+    def probes_per_second(self) -> float:
+        return self.probes / self.wall_seconds
+
+
+def overlaps(interval: tuple[float, float | None], others: list[tuple[float, float | None]]) -> bool:
+    start, end = interval
+    return any(
+        start < (float("inf") if other_end is None else other_end)
+        for other_start, other_end in others
+        if end is None or other_start < end
+    )
+
+
+class Simulation:
+    """
+    Runs `timeline` from `since` to `until` like `ElectricityMonitor` does for one target: probes at adaptive
+    interval and weekly stats checked every `TIMEOUT` seconds, both scheduled by `run_every` on a virtual clock.
+    """
+
+    def __init__(self, timeline: Timeline, since: float, until: float, storage_path: str = ":memory:"):
+        self.timeline = timeline
+        self.since = since
+        self.until = until
+        self.probes = 0
+        self.clock = VirtualClock(since)
+        self.tg_bot = FakeTelegram(self.clock)
+        self.store = OutageStore(storage_path, clock=self.clock.time)
+        self.checker = ElectricityChecker(
+            Target(ip_to_check="simulation", chat_id="@simulation"),
+            tg_bot=self.tg_bot,
+            store=self.store,
+            clock=self.clock.time,
+        )
+        self.checker.detector.probe_once = self.probe_once
+
+    async def probe_once(self) -> bool:
+        self.probes += 1
+        return self.timeline.probe(self.clock.now)
+
+    async def replay(self):
+        loop = asyncio.get_running_loop()
+        tasks = [
+            asyncio.ensure_future(run_every(self.checker.detector.probe_interval, self.checker.detector.probe_tick)),
+            asyncio.ensure_future(run_every(settings.timeout, self.checker.stats_tick)),
+        ]
+        await asyncio.sleep(self.until - loop.time())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def run(self) -> SimulationReport:
+        started = perf_counter()
+        loop = VirtualTimeLoop(self.clock)
+        try:
+            with override_settings(chart_renderer="lite"):
+                loop.run_until_complete(self.replay())
+        finally:
+            loop.close()
+        wall_seconds = perf_counter() - started
+        return self.report(wall_seconds)
+
+    def detected_outages(self) -> list[tuple[float, float | None]]:
+        outages, start = [], None
+        off_message = self.checker.power_messages[False]
+        for at, method, kwargs in self.tg_bot.calls:
+            if method != "send_message":
+                continue
+            if kwargs["text"].startswith(off_message):
+                start = at
+            elif start is not None:
+                outages.append((start, at))
+                start = None
+        if start is not None:
+            outages.append((start, None))
+        return outages
+
+    def report(self, wall_seconds: float) -> SimulationReport:
+        # outage is surely noticed when it lasts for `window` probes at the slowest rate and the one before them,
+        # shorter ones may pass unnoticed; any detected outage that overlaps a real one is not a false alarm
+        window = self.checker.detector.hysteresis.results.maxlen
+        expected = self.timeline.outages(min_length=(window + 1) * settings.slowest_probe_interval)
+        detected = self.detected_outages()
+        real = self.timeline.outages()
+
+        delays = []
+        for start, end in expected:
+            first = bisect.bisect_left(detected, (start,))
+            if first < len(detected) and overlaps(detected[first], [(start, end)]):
+                delays.append(detected[first][0] - start)
+
+        since_day = datetime.fromtimestamp(self.since, UKRAINE_TZ).date()
+        until_day = datetime.fromtimestamp(self.until, UKRAINE_TZ).date()
+        stats_total = sum(
+            stat.outage_seconds
+            for stat in self.store.iter_daily_stats(self.checker.key, since_day, until_day + timedelta(days=1))
+        )
+        detected_total = sum((self.clock.now if end is None else end) - start for start, end in detected)
+
+        return SimulationReport(
+            probes=self.probes,
+            wall_seconds=wall_seconds,
+            messages=sum(method != "send_photo" for _, method, _ in self.tg_bot.calls),
+            charts=sum(method == "send_photo" for _, method, _ in self.tg_bot.calls),
+            expected=expected,
+            detected=detected,
+            false_alarms=[outage for outage in detected if not overlaps(outage, real)],
+            missed=[outage for outage in expected if not overlaps(outage, detected)],
+            max_delay=max(delays, default=0),
+            stats_error=stats_total - detected_total,
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", type=date.fromisoformat, default=date(2025, 1, 1), help="first day, YYYY-MM-DD")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--noise", type=float, default=0, help="probability of wrong probe result")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--storage", default=":memory:", help="database, in memory by default")
+    parser.add_argument(
+        "--max-false-alarms", type=int, default=0, help="fail when more outages are announced while power was on"
+    )
+    args = parser.parse_args(argv)
+
+    since = UKRAINE_TZ.localize(datetime.combine(args.since, datetime.min.time())).timestamp()
+    until = since + args.days * DAY
+    timeline = Timeline.generate(since, until, seed=args.seed, noise=args.noise)
+    report = Simulation(timeline, since, until, args.storage).run()
+
+    print(f"{report.probes} probes in {report.wall_seconds:.2f} s, {report.probes_per_second:.0f} probes/s")
+    print(
+        f"{len(report.expected)} outages, {len(report.detected)} detected, {len(report.missed)} missed, "
+        f"{len(report.false_alarms)} false alarms, max delay {report.max_delay:.0f} s"
+    )
+    print(f"{report.messages} messages, {report.charts} weekly charts, stats error {report.stats_error:.0f} s")
+    passed = not report.missed and len(report.false_alarms) <= args.max_false_alarms and abs(report.stats_error) < 1
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -0,0 +1,437 @@
+import dbm
+import itertools
+import json
+import shelve
+import sqlite3
+from datetime import date, tzinfo
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+from electricitybot.clock import Clock, wall_clock
+from electricitybot.history import OutageHistory
+from electricitybot.intervals import (
+    daily_stats,
+    DailyStats,
+    day_start,
+    merge_daily_stats,
+    outage_daily_stats,
+    UKRAINE_TZ,
+)
+from electricitybot.metrics import STORAGE_LATENCY, timed
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS power_events (
+    id INTEGER PRIMARY KEY,
+    target TEXT NOT NULL,
+    time REAL NOT NULL,
+    state INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS power_events_target_time ON power_events (target, time);
+CREATE TABLE IF NOT EXISTS target_values (
+    target TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (target, name)
+);
+CREATE TABLE IF NOT EXISTS daily_stats (
+    target TEXT NOT NULL,
+    day TEXT NOT NULL,
+    outage_seconds REAL NOT NULL,
+    outage_count INTEGER NOT NULL,
+    longest_outage REAL NOT NULL,
+    PRIMARY KEY (target, day)
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    method TEXT NOT NULL,
+    kwargs TEXT NOT NULL,
+    photo BLOB,
+    coalesce_key TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS state_changes (
+    id INTEGER PRIMARY KEY,
+    target TEXT NOT NULL,
+    state INTEGER NOT NULL,
+    time REAL NOT NULL
+);
+"""
+
+
+class OutboxItem(NamedTuple):
+    id: int
+    method: str
+    kwargs: dict
+    coalesce_key: str | None
+    attempts: int
+    not_before: float
+
+
+class RuntimeState(NamedTuple):
+    """
+    Power state of a target known before restart: since when it lasts (None when it was first seen)
+    and when it was last confirmed by a probe.
+    """
+
+    state: bool
+    changed_at: float | None
+    seen_at: float
+
+
+class StateChange(NamedTuple):
+    id: int
+    target: str
+    state: bool
+    time: float
+
+
+class OutageStore:
+    """
+    Append-only log of power state changes kept in SQLite.
+
+    Every outage start (state 0) and end (state 1) is a separate row indexed by target and time,
+    so a write does not depend on history size. Each write is its own transaction in WAL journal,
+    so history survives a crash in the middle of a write.
+
+    Every outage is added to daily stats (one row per local day of `tz`) when it ends, so stats of any days
+    are read without scanning raw history. Raw events older than retention window are dropped by `compact`.
+
+    Store opened `read_only` never creates nor changes the database, opening missing one fails with
+    `sqlite3.OperationalError`.
+    """
+
+    def __init__(self, path: str, tz: tzinfo = UKRAINE_TZ, read_only: bool = False, clock: Clock = wall_clock):
+        self.path = path
+        self.tz = tz
+        self.clock = clock
+        if read_only:
+            self._connection = sqlite3.connect(
+                f"{Path(path).resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False
+            )
+            return
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    @timed(STORAGE_LATENCY, "append")
+    def append(self, target: str, state: bool, at: float):
+        """
+        Appends state change, end of outage also adds the outage to daily stats in the same transaction.
+        """
+        outage_start = self.outage_start(target) if state else None
+        with self._connection:
+            self._connection.execute(
+                "INSERT INTO power_events (target, time, state) VALUES (?, ?, ?)", (target, at, int(state))
+            )
+            if outage_start is not None and outage_start <= at:
+                self._add_daily_stats(target, outage_daily_stats(outage_start, at, self.tz))
+
+    def outage_start(self, target: str) -> float | None:
+        """
+        Returns start of outage going on, None when there is power.
+        """
+        last_end = self._connection.execute(
+            "SELECT time, id FROM power_events WHERE target = ? AND state = 1 ORDER BY time DESC, id DESC LIMIT 1",
+            (target,),
+        ).fetchone() or (float("-inf"), 0)
+        row = self._connection.execute(
+            "SELECT time FROM power_events WHERE target = ? AND state = 0 AND time >= ? AND (time > ? OR id > ?) "
+            "ORDER BY time, id LIMIT 1",
+            (target, last_end[0], last_end[0], last_end[1]),
+        ).fetchone()
+        return row[0] if row else None
+
+    def _add_daily_stats(self, target: str, stats: list[DailyStats]):
+        self._connection.executemany(
+            "INSERT INTO daily_stats (target, day, outage_seconds, outage_count, longest_outage) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (target, day) DO UPDATE SET outage_seconds = outage_seconds + excluded.outage_seconds, "
+            "outage_count = outage_count + excluded.outage_count, "
+            "longest_outage = MAX(longest_outage, excluded.longest_outage)",
+            [(target, stat.day.isoformat(), *stat[1:]) for stat in stats],
+        )
+
+    def targets(self) -> list[str]:
+        return [
+            row[0]
+            for row in self._connection.execute(
+                "SELECT target FROM power_events UNION SELECT target FROM daily_stats ORDER BY target"
+            )
+        ]
+
+    @timed(STORAGE_LATENCY, "last_event")
+    def last_event(self, target: str) -> tuple[float, bool] | None:
+        row = self._connection.execute(
+            "SELECT time, state FROM power_events WHERE target = ? ORDER BY time DESC, id DESC LIMIT 1", (target,)
+        ).fetchone()
+        return (row[0], bool(row[1])) if row else None
+
+    def has_history(self, target: str) -> bool:
+        """
+        Whether any outage of `target` is known, as raw events or already compacted into daily stats.
+        """
+        return (
+            self.last_event(target) is not None
+            or self._connection.execute("SELECT 1 FROM daily_stats WHERE target = ? LIMIT 1", (target,)).fetchone()
+            is not None
+        )
+
+    @timed(STORAGE_LATENCY, "history")
+    def history(self, target: str, since: float | None = None, until: float | None = None) -> OutageHistory:
+        """
+        Returns outages that overlap [since, until), end is NaN for outage still going on (or going on at `until`).
+        Outages are not clipped to the range.
+        """
+        since = float("-inf") if since is None else since
+        return OutageHistory.from_events(self._events(target, since, until), since)
+
+    def _events(self, target: str, since: float | None, until: float | None) -> Iterator[tuple[float, int]]:
+        """
+        (time, state) events in [since, until) preceded by the last event before `since`, read lazily from cursor.
+        """
+        since = float("-inf") if since is None else since
+        until = float("inf") if until is None else until
+        last_before = self._connection.execute(
+            "SELECT time, state FROM power_events WHERE target = ? AND time < ? ORDER BY time DESC, id DESC LIMIT 1",
+            (target, since),
+        ).fetchall()
+        return itertools.chain(
+            last_before,
+            self._connection.execute(
+                "SELECT time, state FROM power_events WHERE target = ? AND time >= ? AND time < ? ORDER BY time, id",
+                (target, since, until),
+            ),
+        )
+
+    def iter_intervals(
+        self, target: str, since: float | None = None, until: float | None = None
+    ) -> Iterator[tuple[float, float | None]]:
+        """
+        Same as `intervals`, but streamed from the cursor, so memory use does not depend on history size.
+        """
+        since = float("-inf") if since is None else since
+        return OutageHistory.iter_events(self._events(target, since, until), since)
+
+    def intervals(
+        self, target: str, since: float | None = None, until: float | None = None
+    ) -> list[tuple[float, float | None]]:
+        """
+        Same as `history` as list of (start, end) tuples, end is None for outage still going on.
+        """
+        return self.history(target, since, until).tolist()
+
+    def clipped_intervals(
+        self, target: str, since: float | None = None, until: float | None = None
+    ) -> list[tuple[float, float]]:
+        """
+        Same as `intervals` but cut to [since, until), outage going on now ends now.
+        """
+        until_or_now = min(self.clock(), float("inf") if until is None else until)
+        return [
+            tuple(interval) for interval in self.history(target, since, until).clipped(since, until_or_now).tolist()
+        ]
+
+    @timed(STORAGE_LATENCY, "compact")
+    def compact(self, target: str, cutoff: float):
+        """
+        Drops raw events before `cutoff` (should be start of a local day), their outages are in daily stats already.
+        Outage going on at `cutoff` gets new start event at `cutoff`, so days after it stay raw. When it is still
+        going on, its part before `cutoff` is added to daily stats now, and the rest is added when it ends.
+        """
+        outage_start = self.outage_start(target)
+        last_event_at_cutoff = self._connection.execute(
+            "SELECT time, state FROM power_events WHERE target = ? AND time <= ? ORDER BY time DESC, id DESC LIMIT 1",
+            (target, cutoff),
+        ).fetchone()
+
+        with self._connection:
+            if outage_start is not None and outage_start < cutoff:
+                self._add_daily_stats(target, outage_daily_stats(outage_start, cutoff, self.tz))
+            self._connection.execute("DELETE FROM power_events WHERE target = ? AND time < ?", (target, cutoff))
+            if last_event_at_cutoff and not last_event_at_cutoff[1] and last_event_at_cutoff[0] < cutoff:
+                self._connection.execute(
+                    "INSERT INTO power_events (target, time, state) VALUES (?, ?, 0)", (target, cutoff)
+                )
+
+    @timed(STORAGE_LATENCY, "daily_stats")
+    def daily_stats(self, target: str, since: date, until: date, now: float | None = None) -> list[DailyStats]:
+        """
+        Returns stats of days with outages in [since, until), outage going on is counted up to `now`.
+        Reads one row per day, whatever long the history is.
+        """
+        return list(self.iter_daily_stats(target, since, until, now))
+
+    def iter_daily_stats(self, target: str, since: date, until: date, now: float | None = None) -> Iterator[DailyStats]:
+        """
+        Same as `daily_stats`, but streamed from the cursor in order of days.
+        """
+        outage_start = self.outage_start(target)
+        since_start, until_start = day_start(since, self.tz), day_start(until, self.tz)
+        ongoing = {}
+        if outage_start is not None and outage_start < until_start:
+            start = max(outage_start, since_start)
+            end = max(min(self.clock() if now is None else now, until_start), start)
+            ongoing = {stat.day: stat for stat in outage_daily_stats(start, end, self.tz)}
+
+        rows = self._connection.execute(
+            "SELECT day, outage_seconds, outage_count, longest_outage FROM daily_stats "
+            "WHERE target = ? AND day >= ? AND day < ? ORDER BY day",
+            (target, since.isoformat(), until.isoformat()),
+        )
+        for day, *values in rows:
+            stat = DailyStats(date.fromisoformat(day), *values)
+            # days of outage going on before this one, that have no stored stats yet
+            while ongoing and next(iter(ongoing)) < stat.day:
+                yield ongoing.pop(next(iter(ongoing)))
+            yield merge_daily_stats(stat, ongoing.pop(stat.day)) if stat.day in ongoing else stat
+        yield from ongoing.values()
+
+    @timed(STORAGE_LATENCY, "get_value")
+    def get_value(self, target: str, name: str) -> str | None:
+        row = self._connection.execute(
+            "SELECT value FROM target_values WHERE target = ? AND name = ?", (target, name)
+        ).fetchone()
+        return row[0] if row else None
+
+    @timed(STORAGE_LATENCY, "set_value")
+    def set_value(self, target: str, name: str, value: str):
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO target_values (target, name, value) VALUES (?, ?, ?)", (target, name, value)
+            )
+
+    def runtime_state(self, target: str) -> RuntimeState | None:
+        snapshot = self.get_value(target, "runtime_state")
+        if snapshot is None:
+            return None
+
+        snapshot = json.loads(snapshot)
+        seen_at = float(self.get_value(target, "seen_at") or 0)
+        return RuntimeState(snapshot["state"], snapshot["changed_at"], max(seen_at, snapshot["saved_at"]))
+
+    def save_runtime_state(self, target: str, state: bool, changed_at: float | None):
+        """
+        Saved on every state change, when it is also seen.
+        """
+        self.set_value(
+            target, "runtime_state", json.dumps({"state": state, "changed_at": changed_at, "saved_at": self.clock()})
+        )
+
+    def save_seen_at(self, target: str, at: float):
+        """
+        Saved separately from the state, so probe process of split mode can update it while worker saves the state.
+        """
+        self.set_value(target, "seen_at", repr(at))
+
+    def migrate_shelve(self, target: str, shelve_name: str):
+        """
+        Imports intervals and stats last sent date from shelve used by previous versions,
+        only when there is no history for this target yet, compacted into daily stats included.
+        """
+        if not dbm.whichdb(shelve_name) or self.has_history(target):
+            return
+
+        with shelve.open(shelve_name, flag="r") as db:
+            events = []
+            for interval in db.get("intervals", []):
+                events.append((target, interval.start_time.timestamp(), 0))
+                if interval.end_time:
+                    events.append((target, interval.end_time.timestamp(), 1))
+            stats_last_sent_date = db.get("stats_last_sent_date")
+
+        with self._connection:
+            self._connection.executemany("INSERT INTO power_events (target, time, state) VALUES (?, ?, ?)", events)
+            self._add_daily_stats(target, daily_stats(self.history(target).closed(), self.tz))
+
+        if stats_last_sent_date:
+            self.set_value(target, "stats_last_sent_date", stats_last_sent_date.isoformat())
+
+    @timed(STORAGE_LATENCY, "enqueue")
+    def enqueue(self, method: str, kwargs: dict, coalesce_key: str | None = None) -> int:
+        """
+        Persists Telegram call. Pending call with the same `coalesce_key` and method is updated with new
+        `kwargs` instead, so only the latest of rapid state changes is delivered.
+        """
+        kwargs = dict(kwargs)
+        photo = kwargs.pop("photo", None)
+        with self._connection:
+            if coalesce_key is not None:
+                row = self._connection.execute(
+                    "SELECT id FROM outbox WHERE coalesce_key = ? AND method = ? ORDER BY id DESC LIMIT 1",
+                    (coalesce_key, method),
+                ).fetchone()
+                if row:
+                    self._connection.execute("UPDATE outbox SET kwargs = ? WHERE id = ?", (json.dumps(kwargs), row[0]))
+                    return row[0]
+
+            return self._connection.execute(
+                "INSERT INTO outbox (method, kwargs, photo, coalesce_key) VALUES (?, ?, ?, ?)",
+                (method, json.dumps(kwargs), photo, coalesce_key),
+            ).lastrowid
+
+    def outbox_head(self) -> OutboxItem | None:
+        items = self.outbox_items(1)
+        return items[0] if items else None
+
+    @timed(STORAGE_LATENCY, "outbox_items")
+    def outbox_items(self, limit: int) -> list[OutboxItem]:
+        """
+        First `limit` pending calls in order they were queued.
+        """
+        rows = self._connection.execute(
+            "SELECT id, method, kwargs, photo, coalesce_key, attempts, not_before FROM outbox ORDER BY id LIMIT ?",
+            (limit,),
+        ).fetchall()
+        items = []
+        for item_id, method, kwargs, photo, coalesce_key, attempts, not_before in rows:
+            kwargs = json.loads(kwargs)
+            if photo is not None:
+                kwargs["photo"] = photo
+            items.append(OutboxItem(item_id, method, kwargs, coalesce_key, attempts, not_before))
+        return items
+
+    @timed(STORAGE_LATENCY, "postpone")
+    def postpone(self, item_id: int, not_before: float):
+        with self._connection:
+            self._connection.execute(
+                "UPDATE outbox SET attempts = attempts + 1, not_before = ? WHERE id = ?", (not_before, item_id)
+            )
+
+    @timed(STORAGE_LATENCY, "dequeue")
+    def dequeue(self, item: OutboxItem):
+        """
+        Removes delivered item, unless it was updated by coalescing while being delivered.
+        """
+        kwargs = {name: value for name, value in item.kwargs.items() if name != "photo"}
+        with self._connection:
+            self._connection.execute("DELETE FROM outbox WHERE id = ? AND kwargs = ?", (item.id, json.dumps(kwargs)))
+
+    def outbox_size(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    @timed(STORAGE_LATENCY, "push_state_change")
+    def push_state_change(self, target: str, state: bool, at: float) -> int:
+        """
+        Queues state decided by probe process for the worker, see `detector`.
+        """
+        with self._connection:
+            return self._connection.execute(
+                "INSERT INTO state_changes (target, state, time) VALUES (?, ?, ?)", (target, int(state), at)
+            ).lastrowid
+
+    def state_changes(self, limit: int = 100) -> list[StateChange]:
+        rows = self._connection.execute(
+            "SELECT id, target, state, time FROM state_changes ORDER BY id LIMIT ?", (limit,)
+        ).fetchall()
+        return [StateChange(change_id, target, bool(state), at) for change_id, target, state, at in rows]
+
+    @timed(STORAGE_LATENCY, "ack_state_change")
+    def ack_state_change(self, change_id: int):
+        with self._connection:
+            self._connection.execute("DELETE FROM state_changes WHERE id = ?", (change_id,))
@@ -0,0 +1,40 @@
+import asyncio
+import socket
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from electricitybot.detector import TargetDetector
+from electricitybot.intervals import UKRAINE_TZ
+from electricitybot.storage import OutageStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = OutageStore(str(tmp_path / "outages.sqlite3"))
+    yield store
+    store.close()
+
+
+def local_timestamp(value: str) -> float:
+    return UKRAINE_TZ.localize(datetime.fromisoformat(value)).timestamp()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def probe_ticks(detector: TargetDetector, *results: bool):
+    """
+    Runs a probe tick of `detector` for every one of `results`, probes return them one by one.
+    """
+
+    async def probe_all():
+        for _ in results:
+            await detector.probe_tick()
+
+    with patch.object(detector, "probe_once", AsyncMock(side_effect=results)):
+        asyncio.run(probe_all())
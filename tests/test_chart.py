@@ -0,0 +1,209 @@
+import resource
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from hamcrest import assert_that, close_to, contains_exactly, equal_to, has_length, has_properties, less_than, not_
+from matplotlib._pylab_helpers import Gcf
+
+from electricitybot.chart import (
+    build_chart,
+    build_report,
+    chart_days,
+    ChartDay,
+    get_heatmap_template,
+    get_template,
+    heatmap,
+    heatmap_ticks,
+    UKRAINE_TZ,
+)
+from electricitybot.intervals import DailyStats
+
+WEEK_START = UKRAINE_TZ.localize(datetime.fromisoformat("2022-04-08 00:00:00"))
+FIRST_DAY, LAST_DAY = date(2022, 4, 8), date(2022, 4, 14)
+
+
+def week_intervals(outage_hours: int = 2) -> list[tuple[float, float]]:
+    intervals = []
+    for day in range(7):
+        outage_start = WEEK_START + timedelta(days=day, hours=3 * day)
+        intervals.append(
+            (outage_start.timestamp(), (outage_start + timedelta(hours=outage_hours, minutes=17)).timestamp())
+        )
+    return intervals
+
+
+def max_rss_kb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class TestChartDays:
+
+    def test_chart_days(self):
+        days = chart_days(week_intervals(), FIRST_DAY, LAST_DAY)
+        outage_hours = 2 + 17 / 60
+
+        assert_that(days, has_length(7))
+        assert_that(
+            days[1],
+            has_properties(
+                day=date(2022, 4, 9),
+                outages=contains_exactly(contains_exactly(3.0, close_to(outage_hours, 1e-9))),
+                outage_hours=close_to(outage_hours, 1e-9),
+                free_hours=close_to(24 - outage_hours, 1e-9),
+                availability=close_to((24 - outage_hours) / 24 * 100, 1e-9),
+            ),
+        )
+
+    def test_outage_hours_from_daily_stats(self):
+        start = UKRAINE_TZ.localize(datetime(2022, 4, 8, 10)).timestamp()
+        stats = [DailyStats(FIRST_DAY, 7200, 2, 3600)]
+
+        days = chart_days([(start, start + 3600)], FIRST_DAY, date(2022, 4, 9), stats=stats)
+
+        assert_that(
+            days,
+            contains_exactly(
+                has_properties(outages=[(10.0, 1.0)], outage_hours=2.0, availability=close_to(100 * 22 / 24, 1e-9)),
+                ChartDay(date(2022, 4, 9), [], 0.0, 24.0, 100.0),
+            ),
+        )
+
+    def test_day_without_outages(self):
+        days = chart_days([], FIRST_DAY, FIRST_DAY)
+
+        assert_that(days, contains_exactly(ChartDay(FIRST_DAY, [], 0.0, 24.0, 100.0)))
+
+    def test_outage_across_midnight(self):
+        start = UKRAINE_TZ.localize(datetime(2022, 4, 8, 23)).timestamp()
+        days = chart_days([(start, start + 2 * 3600)], FIRST_DAY, date(2022, 4, 9))
+
+        assert_that(
+            days,
+            contains_exactly(
+                has_properties(outages=[(23.0, 1.0)]),
+                has_properties(outages=[(0.0, 1.0)]),
+            ),
+        )
+
+    def test_dst_day(self):
+        # clocks moved forward at 03:00 on 2022-03-27, so that day has 23 hours
+        start = UKRAINE_TZ.localize(datetime(2022, 3, 27, 10)).timestamp()
+        days = chart_days([(start, start + 3600)], date(2022, 3, 27), date(2022, 3, 27))
+
+        assert_that(days, contains_exactly(ChartDay(date(2022, 3, 27), [(10.0, 1.0)], 1.0, 22.0, 100 * 22 / 23)))
+
+
+class TestChart:
+
+    def test_build_chart(self):
+        chart = build_chart(week_intervals(), FIRST_DAY, LAST_DAY, title="Статистика світла за тиждень", dpi=30)
+
+        assert_that(chart[:4], equal_to(b"\x89PNG"))
+        assert_that(Gcf.get_num_fig_managers(), equal_to(0))
+
+    def test_template_is_reused(self):
+        first_chart = build_chart(week_intervals(), FIRST_DAY, LAST_DAY, dpi=30)
+        other_chart = build_chart(week_intervals(outage_hours=5), FIRST_DAY, LAST_DAY, title="Інший заголовок", dpi=30)
+
+        assert_that(other_chart, not_(equal_to(first_chart)))
+        assert_that(build_chart(week_intervals(), FIRST_DAY, LAST_DAY, dpi=30), equal_to(first_chart))
+        assert_that(get_template(), equal_to(get_template()))
+
+    def test_memory_is_flat(self):
+        for _ in range(10):
+            build_chart(week_intervals(), FIRST_DAY, LAST_DAY, dpi=20)
+        rss_before = max_rss_kb()
+
+        for i in range(200):
+            build_chart(week_intervals(outage_hours=i % 10), FIRST_DAY, LAST_DAY, dpi=20)
+
+        assert_that(max_rss_kb() - rss_before, less_than(10 * 1024))
+        assert_that(len(get_template().hours_ax.collections), equal_to(0))
+
+
+def year_intervals(count: int) -> list[tuple[float, float]]:
+    year_start = UKRAINE_TZ.localize(datetime(2022, 1, 1)).timestamp()
+    return [(start, start + 1800) for start in np.linspace(year_start, year_start + 364 * 86400, count).tolist()]
+
+
+class TestHeatmap:
+
+    def test_heatmap(self):
+        report = heatmap(week_intervals(), FIRST_DAY, LAST_DAY)
+        outage_hours = 2 + 17 / 60
+
+        assert_that(report.days, has_length(7))
+        assert_that(report.hourly.shape, equal_to((7, 24)))
+        # outage of 2022-04-09 lasts from 03:00 to 05:17
+        assert_that(report.hourly[1, 2:6].tolist(), contains_exactly(100, 0, 0, close_to(100 * 43 / 60, 1e-9)))
+        assert_that(report.daily[1], close_to((24 - outage_hours) / 24 * 100, 1e-9))
+
+    def test_daily_availability_from_stats(self):
+        start = UKRAINE_TZ.localize(datetime(2022, 4, 8, 10)).timestamp()
+        stats = [DailyStats(FIRST_DAY, 7200, 2, 3600)]
+
+        report = heatmap([(start, start + 3600)], FIRST_DAY, date(2022, 4, 9), stats=stats)
+
+        assert_that(report.daily.tolist(), contains_exactly(close_to(100 * 22 / 24, 1e-9), 100))
+        assert_that(report.hourly[0, 10], equal_to(0))
+
+    def test_days_without_hourly_history(self):
+        report = heatmap(week_intervals(), FIRST_DAY, LAST_DAY, hourly_since=date(2022, 4, 10))
+
+        assert_that(np.isnan(report.hourly).all(axis=1).tolist(), equal_to([True, True] + [False] * 5))
+        assert_that(np.isnan(report.daily).any(), equal_to(False))
+
+    def test_ticks(self):
+        month = [date(2022, 4, 8) + timedelta(days=i) for i in range(31)]
+        year = [date(2022, 4, 8) + timedelta(days=i) for i in range(365)]
+
+        assert_that(heatmap_ticks(month), has_length(31))
+        assert_that(heatmap_ticks(month)[:2], contains_exactly((0, "8"), (1, "9")))
+        assert_that(heatmap_ticks(year), has_length(12))
+        assert_that(heatmap_ticks(year)[8:11], contains_exactly((268, "січ. 2023"), (299, "лют."), (327, "берез.")))
+        assert_that(heatmap_ticks(year)[0], equal_to((23, "трав. 2022")))
+
+
+class TestReport:
+
+    def test_build_report(self):
+        report = build_report(week_intervals(), FIRST_DAY, LAST_DAY, title="Статистика світла за місяць", dpi=30)
+
+        assert_that(report[:4], equal_to(b"\x89PNG"))
+        assert_that(Gcf.get_num_fig_managers(), equal_to(0))
+        assert_that(get_heatmap_template(), equal_to(get_heatmap_template()))
+
+    def test_report_is_deterministic(self):
+        first_report = build_report(week_intervals(), FIRST_DAY, LAST_DAY, dpi=30)
+
+        assert_that(
+            build_report(week_intervals(outage_hours=5), FIRST_DAY, LAST_DAY, dpi=30), not_(equal_to(first_report))
+        )
+        assert_that(build_report(week_intervals(), FIRST_DAY, LAST_DAY, dpi=30), equal_to(first_report))
+
+    def test_empty_report(self):
+        report = build_report([], FIRST_DAY, FIRST_DAY - timedelta(days=1), dpi=30)
+
+        assert_that(report[:4], equal_to(b"\x89PNG"))
+
+    def test_year_of_outages_draws_one_mesh(self):
+        build_report(year_intervals(5000), date(2022, 1, 1), date(2022, 12, 31), dpi=30)
+        build_report(year_intervals(5000), date(2022, 1, 1), date(2022, 12, 31), dpi=30)
+
+        template = get_heatmap_template()
+        assert_that(template.hours_ax.collections, contains_exactly(template.mesh))
+        assert_that(template.mesh.get_array().shape, equal_to((24, 365)))
+        assert_that(template.hours_ax.get_images(), has_length(0))
+
+    def test_report_memory_does_not_grow_with_dpi(self):
+        build_report(year_intervals(5000), date(2022, 1, 1), date(2022, 12, 31), dpi=30)
+        tracemalloc.start()
+        try:
+            build_report(year_intervals(5000), date(2022, 1, 1), date(2022, 12, 31))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        # cells resampled to 300 dpi figure pixels took about 300 MB
+        assert_that(peak, less_than(16 * 1024 * 1024))
@@ -0,0 +1,292 @@
+import asyncio
+from datetime import date, datetime, timedelta
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from freezegun import freeze_time
+from hamcrest import assert_that, contains_exactly, equal_to, has_entries
+from telegram import Update
+from telegram.error import NetworkError
+
+from electricitybot import ElectricityChecker
+from electricitybot.bot import UKRAINE_TZ
+from electricitybot.commands import CommandHandler, parse_command
+from electricitybot.settings import override_settings, Target
+
+NOW = UKRAINE_TZ.localize(datetime.fromisoformat("2022-04-15 12:34:01"))
+
+
+def update(text: str, update_id: int = 1, chat_id: int = -1001, username: str | None = "building") -> Update:
+    return Update.de_json(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": 10 + update_id,
+                "message_thread_id": 7,
+                "date": int(NOW.timestamp()),
+                "chat": {"id": chat_id, "type": "supergroup", "username": username},
+                "text": text,
+            },
+        },
+        None,
+    )
+
+
+@pytest.fixture
+def tg_bot():
+    tg_bot = AsyncMock()
+    tg_bot.get_me.return_value = Mock(username="ElectricityBot")
+    return tg_bot
+
+
+def checker(store, tg_bot, label="", ip_to_check="10.0.0.1", chat_id="@building") -> ElectricityChecker:
+    target = Target(ip_to_check=ip_to_check, chat_id=chat_id, label=label)
+    return ElectricityChecker(target, tg_bot=tg_bot, store=store)
+
+
+def handle(handler: CommandHandler, *updates: Update):
+    async def handle_all():
+        for one_update in updates:
+            await handler.handle_update(one_update)
+
+    asyncio.run(handle_all())
+
+
+class TestParseCommand:
+
+    @pytest.mark.parametrize(
+        "text, expected",
+        [
+            ("/status", "status"),
+            ("/Today please", "today"),
+            ("/week@ElectricityBot", "week"),
+            ("/week@electricitybot", "week"),
+            ("/week@OtherBot", None),
+            ("status", None),
+        ],
+    )
+    def test_parse_command(self, text, expected):
+        assert_that(parse_command(text, "ElectricityBot"), equal_to(expected))
+
+
+@freeze_time(NOW)
+class TestCommandHandler:
+
+    def test_status(self, store, tg_bot):
+        first, second = checker(store, tg_bot, "Ващенка 3"), checker(store, tg_bot, "Ващенка 5", "10.0.0.2")
+        first.previous_e_state, first.last_state_change_time = True, NOW.timestamp() - 3900
+        second.previous_e_state = False
+        unknown = checker(store, tg_bot, ip_to_check="10.0.0.3", chat_id="-1001")
+
+        handle(CommandHandler(tg_bot, [first, second, unknown]), update("/status", username=None))
+        handle(CommandHandler(tg_bot, [first, second, unknown]), update("/status"))
+
+        tg_bot.send_message.assert_any_await(
+            chat_id=-1001, message_thread_id=7, reply_to_message_id=11, text="Стан світла ще невідомий"
+        )
+        tg_bot.send_message.assert_awaited_with(
+            chat_id=-1001,
+            message_thread_id=7,
+            reply_to_message_id=11,
+            text="Ващенка 3: 🔋Є світло (вже 1 год. 5 хв.)\nВащенка 5: 🪫Відключено електропостачання\n"
+            "Стан світла ще невідомий",
+        )
+
+    def test_today(self, store, tg_bot):
+        e_checker = checker(store, tg_bot)
+        store.append(e_checker.key, False, (NOW - timedelta(hours=3)).timestamp())
+        store.append(e_checker.key, True, (NOW - timedelta(hours=2)).timestamp())
+        store.append(e_checker.key, False, (NOW - timedelta(minutes=30)).timestamp())
+        handler = CommandHandler(tg_bot, [e_checker])
+
+        with freeze_time(NOW) as frozen_time:
+            handle(handler, update("/today"))
+            frozen_time.tick(timedelta(hours=1))
+            with patch.object(store, "daily_stats") as daily_stats_mock:
+                handle(handler, update("/today"))
+
+        daily_stats_mock.assert_not_called()
+        assert_that(
+            [call.kwargs["text"] for call in tg_bot.send_message.await_args_list],
+            contains_exactly(
+                "Сьогодні світла не було 1 год. 30 хв., відключень: 2, найдовше 1 год. 0 хв.",
+                "Сьогодні світла не було 2 год. 30 хв., відключень: 2, найдовше 1 год. 30 хв.",
+            ),
+        )
+
+    def test_today_is_read_again_after_state_change(self, store, tg_bot):
+        e_checker = checker(store, tg_bot, "Ващенка 3")
+        e_checker.previous_e_state = True
+        handler = CommandHandler(tg_bot, [e_checker])
+
+        handle(handler, update("/today"))
+        asyncio.run(e_checker.notify(False))
+        with freeze_time(NOW + timedelta(minutes=10)):
+            handle(handler, update("/today"))
+
+        assert_that(
+            [
+                call.kwargs["text"]
+                for call in tg_bot.send_message.await_args_list
+                if "reply_to_message_id" in call.kwargs
+            ],
+            contains_exactly(
+                "Ващенка 3: Сьогодні відключень не було",
+                "Ващенка 3: Сьогодні світла не було 0 год. 10 хв., відключень: 1, найдовше 0 год. 10 хв.",
+            ),
+        )
+
+    @patch("electricitybot.chart.build_chart", return_value=b"test image output")
+    def test_week(self, build_chart_mock, store, tg_bot):
+        e_checker = checker(store, tg_bot)
+        store.append(e_checker.key, False, (NOW - timedelta(days=3)).timestamp())
+        store.append(e_checker.key, True, (NOW - timedelta(days=3, hours=-1)).timestamp())
+        handler = CommandHandler(tg_bot, [e_checker])
+
+        handle(handler, update("/week", 1), update("/week", 2))
+        with freeze_time(NOW + timedelta(days=1)):
+            handle(handler, update("/week", 3))
+
+        assert_that(build_chart_mock.call_count, equal_to(2))
+        assert_that(tg_bot.send_photo.await_count, equal_to(3))
+        assert_that(
+            tg_bot.send_photo.await_args.kwargs,
+            has_entries(caption=e_checker.chart_title, photo=b"test image output", reply_to_message_id=13),
+        )
+
+    @patch("electricitybot.chart.build_chart")
+    def test_week_without_history(self, build_chart_mock, store, tg_bot):
+        handler = CommandHandler(tg_bot, [checker(store, tg_bot, "Ващенка 3")])
+
+        handle(handler, update("/week"))
+
+        build_chart_mock.assert_not_called()
+        assert_that(
+            tg_bot.send_message.await_args.kwargs["text"], equal_to("Ващенка 3: Статистики за тиждень ще немає")
+        )
+
+    @patch("electricitybot.chart.build_report", return_value=b"test image output")
+    def test_month_and_year(self, build_report_mock, store, tg_bot):
+        e_checker = checker(store, tg_bot, "Ващенка 3")
+        store.append(e_checker.key, False, (NOW - timedelta(days=3)).timestamp())
+        store.append(e_checker.key, True, (NOW - timedelta(days=3, hours=-1)).timestamp())
+        handler = CommandHandler(tg_bot, [e_checker])
+
+        handle(handler, update("/month", 1), update("/year", 2), update("/month", 3))
+        with freeze_time(NOW + timedelta(days=1)):
+            handle(handler, update("/month", 4))
+
+        assert_that(
+            [call.args[1:] for call in build_report_mock.call_args_list],
+            contains_exactly(
+                (date(2022, 3, 15), date(2022, 4, 14)),
+                (date(2021, 4, 15), date(2022, 4, 14)),
+                (date(2022, 3, 16), date(2022, 4, 15)),
+            ),
+        )
+        assert_that(
+            [call.kwargs["caption"] for call in tg_bot.send_photo.await_args_list],
+            contains_exactly(
+                "Статистика світла (за адресою Ващенка 3) за місяць",
+                "Статистика світла (за адресою Ващенка 3) за рік",
+                "Статистика світла (за адресою Ващенка 3) за місяць",
+                "Статистика світла (за адресою Ващенка 3) за місяць",
+            ),
+        )
+
+    @patch("electricitybot.chart.build_report")
+    def test_year_without_history(self, build_report_mock, store, tg_bot):
+        handler = CommandHandler(tg_bot, [checker(store, tg_bot)])
+
+        handle(handler, update("/year"))
+
+        build_report_mock.assert_not_called()
+        assert_that(tg_bot.send_message.await_args.kwargs["text"], equal_to("Статистики за рік ще немає"))
+
+    def test_ping(self, store, tg_bot, tmp_path):
+        with override_settings(probe_log_dir=str(tmp_path), probe_log_size=1024):
+            first, second = checker(store, tg_bot, "Ващенка 3"), checker(store, tg_bot, "Ващенка 5", "10.0.0.2")
+        third = checker(store, tg_bot, "Ващенка 7", "10.0.0.3")
+        now, eleven = NOW.timestamp(), NOW.replace(hour=11, minute=0, second=0).timestamp()
+        for index in range(60):
+            # probes of more than a day ago are not counted, all probes lost within 11:00-12:00
+            first.detector.probe_log.append(now - 86401 - index, True, 0.001)
+            first.detector.probe_log.append(eleven - 1800 + index * 60, index < 30, 0.001 * (index % 3 + 1))
+            second.detector.probe_log.append(now - 1 - index, True, 0.0005)
+        second.detector.probe_log.append(now - 61, False)
+
+        handle(CommandHandler(tg_bot, [first, second, third]), update("/ping"))
+
+        assert_that(
+            tg_bot.send_message.await_args.kwargs["text"],
+            equal_to(
+                "Ващенка 3: За добу перевірок: 60, втрачено 50.0%, затримка 2.0 мс (p95 3.0 мс)\n"
+                "Найбільше втрат о 11:00: 100%\n"
+                "Ващенка 5: За добу перевірок: 61, втрачено 1.6%, затримка 0.5 мс (p95 0.5 мс)\n"
+                "Найбільше втрат о 12:00: 2%\n"
+                "Ващенка 7: Перевірок за добу ще немає"
+            ),
+        )
+
+    def test_ping_without_loss(self, store, tg_bot, tmp_path):
+        with override_settings(probe_log_dir=str(tmp_path)):
+            e_checker = checker(store, tg_bot)
+        e_checker.detector.probe_log.append(NOW.timestamp() - 60, True)
+
+        handle(CommandHandler(tg_bot, [e_checker]), update("/ping"))
+
+        assert_that(tg_bot.send_message.await_args.kwargs["text"], equal_to("За добу перевірок: 1, втрачено 0.0%"))
+
+    @pytest.mark.parametrize(
+        "one_update",
+        [
+            update("/help"),
+            update("/status", chat_id=-1002, username="other"),
+            Update.de_json({"update_id": 1}, None),
+        ],
+    )
+    def test_ignored(self, store, tg_bot, one_update):
+        handle(CommandHandler(tg_bot, [checker(store, tg_bot)]), one_update)
+
+        tg_bot.send_message.assert_not_awaited()
+
+    def test_answers_go_through_outbox(self, store, tg_bot):
+        outbox = Mock()
+        e_checker = ElectricityChecker(
+            Target(ip_to_check="10.0.0.1", chat_id="@building"), tg_bot, store=store, outbox=outbox
+        )
+
+        handle(CommandHandler(tg_bot, [e_checker]), update("/status"))
+
+        outbox.put.assert_called_once_with(
+            "send_message",
+            None,
+            chat_id=-1001,
+            message_thread_id=7,
+            reply_to_message_id=11,
+            text="Стан світла ще невідомий",
+        )
+
+
+class TestPolling:
+
+    def test_poll_forever(self, store, tg_bot):
+        tg_bot.get_updates.side_effect = [
+            NetworkError("Bad Gateway"),
+            [update("/status@OtherBot", 1), update("/status", 2)],
+            [update("/status", 3)],
+            asyncio.CancelledError,
+        ]
+        e_checker = checker(store, tg_bot)
+        e_checker.status_message = Mock(side_effect=[RuntimeError, "🔋Є світло"])
+
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(CommandHandler(tg_bot, [e_checker], retry_delay=0).poll_forever())
+
+        tg_bot.get_me.assert_awaited_once()
+        assert_that(
+            [call.kwargs["offset"] for call in tg_bot.get_updates.await_args_list], contains_exactly(None, None, 3, 4)
+        )
+        tg_bot.send_message.assert_awaited_once_with(
+            chat_id=-1001, message_thread_id=7, reply_to_message_id=13, text="🔋Є світло"
+        )
@@ -0,0 +1,128 @@
+import asyncio
+import subprocess
+import sys
+from datetime import datetime, timedelta
+from unittest.mock import ANY, AsyncMock, Mock, patch
+
+import pytest
+from conftest import probe_ticks
+from freezegun import freeze_time
+from hamcrest import assert_that, contains_exactly, equal_to
+
+from electricitybot.bot import ElectricityChecker, UKRAINE_TZ
+from electricitybot.detector import ProbeProcess, TargetDetector, watch_process
+from electricitybot.probe import ProbeResult
+from electricitybot.settings import override_settings, settings, Target
+
+NOW = UKRAINE_TZ.localize(datetime.fromisoformat("2022-04-15 12:34:01"))
+TARGET = Target(ip_to_check="10.0.0.1", chat_id="@building")
+
+
+@freeze_time(NOW)
+class TestTargetDetector:
+
+    def test_state_changes_are_reported(self, store):
+        on_state_change = AsyncMock()
+        detector = TargetDetector(TARGET, store, on_state_change)
+
+        probe_ticks(detector, True, False, True, False, False, True, True)
+
+        assert_that(
+            [call.args for call in on_state_change.await_args_list],
+            equal_to([(True, NOW.timestamp()), (False, NOW.timestamp()), (True, NOW.timestamp())]),
+        )
+
+    def test_state_saved_before_restart_is_restored(self, store):
+        with freeze_time(NOW - timedelta(minutes=10)):
+            store.save_runtime_state(TARGET.ip_to_check, True, NOW.timestamp() - 3600)
+        on_state_change = AsyncMock()
+        detector = TargetDetector(TARGET, store, on_state_change)
+
+        probe_ticks(detector, False, False)
+
+        # outage started while probe process was down, it is counted from the last time power was seen
+        on_state_change.assert_awaited_once_with(False, NOW.timestamp() - 600)
+        assert_that(store.runtime_state(TARGET.ip_to_check).seen_at, equal_to(NOW.timestamp()))
+
+    def test_probes_are_logged(self, store, tmp_path):
+        with override_settings(probe_log_dir=str(tmp_path), probe_log_size=16):
+            detector = TargetDetector(TARGET, store, AsyncMock())
+
+        with patch("electricitybot.detector.system_ping", Mock(return_value=ProbeResult(True, 0.002))):
+            asyncio.run(detector.probe_tick())
+        probe_ticks(detector, False)
+
+        assert_that(
+            detector.probe_log.records().tolist(),
+            contains_exactly((NOW.timestamp(), ANY, 1), (NOW.timestamp(), ANY, 0)),
+        )
+
+    @pytest.mark.parametrize("probe_method", ["ping", "tcp"])
+    def test_probe_once(self, store, probe_method):
+        with override_settings(probe_method=probe_method):
+            detector = TargetDetector(TARGET, store, AsyncMock())
+
+        with (
+            patch("electricitybot.detector.system_ping", Mock(return_value=ProbeResult(True))) as ping_mock,
+            patch("electricitybot.probe.Prober.probe", AsyncMock(return_value=ProbeResult(True))),
+        ):
+            assert_that(asyncio.run(detector.probe_once()), equal_to(True))
+
+        assert_that(ping_mock.call_count, equal_to(probe_method == "ping"))
+
+
+class TestProbeProcess:
+
+    def test_serve(self, tmp_path):
+        targets = [Target(ip_to_check=f"10.0.0.{i}", chat_id="@building") for i in range(3)]
+        probes = []
+
+        async def probe_once(detector):
+            probes.append(detector.key)
+            return True
+
+        async def serve_for_a_while(process):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(process.serve(), 0.1)
+
+        with (
+            override_settings(targets=targets, storage_path=str(tmp_path / "outages.sqlite3"), probe_metrics_port=9001),
+            patch("electricitybot.detector.TargetDetector.probe_once", probe_once),
+            patch("electricitybot.detector.serve_metrics", AsyncMock()) as serve_metrics_mock,
+        ):
+            process = ProbeProcess()
+            asyncio.run(serve_for_a_while(process))
+
+        assert_that(probes, contains_exactly(*[target.ip_to_check for target in targets]))
+        assert_that([change.target for change in process.store.state_changes()], equal_to(probes))
+        serve_metrics_mock.assert_awaited_once_with(settings.metrics_host, 9001)
+
+    def test_worker_stops_when_probe_process_exits(self):
+        process = Mock(is_alive=Mock(side_effect=[True, True, False]), exitcode=-9)
+        process.name = "electricitybot-probe"
+
+        with pytest.raises(RuntimeError, match="electricitybot-probe exited with code -9"):
+            asyncio.run(watch_process(process, 0.01))
+
+        assert_that(process.is_alive.call_count, equal_to(3))
+
+    def test_probe_process_does_not_import_telegram_and_charts(self):
+        modules = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, electricitybot.detector; print('telegram' in sys.modules, 'matplotlib' in sys.modules)",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        assert_that(modules.stdout.strip(), equal_to("False False"))
+
+    def test_package_exports_checker_lazily(self):
+        import electricitybot
+
+        assert_that(electricitybot.ElectricityChecker, equal_to(ElectricityChecker))
+        with pytest.raises(AttributeError):
+            electricitybot.ElectricityMonitor
@@ -1,25 +1,32 @@
-from datetime import datetime, timedelta
-from time import time
-from unittest.mock import AsyncMock, MagicMock, Mock, patch
+import asyncio
+from datetime import date, datetime, timedelta
+from time import monotonic, time
+from unittest.mock import ANY, AsyncMock, Mock, patch
 
 import pytest
+from conftest import probe_ticks
 from freezegun import freeze_time
 from hamcrest import (
     all_of,
     assert_that,
+    close_to,
     contains_exactly,
     equal_to,
-    has_entry,
-    has_item,
+    greater_than_or_equal_to,
+    has_entries,
     has_length,
     has_properties,
-    has_property,
     instance_of,
+    less_than_or_equal_to,
 )
+from pydantic import ValidationError
 
 from electricitybot import ElectricityChecker
-from electricitybot.bot import PowerOutageInterval, UKRAINE_TZ
-from electricitybot.settings import override_settings, settings
+from electricitybot.bot import ElectricityMonitor, PowerOutageInterval, report_first_day, UKRAINE_TZ
+from electricitybot.intervals import DailyStats
+from electricitybot.probe import ProbeResult
+from electricitybot.settings import Destination, override_settings, Settings, settings, Target
+from electricitybot.storage import OutageStore
 
 
 @pytest.fixture
@@ -32,10 +39,8 @@ def tg_bot_mock():
 DATETIME_TO_MOCK = UKRAINE_TZ.localize(datetime.fromisoformat("2022-04-15 12:34:01"))
 
 
-@patch("electricitybot.bot.sleep", Mock())
 class TestElectricitybot:
 
-    @patch("electricitybot.ElectricityChecker.check_electricity", Mock(return_value=True))
     def test_init(self, tg_bot_mock):
         e_checker = ElectricityChecker()
 
@@ -50,19 +55,44 @@ class TestElectricitybot:
             ),
         )
 
-        tg_bot_mock.assert_called_once_with(token=settings.api_token)
+        # Telegram bot is created on first use
+        tg_bot_mock.assert_not_called()
+        assert_that(e_checker.tg_bot.send_message, equal_to(tg_bot_mock.return_value.send_message))
+        tg_bot_mock.assert_called_once_with(token=settings.api_token, request=ANY)
 
     @pytest.mark.parametrize("e_state", [True, False])
-    @patch("electricitybot.ElectricityChecker.check_electricity", Mock(return_value=True))
     def test_build_message(self, e_state):
         e_checker = ElectricityChecker()
         message = e_checker.build_message(e_state)
 
         assert_that(message, equal_to(ElectricityChecker.power_messages[e_state]))
 
+    def test_init_with_target(self, tg_bot_mock):
+        target = Target(ip_to_check="10.0.0.1", chat_id="@building", thread_id=3, label="Ващенка 3")
+        e_checker = ElectricityChecker(target, tg_bot=tg_bot_mock())
+
+        assert_that(
+            e_checker,
+            has_properties(
+                chat_id="@building",
+                ip_to_check="10.0.0.1",
+                thread_id=3,
+                key="10.0.0.1",
+                chart_title="Статистика світла (за адресою Ващенка 3) за тиждень",
+            ),
+        )
+        assert_that(e_checker.build_message(True), equal_to(f"Ващенка 3: {ElectricityChecker.power_messages[True]}"))
+        tg_bot_mock.assert_called_once_with()
+
+    def test_state_is_unknown_before_first_probe(self):
+        with patch("electricitybot.detector.TargetDetector.probe_once") as probe_once_mock:
+            e_checker = ElectricityChecker()
+
+        assert_that(e_checker.previous_e_state, equal_to(None))
+        probe_once_mock.assert_not_called()
+
     @freeze_time("2022-04-15")
     @pytest.mark.parametrize("e_state", [True, False])
-    @patch("electricitybot.ElectricityChecker.check_electricity", Mock(return_value=True))
     def test_build_message_with_stat(self, e_state):
         e_checker = ElectricityChecker()
         e_checker.last_state_change_time = time() - 3719  # 1 hour, 1 minute and 59 seconds
@@ -74,102 +104,71 @@ class TestElectricitybot:
 
         assert_that(message, equal_to(f"{ElectricityChecker.power_messages[e_state]}\n{stat_message[e_state]}"))
 
-    @patch("electricitybot.bot.shelve")
-    def test_db(self, shelve_mock):
+    @patch("electricitybot.bot.OutageStore")
+    def test_store(self, store_mock):
         e_checker = ElectricityChecker()
-        shelve_mock.open.assert_not_called()
-        e_checker.db
-        shelve_mock.open.assert_called_with("power_outage_intervals")
 
-    @patch("electricitybot.ElectricityChecker.check_electricity", Mock(return_value=True))
-    def test_ping(self):
-        with patch("subprocess.run", Mock(return_value=Mock(returncode=0))) as run_mock:
-            e_checker = ElectricityChecker()
-            e_checker.ip_to_check = "7.7.7.7"
-            ping_result = e_checker.ping()
-
-        assert_that(ping_result, equal_to(True))
-
-        run_mock.assert_called_once_with(["ping", "-c", "1", e_checker.ip_to_check], capture_output=True)
-
-    @pytest.mark.parametrize("ping_result", [True, False])
-    def test_check_electricity(self, ping_result):
-        with patch("electricitybot.ElectricityChecker.ping", Mock(return_value=True)):
-            e_checker = ElectricityChecker()
+        assert_that(e_checker.store, equal_to(store_mock.return_value))
+        store_mock.assert_called_once_with(settings.storage_path, clock=e_checker.clock)
+        store_mock().migrate_shelve.assert_called_once_with(settings.ip_to_check, "power_outage_intervals")
 
-        with patch(
-            "electricitybot.ElectricityChecker.ping",
-            Mock(side_effect=[False] * e_checker.retries_count + [ping_result]),
-        ) as ping_mock:
-            result = e_checker.check_electricity()
+    @patch("electricitybot.bot.OutageStore")
+    def test_store_of_explicit_target(self, store_mock):
+        ElectricityChecker(Target(ip_to_check="10.0.0.1", chat_id="@building"))
 
-        assert_that(result, equal_to(ping_result))
-        assert_that(ping_mock.call_count, equal_to(e_checker.retries_count + 1))
+        store_mock().migrate_shelve.assert_not_called()
 
-    @patch("electricitybot.ElectricityChecker.db", MagicMock())
-    @patch("electricitybot.ElectricityChecker.check_electricity", Mock(side_effect=[True, False]))
-    def test_check_e_state_and_send(self, tg_bot_mock):
-        e_checker = ElectricityChecker()
-        message_to_send = "test_message"
-        with patch("electricitybot.ElectricityChecker.build_message", Mock(return_value=message_to_send)):
-            e_checker.check_e_state_and_send()
+    def test_ping(self):
+        with patch("subprocess.run", Mock(return_value=Mock(returncode=0, stdout=b""))) as run_mock:
+            e_checker = ElectricityChecker(Target(ip_to_check="7.7.7.7", chat_id="@building"))
+            ping_result = asyncio.run(e_checker.detector.probe_once())
 
-        assert_that(e_checker.previous_e_state, equal_to(False))
+        assert_that(ping_result, equal_to(True))
 
-        tg_bot_mock().send_message.assert_called_once_with(
-            chat_id=e_checker.chat_id, message_thread_id=e_checker.thread_id, text=message_to_send
-        )
+        run_mock.assert_called_once_with(["ping", "-c", "1", e_checker.ip_to_check], capture_output=True)
 
     @pytest.mark.parametrize("e_state", [True, False])
     @freeze_time(DATETIME_TO_MOCK)
     def test_save_stat(self, e_state):
         e_checker = ElectricityChecker()
 
-        intervals = []
         start_time = DATETIME_TO_MOCK
         end_time = None
 
         if e_state:
             start_time = DATETIME_TO_MOCK - timedelta(hours=3, minutes=4)
             end_time = DATETIME_TO_MOCK
-            intervals = [PowerOutageInterval(start_time=start_time)]
-
-        db_mock = MagicMock(get=Mock(side_effect=lambda *args, **kwargs: intervals))
-
-        with patch("electricitybot.ElectricityChecker.db", db_mock):
-            e_checker.save_stat(e_state)
+            e_checker.store.append(e_checker.key, False, start_time.timestamp())
 
-        db_mock.__setitem__.assert_called_once()
+        e_checker.save_stat(e_state)
 
         assert_that(
-            db_mock.__setitem__.call_args.args,
-            contains_exactly(
-                "intervals",
-                all_of(
-                    has_length(1),
-                    has_item(
-                        has_properties(
-                            start_time=start_time,
-                            end_time=end_time,
-                        )
-                    ),
-                ),
-            ),
+            e_checker.store.intervals(e_checker.key),
+            contains_exactly((start_time.timestamp(), end_time and end_time.timestamp())),
         )
 
     @freeze_time(DATETIME_TO_MOCK)
     def test_save_stat_when_no_interval(self):
         e_checker = ElectricityChecker()
+        e_checker.save_stat(True)
 
-        db_mock = {}
-        with patch("electricitybot.ElectricityChecker.db", db_mock):
-            e_checker.save_stat(True)
+        assert_that(e_checker.store.last_event(e_checker.key), equal_to(None))
 
-        assert_that(db_mock, has_entry("intervals", has_length(0)))
+    @freeze_time(DATETIME_TO_MOCK)
+    def test_save_stat_when_interval_is_finalized(self):
+        e_checker = ElectricityChecker()
+        e_checker.save_stat(False)
+        e_checker.save_stat(True)
+        e_checker.save_stat(True)
+
+        assert_that(
+            e_checker.store.intervals(e_checker.key),
+            contains_exactly(contains_exactly(DATETIME_TO_MOCK.timestamp(), DATETIME_TO_MOCK.timestamp())),
+        )
 
     @freeze_time(DATETIME_TO_MOCK)
-    @patch("electricitybot.bot.build_chart")
-    def test_check_and_send_stats(self, build_chart_mock, tg_bot_mock):
+    @patch("electricitybot.chart.build_chart")
+    def test_weekly_stats_are_sent(self, build_chart_mock, tg_bot_mock):
         chart_binary_value = b"test image output"
         ukraine_now = datetime.now(UKRAINE_TZ)
         day_start = UKRAINE_TZ.localize(datetime.combine(ukraine_now, datetime.min.time()))
@@ -195,71 +194,48 @@ class TestElectricitybot:
             ),
         ]
 
+        for interval in intervals:
+            e_checker.store.append(e_checker.key, False, interval.start_time.timestamp())
+            e_checker.store.append(e_checker.key, True, interval.end_time.timestamp())
+
         build_chart_mock.return_value = chart_binary_value
-        db_mock = MagicMock(get=Mock(side_effect=lambda *args, **kwargs: intervals))
 
-        with (
-            override_settings(
-                stats_day_of_week=datetime.now(UKRAINE_TZ).isoweekday(), stats_hour=datetime.now(UKRAINE_TZ).hour
-            ),
-            patch("electricitybot.ElectricityChecker.db", db_mock),
+        with override_settings(
+            stats_day_of_week=datetime.now(UKRAINE_TZ).isoweekday(), stats_hour=datetime.now(UKRAINE_TZ).hour
         ):
-            e_checker.check_and_send_stats()
+            asyncio.run(e_checker.stats_tick())
 
         assert_that(
-            db_mock.__setitem__.call_args_list,
-            all_of(
-                has_length(2),
-                contains_exactly(
-                    has_property(
-                        "args",
-                        contains_exactly(
-                            "stats_last_sent_date",
-                            datetime.now(UKRAINE_TZ).date(),
-                        ),
-                    ),
-                    has_property(
-                        "args",
-                        contains_exactly(
-                            "intervals",
-                            contains_exactly(
-                                has_properties(
-                                    start_time=day_start,
-                                    end_time=ukraine_now.replace(hour=1, minute=17),
-                                ),
-                                has_properties(
-                                    start_time=ukraine_now.replace(hour=10, minute=7),
-                                    end_time=ukraine_now.replace(hour=11, minute=10),
-                                ),
-                            ),
-                        ),
-                    ),
-                ),
-            ),
+            e_checker.store.get_value(e_checker.key, "stats_last_sent_date"),
+            equal_to(datetime.now(UKRAINE_TZ).date().isoformat()),
         )
+        assert_that(e_checker.store.intervals(e_checker.key), has_length(len(intervals)))
 
         build_chart_mock.assert_called_once_with(
             [
                 (
-                    week_ago,
-                    week_ago + timedelta(hours=1, minutes=34),
+                    week_ago.timestamp(),
+                    (week_ago + timedelta(hours=1, minutes=34)).timestamp(),
                 ),
                 (
-                    (ukraine_now - timedelta(days=2)).replace(hour=23, minute=1),
-                    (ukraine_now - timedelta(days=1)).replace(hour=1, minute=23),
+                    (ukraine_now - timedelta(days=2)).replace(hour=23, minute=1).timestamp(),
+                    (ukraine_now - timedelta(days=1)).replace(hour=1, minute=23).timestamp(),
                 ),
                 (
-                    (ukraine_now - timedelta(days=1)).replace(hour=23, minute=15),
-                    day_start,
+                    (ukraine_now - timedelta(days=1)).replace(hour=23, minute=15).timestamp(),
+                    day_start.timestamp(),
                 ),
-                (week_ago, week_ago),
-                (week_ago + timedelta(days=1), week_ago + timedelta(days=1)),
-                (week_ago + timedelta(days=2), week_ago + timedelta(days=2)),
-                (week_ago + timedelta(days=3), week_ago + timedelta(days=3)),
-                (week_ago + timedelta(days=4), week_ago + timedelta(days=4)),
-                (week_ago + timedelta(days=5), week_ago + timedelta(days=5)),
-                (week_ago + timedelta(days=6), week_ago + timedelta(days=6)),
-            ]
+            ],
+            week_ago.date(),
+            (day_start - timedelta(days=1)).date(),
+            title="Статистика світла за тиждень",
+            renderer="matplotlib",
+            # daily totals kept by store, replaced times keep seconds of frozen time
+            stats=[
+                DailyStats(week_ago.date(), 5640, 1, 5640),
+                DailyStats((ukraine_now - timedelta(days=2)).date(), 3540 - 1, 1, 3540 - 1),
+                DailyStats((ukraine_now - timedelta(days=1)).date(), 4980 + 2700, 2, 4980 + 1),
+            ],
         )
         tg_bot_mock().send_photo.assert_awaited_once_with(
             chat_id=e_checker.chat_id,
@@ -268,3 +244,768 @@ class TestElectricitybot:
             caption="📊Статистика світла за тиждень",
             photo=chart_binary_value,
         )
+
+
+class TestSettings:
+
+    def test_target_is_required(self):
+        with pytest.raises(ValidationError):
+            Settings(api_token="test-token", chat_id=None, ip_to_check=None, targets=[])
+
+    def test_targets_without_default_target(self):
+        targets = [Target(ip_to_check="10.0.0.1", chat_id="@building")]
+        test_settings = Settings(api_token="test-token", chat_id=None, ip_to_check=None, targets=targets)
+
+        assert_that(test_settings.targets, equal_to(targets))
+
+    def test_hysteresis_threshold_should_fit_window(self):
+        with pytest.raises(ValidationError):
+            Settings(api_token="test-token", hysteresis_window=2, hysteresis_threshold=3)
+
+    @pytest.mark.parametrize("schedule", [{"stats_day_of_week": 0}, {"stats_day_of_week": 8}, {"stats_hour": 24}])
+    def test_stats_schedule_should_exist(self, schedule):
+        with pytest.raises(ValidationError):
+            Settings(api_token="test-token", **schedule)
+
+    def test_env_file_with_removed_settings(self, tmp_path):
+        env_file = tmp_path / ".env"
+        env_file.write_text("API_TOKEN=test-token\nRETRIES_COUNT=3\nSLEEP_BETWEEN_RETRY=2\n")
+
+        assert_that(Settings(_env_file=env_file).api_token, equal_to("test-token"))
+
+    def test_split_mode_needs_storage_file(self):
+        with pytest.raises(ValidationError):
+            Settings(api_token="test-token", process_mode="split", storage_path=":memory:")
+
+    def test_destinations(self, monkeypatch):
+        monkeypatch.setenv("DESTINATIONS", '[{"chat_id": "@district"}, {"chat_id": "-1001", "thread_id": 3}]')
+
+        assert_that(
+            Settings().default_target.destinations,
+            contains_exactly(Destination(chat_id="@district"), Destination(chat_id="-1001", thread_id=3)),
+        )
+
+
+class TestElectricityMonitor:
+    targets = [Target(ip_to_check=f"10.0.0.{i}", chat_id=f"@building-{i}", label=f"Будинок {i}") for i in range(3)]
+
+    def test_init_default_target(self, tg_bot_mock):
+        monitor = ElectricityMonitor()
+
+        assert_that(monitor.checkers, contains_exactly(has_properties(key=settings.ip_to_check, store=monitor.store)))
+        tg_bot_mock.assert_not_called()
+        assert_that(monitor.tg_bot.get_updates, equal_to(tg_bot_mock.return_value.get_updates))
+        assert_that(monitor.tg_bot.get_me, equal_to(tg_bot_mock.return_value.get_me))
+        tg_bot_mock.assert_called_once_with(token=settings.api_token, request=ANY)
+
+    def test_init_targets(self, tg_bot_mock):
+        with override_settings(targets=self.targets):
+            monitor = ElectricityMonitor()
+
+        assert_that(
+            monitor.checkers,
+            contains_exactly(
+                *[
+                    has_properties(ip_to_check=t.ip_to_check, chat_id=t.chat_id, tg_bot=monitor.tg_bot)
+                    for t in self.targets
+                ]
+            ),
+        )
+        tg_bot_mock.assert_called_once_with(token=settings.api_token, request=ANY)
+
+    @patch("telegram.request.HTTPXRequest")
+    def test_connection_pool(self, request_mock, tg_bot_mock):
+        with override_settings(telegram_pool_size=4):
+            monitor = ElectricityMonitor()
+            monitor.tg_bot.send_message
+
+        request_mock.assert_called_once_with(connection_pool_size=4)
+        tg_bot_mock.assert_called_once_with(token=settings.api_token, request=request_mock())
+        assert_that(monitor.outbox.max_concurrency, equal_to(4))
+
+    def test_serve_probes_targets_concurrently(self, tg_bot_mock):
+        targets = [Target(ip_to_check=f"10.0.{i // 256}.{i % 256}", chat_id="@building") for i in range(300)]
+        probes = []
+
+        async def probe_once(detector):
+            await asyncio.sleep(0.1)
+            probes.append(detector.key)
+            return True
+
+        async def serve_for_a_while(monitor):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(monitor.serve(), 0.3)
+
+        with (
+            override_settings(targets=targets, send_weekly_stats=False),
+            patch("electricitybot.detector.TargetDetector.probe_once", probe_once),
+        ):
+            monitor = ElectricityMonitor()
+            monitor._loop.run_until_complete(serve_for_a_while(monitor))
+
+        assert_that(set(probes), has_length(300))
+
+    @patch("electricitybot.ElectricityChecker.send_stats")
+    def test_stats_tick(self, send_stats_mock, tg_bot_mock):
+        with (
+            override_settings(targets=self.targets),
+            patch("electricitybot.ElectricityChecker.stats_due", Mock(side_effect=[True, False, True])),
+        ):
+            monitor = ElectricityMonitor()
+            monitor._loop.run_until_complete(monitor.stats_tick())
+
+        assert_that(send_stats_mock.await_count, equal_to(2))
+
+    def test_serve_polls_commands(self, tg_bot_mock):
+        async def serve_for_a_while(monitor):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(monitor.serve(), 0.1)
+
+        with (
+            override_settings(handle_commands=True, send_weekly_stats=False, max_probe_interval=60),
+            patch("electricitybot.detector.TargetDetector.probe_once", AsyncMock(return_value=True)),
+            patch("electricitybot.commands.CommandHandler.poll_forever", AsyncMock()) as poll_forever_mock,
+        ):
+            monitor = ElectricityMonitor()
+            monitor._loop.run_until_complete(serve_for_a_while(monitor))
+
+        poll_forever_mock.assert_awaited_once()
+
+    def test_slow_delivery_does_not_delay_probes(self, tg_bot_mock):
+        probes = []
+
+        async def probe_once(detector):
+            probes.append(monotonic())
+            return len(probes) % 2 == 0
+
+        async def slow_send_message(**kwargs):
+            await asyncio.sleep(10)
+
+        tg_bot_mock().send_message = slow_send_message
+
+        async def serve_for_a_while(monitor):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(monitor.serve(), 0.5)
+
+        with (
+            override_settings(
+                timeout=0.05,
+                fast_probe_interval=0.05,
+                max_probe_interval=0.05,
+                hysteresis_window=1,
+                hysteresis_threshold=1,
+            ),
+            patch("electricitybot.detector.TargetDetector.probe_once", probe_once),
+            patch("electricitybot.ElectricityChecker.save_stat", Mock()),
+            patch("electricitybot.ElectricityChecker.stats_due", Mock(return_value=False)),
+        ):
+            monitor = ElectricityMonitor()
+            monitor._loop.run_until_complete(serve_for_a_while(monitor))
+
+        # every probe changes state, still probes are made at fixed rate while first message is being sent
+        assert_that(len(probes), all_of(greater_than_or_equal_to(9), less_than_or_equal_to(11)))
+
+    def test_worker_announces_queued_states(self, tg_bot_mock, tmp_path):
+        target = Target(ip_to_check="10.0.0.1", chat_id="@building")
+        now = DATETIME_TO_MOCK.timestamp()
+        with override_settings(targets=[target], storage_path=str(tmp_path / "outages.sqlite3")):
+            worker = ElectricityMonitor(probe=False)
+        store = worker.store
+        # as probe process queues them: first state, outage confirmed, then power back
+        for state, at in ((True, now), (False, now + 3900), (True, now + 4500)):
+            store.push_state_change(target.ip_to_check, state, at)
+        store.push_state_change("10.0.0.9", False, now)
+
+        with freeze_time(DATETIME_TO_MOCK + timedelta(hours=2)):
+            worker._loop.run_until_complete(worker.apply_state_changes())
+
+        # worker handled the states late, still durations and history are of when they were decided;
+        # both messages are still pending, so the outbox keeps only the latest one
+        assert_that(
+            [item.kwargs["text"] for item in store.outbox_items(10)],
+            contains_exactly("🔋Є світло\n(світла не було 0 год. 10 хв.)"),
+        )
+        assert_that(store.intervals(target.ip_to_check), contains_exactly((now + 3900, now + 4500)))
+        assert_that(worker.checkers[0].last_state_change_time, equal_to(now + 4500))
+        assert_that(store.state_changes(), equal_to([]))
+
+    def test_worker_does_not_probe(self, tg_bot_mock):
+        async def serve_for_a_while(monitor):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(monitor.serve(), 0.1)
+
+        with (
+            override_settings(send_weekly_stats=False, state_poll_interval=0.01),
+            patch("electricitybot.detector.TargetDetector.probe_once", AsyncMock()) as probe_once_mock,
+            patch("electricitybot.bot.ElectricityMonitor.apply_state_changes", AsyncMock()) as apply_mock,
+        ):
+            monitor = ElectricityMonitor(probe=False)
+            monitor._loop.run_until_complete(serve_for_a_while(monitor))
+
+        probe_once_mock.assert_not_awaited()
+        assert_that(apply_mock.await_count, greater_than_or_equal_to(5))
+
+    def test_worker_stops_with_probe_process(self, tg_bot_mock):
+        probe_process = Mock(is_alive=Mock(return_value=False), exitcode=1)
+
+        async def serve_until_probe_process_exits(monitor):
+            with pytest.raises(RuntimeError, match="exited with code 1"):
+                await monitor.serve()
+            others = asyncio.all_tasks() - {asyncio.current_task()}
+            for task in others:
+                task.cancel()
+            await asyncio.gather(*others, return_exceptions=True)
+
+        with (
+            override_settings(send_weekly_stats=False, state_poll_interval=0.01),
+            patch("electricitybot.bot.ElectricityMonitor.apply_state_changes", AsyncMock()),
+        ):
+            monitor = ElectricityMonitor(probe=False, probe_process=probe_process)
+            monitor._loop.run_until_complete(serve_until_probe_process_exits(monitor))
+
+
+@patch("electricitybot.ElectricityChecker.save_stat", Mock())
+class TestProbeTick:
+
+    def probe_tick(self, e_checker: ElectricityChecker, *results: bool) -> list[bool]:
+        states = []
+        with patch("electricitybot.detector.TargetDetector.probe_once", AsyncMock(side_effect=results)):
+            for _ in results:
+                asyncio.run(e_checker.detector.probe_tick())
+                states.append(e_checker.previous_e_state)
+        return states
+
+    def test_single_failure_is_ignored(self, tg_bot_mock):
+        e_checker = ElectricityChecker()
+
+        states = self.probe_tick(e_checker, True, False, True, True, True, False)
+
+        assert_that(states, equal_to([True] * 6))
+        tg_bot_mock().send_message.assert_not_called()
+
+    def test_outage_is_confirmed(self, tg_bot_mock):
+        e_checker = ElectricityChecker()
+
+        states = self.probe_tick(e_checker, True, False, True, False, False, True)
+
+        assert_that(states, equal_to([True, True, True, False, False, False]))
+        tg_bot_mock().send_message.assert_awaited_once_with(
+            chat_id=e_checker.chat_id, message_thread_id=None, text=ElectricityChecker.power_messages[False]
+        )
+
+    def test_probes_are_logged(self, tg_bot_mock, tmp_path):
+        with override_settings(probe_log_dir=str(tmp_path), probe_log_size=16):
+            e_checker = ElectricityChecker()
+
+        with patch(
+            "electricitybot.detector.system_ping", Mock(side_effect=[ProbeResult(True, 0.002), ProbeResult(False)])
+        ):
+            asyncio.run(e_checker.detector.probe_tick())
+            asyncio.run(e_checker.detector.probe_tick())
+        self.probe_tick(e_checker, True)
+
+        records = e_checker.detector.probe_log.records()
+        assert_that(records["success"].tolist(), equal_to([1, 0, 1]))
+        assert_that(records["rtt"][0], close_to(0.002, 1e-6))
+        assert_that(e_checker.detector.probe_log.path, equal_to(str(tmp_path / f"probes_{e_checker.key}.ring")))
+
+    def test_probe_interval_adapts(self, tg_bot_mock):
+        with override_settings(timeout=60, fast_probe_interval=5, max_probe_interval=300, probe_interval_growth=2):
+            e_checker = ElectricityChecker()
+
+        intervals = []
+        with patch(
+            "electricitybot.detector.TargetDetector.probe_once", AsyncMock(side_effect=[True] * 4 + [False] * 3)
+        ):
+            for _ in range(7):
+                asyncio.run(e_checker.detector.probe_tick())
+                intervals.append(e_checker.detector.probe_interval())
+
+        # slows down while stable, speeds up on suspicious probe and right after outage is confirmed,
+        # then slows down again while outage goes on
+        assert_that(intervals, equal_to([120, 240, 300, 300, 5, 5, 10]))
+
+    def test_probe_interval_does_not_grow_by_default(self, tg_bot_mock):
+        with override_settings(timeout=60, fast_probe_interval=5, max_probe_interval=None, probe_interval_growth=2):
+            e_checker = ElectricityChecker()
+
+        intervals = []
+        with patch(
+            "electricitybot.detector.TargetDetector.probe_once", AsyncMock(side_effect=[True] * 3 + [False] * 4)
+        ):
+            for _ in range(7):
+                asyncio.run(e_checker.detector.probe_tick())
+                intervals.append(e_checker.detector.probe_interval())
+
+        # worst case detection time stays TIMEOUT while state is stable
+        assert_that(intervals, equal_to([60, 60, 60, 5, 5, 10, 20]))
+
+
+class TestElectricitybotStats:
+
+    @freeze_time(DATETIME_TO_MOCK)
+    @patch("electricitybot.chart.build_chart")
+    def test_weekly_stats_with_ongoing_outage(self, build_chart_mock, tg_bot_mock):
+        day_start = UKRAINE_TZ.localize(datetime.combine(DATETIME_TO_MOCK, datetime.min.time()))
+        week_ago = day_start - timedelta(days=7)
+        e_checker = ElectricityChecker()
+        e_checker.store.append(e_checker.key, False, (day_start - timedelta(hours=2)).timestamp())
+
+        with override_settings(stats_day_of_week=DATETIME_TO_MOCK.isoweekday(), stats_hour=DATETIME_TO_MOCK.hour):
+            asyncio.run(e_checker.stats_tick())
+
+        assert_that(
+            build_chart_mock.call_args.args,
+            contains_exactly(
+                [((day_start - timedelta(hours=2)).timestamp(), day_start.timestamp())],
+                week_ago.date(),
+                (day_start - timedelta(days=1)).date(),
+            ),
+        )
+
+    @freeze_time(DATETIME_TO_MOCK)
+    @patch("electricitybot.chart.build_chart", Mock(return_value=b"test image output"))
+    @pytest.mark.parametrize("send_weekly_stats", [True, False])
+    def test_stats_tick_compacts_old_history(self, tg_bot_mock, send_weekly_stats):
+        old_outage_start = DATETIME_TO_MOCK - timedelta(days=100)
+        recent_outage_start = DATETIME_TO_MOCK - timedelta(days=3)
+        e_checker = ElectricityChecker()
+        for outage_start in (old_outage_start, recent_outage_start):
+            e_checker.store.append(e_checker.key, False, outage_start.timestamp())
+            e_checker.store.append(e_checker.key, True, (outage_start + timedelta(hours=1)).timestamp())
+
+        # not the stats hour: history is compacted on its own schedule, not when weekly stats are sent
+        with override_settings(
+            send_weekly_stats=send_weekly_stats, send_monthly_stats=True, stats_hour=0, raw_history_days=30
+        ):
+            asyncio.run(e_checker.stats_tick())
+
+        assert_that(
+            e_checker.store.intervals(e_checker.key),
+            contains_exactly((recent_outage_start.timestamp(), (recent_outage_start + timedelta(hours=1)).timestamp())),
+        )
+        assert_that(
+            e_checker.store.daily_stats(
+                e_checker.key, old_outage_start.date(), DATETIME_TO_MOCK.date() + timedelta(days=1)
+            ),
+            contains_exactly(
+                has_properties(day=old_outage_start.date(), outage_seconds=3600),
+                has_properties(day=recent_outage_start.date(), outage_seconds=3600),
+            ),
+        )
+
+    def test_history_is_compacted_once_a_day(self, tg_bot_mock):
+        e_checker = ElectricityChecker()
+
+        with (
+            override_settings(send_weekly_stats=False, send_monthly_stats=True, raw_history_days=30),
+            patch.object(e_checker.store, "compact", wraps=e_checker.store.compact) as compact_mock,
+        ):
+            for at in (DATETIME_TO_MOCK, DATETIME_TO_MOCK + timedelta(hours=1), DATETIME_TO_MOCK + timedelta(days=1)):
+                with freeze_time(at):
+                    asyncio.run(e_checker.stats_tick())
+
+        assert_that(
+            [call.args[1] for call in compact_mock.call_args_list],
+            equal_to(
+                [
+                    UKRAINE_TZ.localize(datetime(2022, 3, 16)).timestamp(),
+                    UKRAINE_TZ.localize(datetime(2022, 3, 17)).timestamp(),
+                ]
+            ),
+        )
+
+    @freeze_time(DATETIME_TO_MOCK)
+    def test_today_stats(self, tg_bot_mock):
+        e_checker = ElectricityChecker()
+        assert_that(e_checker.today_stats(), equal_to(DailyStats(DATETIME_TO_MOCK.date(), 0, 0, 0)))
+
+        e_checker.store.append(e_checker.key, False, (DATETIME_TO_MOCK - timedelta(hours=14)).timestamp())
+        e_checker.store.append(e_checker.key, True, (DATETIME_TO_MOCK - timedelta(hours=11)).timestamp())
+        e_checker.store.append(e_checker.key, False, (DATETIME_TO_MOCK - timedelta(hours=2)).timestamp())
+
+        # 01:34:01 of outage that started yesterday, and outage going on for 2 hours
+        assert_that(e_checker.today_stats(), equal_to(DailyStats(DATETIME_TO_MOCK.date(), 5641 + 7200, 2, 7200)))
+
+    @freeze_time(DATETIME_TO_MOCK)
+    @patch("electricitybot.chart.build_chart")
+    def test_weekly_stats_without_history(self, build_chart_mock, tg_bot_mock):
+        e_checker = ElectricityChecker()
+
+        with override_settings(stats_day_of_week=DATETIME_TO_MOCK.isoweekday(), stats_hour=DATETIME_TO_MOCK.hour):
+            asyncio.run(e_checker.stats_tick())
+
+        build_chart_mock.assert_not_called()
+        tg_bot_mock().send_photo.assert_not_called()
+        assert_that(e_checker.stats_last_send_date, equal_to(DATETIME_TO_MOCK.date()))
+
+    @freeze_time(DATETIME_TO_MOCK)
+    @patch("electricitybot.chart.build_chart")
+    def test_weekly_stats_already_sent(self, build_chart_mock, tg_bot_mock):
+        e_checker = ElectricityChecker()
+        e_checker.store.set_value(e_checker.key, "stats_last_sent_date", DATETIME_TO_MOCK.date().isoformat())
+
+        with override_settings(stats_day_of_week=DATETIME_TO_MOCK.isoweekday(), stats_hour=DATETIME_TO_MOCK.hour):
+            asyncio.run(e_checker.stats_tick())
+
+        build_chart_mock.assert_not_called()
+
+
+class TestPrerenderStats:
+    # DATETIME_TO_MOCK is Friday 12:34:01, stats are sent 26 minutes later
+    stats_time = UKRAINE_TZ.localize(datetime.fromisoformat("2022-04-15 13:00:00"))
+
+    @pytest.fixture
+    def e_checker(self, tg_bot_mock):
+        with override_settings(stats_day_of_week=5, stats_hour=13, stats_prerender_minutes=30):
+            e_checker = ElectricityChecker()
+            outage_start = DATETIME_TO_MOCK - timedelta(days=3)
+            e_checker.store.append(e_checker.key, False, outage_start.timestamp())
+            e_checker.store.append(e_checker.key, True, (outage_start + timedelta(hours=1)).timestamp())
+            yield e_checker
+
+    def prerender_and_send(self, e_checker, before_send=lambda: None):
+        with freeze_time(DATETIME_TO_MOCK):
+            asyncio.run(e_checker.prerender_stats())
+        before_send()
+        with freeze_time(self.stats_time):
+            asyncio.run(e_checker.stats_tick())
+
+    @patch("electricitybot.chart.build_chart", return_value=b"test image output")
+    def test_chart_is_rendered_before_sending(self, build_chart_mock, e_checker, tg_bot_mock):
+        self.prerender_and_send(e_checker)
+
+        build_chart_mock.assert_called_once()
+        tg_bot_mock().send_photo.assert_awaited_once()
+        assert_that(tg_bot_mock().send_photo.await_args.kwargs["photo"], equal_to(b"test image output"))
+        assert_that(e_checker.rendered_chart, equal_to(None))
+
+    @patch("electricitybot.chart.build_chart", return_value=b"test image output")
+    def test_chart_is_rendered_again_when_week_changed(self, build_chart_mock, e_checker, tg_bot_mock):
+        def add_outage():
+            outage_start = DATETIME_TO_MOCK - timedelta(days=2)
+            e_checker.store.append(e_checker.key, False, outage_start.timestamp())
+            e_checker.store.append(e_checker.key, True, (outage_start + timedelta(hours=1)).timestamp())
+
+        self.prerender_and_send(e_checker, add_outage)
+
+        assert_that(build_chart_mock.call_count, equal_to(2))
+        assert_that(build_chart_mock.call_args.args[0], has_length(2))
+
+    @patch("electricitybot.chart.build_chart", return_value=b"test image output")
+    def test_chart_is_not_rendered_too_early(self, build_chart_mock, e_checker):
+        with override_settings(stats_prerender_minutes=10), freeze_time(DATETIME_TO_MOCK):
+            asyncio.run(e_checker.prerender_stats())
+
+        build_chart_mock.assert_not_called()
+
+    @patch("electricitybot.chart.build_chart", return_value=b"test image output")
+    def test_nothing_is_rendered_without_history(self, build_chart_mock, tg_bot_mock):
+        with override_settings(stats_day_of_week=5, stats_hour=13), freeze_time(DATETIME_TO_MOCK):
+            e_checker = ElectricityChecker()
+            asyncio.run(e_checker.prerender_stats())
+
+        build_chart_mock.assert_not_called()
+
+    @freeze_time(DATETIME_TO_MOCK)
+    @pytest.mark.parametrize(
+        "stats_day_of_week, stats_hour, expected",
+        [
+            (5, 13, "2022-04-15 13:00:00"),
+            (5, 12, "2022-04-22 12:00:00"),
+            (1, 0, "2022-04-18 00:00:00"),
+        ],
+    )
+    def test_next_stats_time(self, stats_day_of_week, stats_hour, expected, tg_bot_mock):
+        with override_settings(stats_day_of_week=stats_day_of_week, stats_hour=stats_hour):
+            assert_that(
+                ElectricityChecker().next_stats_time(),
+                equal_to(UKRAINE_TZ.localize(datetime.fromisoformat(expected))),
+            )
+
+    @freeze_time(DATETIME_TO_MOCK)
+    def test_next_stats_time_follows_schedule_change(self, tg_bot_mock):
+        e_checker = ElectricityChecker()
+
+        with override_settings(stats_day_of_week=5, stats_hour=13):
+            assert_that(e_checker.next_stats_time(), equal_to(self.stats_time))
+            assert_that(e_checker.next_stats_time(), equal_to(self.stats_time))
+        with override_settings(stats_day_of_week=5, stats_hour=14):
+            assert_that(e_checker.next_stats_time(), equal_to(self.stats_time + timedelta(hours=1)))
+
+    @patch("electricitybot.ElectricityChecker.prerender_stats")
+    def test_stats_tick_prerenders_stats(self, prerender_stats_mock, tg_bot_mock):
+        with patch("electricitybot.ElectricityChecker.stats_due", Mock(return_value=False)):
+            monitor = ElectricityMonitor()
+            monitor._loop.run_until_complete(monitor.stats_tick())
+
+        prerender_stats_mock.assert_awaited_once()
+
+
+class TestReports:
+    first_of_may = UKRAINE_TZ.localize(datetime.fromisoformat("2022-05-01 12:10:00"))
+    first_of_year = UKRAINE_TZ.localize(datetime.fromisoformat("2023-01-01 12:10:00"))
+
+    @pytest.fixture
+    def e_checker(self, tg_bot_mock):
+        e_checker = ElectricityChecker()
+        outage_start = DATETIME_TO_MOCK - timedelta(days=3)
+        e_checker.store.append(e_checker.key, False, outage_start.timestamp())
+        e_checker.store.append(e_checker.key, True, (outage_start + timedelta(hours=1)).timestamp())
+        with override_settings(send_weekly_stats=False, send_monthly_stats=True, send_yearly_stats=True, stats_hour=12):
+            yield e_checker
+
+    @pytest.mark.parametrize(
+        "period, stats_day, expected",
+        [
+            ("month", date(2022, 5, 1), date(2022, 4, 1)),
+            ("month", date(2022, 3, 31), date(2022, 2, 28)),
+            ("month", date(2022, 1, 15), date(2021, 12, 15)),
+            ("year", date(2023, 1, 1), date(2022, 1, 1)),
+            ("year", date(2024, 2, 29), date(2023, 2, 28)),
+        ],
+    )
+    def test_report_first_day(self, period, stats_day, expected):
+        assert_that(report_first_day(period, stats_day), equal_to(expected))
+
+    @patch("electricitybot.chart.build_report", return_value=b"test image output")
+    def test_monthly_report_is_sent(self, build_report_mock, e_checker, tg_bot_mock):
+        with freeze_time(self.first_of_may):
+            asyncio.run(e_checker.stats_tick())
+            asyncio.run(e_checker.stats_tick())
+
+        build_report_mock.assert_called_once()
+        assert_that(build_report_mock.call_args.args[1:], contains_exactly(date(2022, 4, 1), date(2022, 4, 30)))
+        assert_that(
+            build_report_mock.call_args.kwargs,
+            has_entries(
+                title="Статистика світла за місяць (01.04.2022 – 30.04.2022)",
+                hourly_since=date(2022, 1, 31),
+                stats=contains_exactly(has_properties(day=(DATETIME_TO_MOCK - timedelta(days=3)).date())),
+            ),
+        )
+        tg_bot_mock().send_photo.assert_awaited_once_with(
+            chat_id=e_checker.chat_id,
+            message_thread_id=e_checker.thread_id,
+            disable_notification=True,
+            caption="📊Статистика світла за місяць",
+            photo=b"test image output",
+        )
+
+    @patch("electricitybot.chart.build_report", return_value=b"test image output")
+    def test_monthly_report_of_compacted_history(self, build_report_mock, e_checker, tg_bot_mock):
+        outage_start = DATETIME_TO_MOCK - timedelta(days=3)
+
+        with override_settings(send_yearly_stats=False, raw_history_days=8), freeze_time(self.first_of_may):
+            asyncio.run(e_checker.stats_tick())
+
+        # only monthly stats are sent, still raw history is compacted before the report is built,
+        # and hourly cells are left out exactly for compacted days
+        assert_that(e_checker.store.intervals(e_checker.key), equal_to([]))
+        assert_that(build_report_mock.call_args.args[0], equal_to([]))
+        assert_that(
+            build_report_mock.call_args.kwargs,
+            has_entries(
+                hourly_since=date(2022, 4, 23),
+                stats=contains_exactly(has_properties(day=outage_start.date(), outage_seconds=3600)),
+            ),
+        )
+        tg_bot_mock().send_photo.assert_awaited_once()
+
+    def test_report_before_history_is_compacted(self, e_checker):
+        with freeze_time(self.first_of_may):
+            report = e_checker.report("month", self.first_of_may.date())
+
+        assert_that(report.hourly_since, equal_to(None))
+        assert_that(report.intervals, has_length(1))
+
+    @patch("electricitybot.chart.build_report", return_value=b"test image output")
+    def test_yearly_report_is_sent(self, build_report_mock, e_checker, tg_bot_mock):
+        with freeze_time(self.first_of_year):
+            asyncio.run(e_checker.stats_tick())
+
+        assert_that(
+            [call.args[1:] for call in build_report_mock.call_args_list],
+            contains_exactly(
+                (date(2022, 12, 1), date(2022, 12, 31)),
+                (date(2022, 1, 1), date(2022, 12, 31)),
+            ),
+        )
+        assert_that(tg_bot_mock().send_photo.await_args.kwargs["caption"], equal_to("📊Статистика світла за рік"))
+
+    @pytest.mark.parametrize(
+        "now, overrides",
+        [
+            (first_of_may, dict(send_monthly_stats=False)),
+            (first_of_may, dict(stats_hour=13)),
+            (first_of_may + timedelta(days=1), {}),
+        ],
+    )
+    @patch("electricitybot.chart.build_report")
+    def test_report_is_not_due(self, build_report_mock, e_checker, now, overrides):
+        with override_settings(**overrides), freeze_time(now):
+            asyncio.run(e_checker.stats_tick())
+
+        build_report_mock.assert_not_called()
+
+    @patch("electricitybot.chart.build_report")
+    def test_report_without_history(self, build_report_mock, tg_bot_mock):
+        e_checker = ElectricityChecker()
+
+        with override_settings(send_monthly_stats=True, stats_hour=12), freeze_time(self.first_of_may):
+            asyncio.run(e_checker.stats_tick())
+
+        build_report_mock.assert_not_called()
+        assert_that(e_checker.store.get_value(e_checker.key, "month_stats_last_sent_date"), equal_to("2022-05-01"))
+
+    def test_report_title_has_label(self, tg_bot_mock):
+        e_checker = ElectricityChecker(Target(ip_to_check="10.0.0.1", chat_id="@b", label="Ващенка 3"))
+
+        assert_that(e_checker.report_titles["year"], equal_to("Статистика світла (за адресою Ващенка 3) за рік"))
+
+    @freeze_time(DATETIME_TO_MOCK)
+    def test_outages_are_kept_for_reports_only(self, tg_bot_mock):
+        e_checker = ElectricityChecker()
+
+        with override_settings(send_weekly_stats=False, send_yearly_stats=True):
+            asyncio.run(e_checker.notify(False))
+
+        assert_that(e_checker.store.outage_start(e_checker.key), equal_to(DATETIME_TO_MOCK.timestamp()))
+
+
+class TestFanOut:
+    target = Target(
+        ip_to_check="10.0.0.1",
+        chat_id="@building",
+        thread_id=3,
+        destinations=[Destination(chat_id="@district"), Destination(chat_id="-1001", thread_id=5)],
+    )
+
+    def test_state_message_is_sent_to_every_destination(self, tg_bot_mock):
+        e_checker = ElectricityChecker(self.target)
+
+        asyncio.run(e_checker.notify(False))
+
+        assert_that(
+            tg_bot_mock().send_message.await_args_list,
+            contains_exactly(
+                *[
+                    has_properties(
+                        kwargs=dict(chat_id=chat_id, message_thread_id=thread_id, text="🪫Відключено електропостачання")
+                    )
+                    for chat_id, thread_id in (("@building", 3), ("@district", None), ("-1001", 5))
+                ]
+            ),
+        )
+
+    def test_photo_is_uploaded_once(self, tg_bot_mock):
+        tg_bot_mock().send_photo.return_value = Mock(photo=[Mock(file_id="thumbnail"), Mock(file_id="chart-file-id")])
+        e_checker = ElectricityChecker(self.target)
+
+        asyncio.run(e_checker.broadcast("send_photo", caption="📊Статистика", photo=b"\x89PNG"))
+
+        assert_that(
+            [call.kwargs["photo"] for call in tg_bot_mock().send_photo.await_args_list],
+            contains_exactly(b"\x89PNG", "chart-file-id", "chart-file-id"),
+        )
+
+    def test_calls_are_queued_for_every_destination(self, tg_bot_mock):
+        outbox = Mock()
+        e_checker = ElectricityChecker(self.target, outbox=outbox)
+
+        asyncio.run(e_checker.notify(True))
+        asyncio.run(e_checker.broadcast("send_photo", photo=b"\x89PNG"))
+
+        assert_that(
+            [call.args for call in outbox.put.call_args_list],
+            contains_exactly(
+                ("send_message", "10.0.0.1"),
+                ("send_message", "10.0.0.1:@district:None"),
+                ("send_message", "10.0.0.1:-1001:5"),
+                ("send_photo", None),
+                ("send_photo", None),
+                ("send_photo", None),
+            ),
+        )
+
+
+def sent_messages(e_checker: ElectricityChecker) -> list[str]:
+    return [call.kwargs["text"] for call in e_checker.tg_bot.send_message.await_args_list]
+
+
+@freeze_time(DATETIME_TO_MOCK)
+class TestRestart:
+    target = Target(ip_to_check="10.0.0.1", chat_id="@building")
+    now = DATETIME_TO_MOCK.timestamp()
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        store = OutageStore(str(tmp_path / "outages.sqlite3"))
+        yield store
+        store.close()
+
+    def checker_before_restart(self, store, state: bool, changed_at: float, seen_at: float) -> ElectricityChecker:
+        with freeze_time(datetime.fromtimestamp(seen_at, UKRAINE_TZ)):
+            store.save_runtime_state(self.target.ip_to_check, state, changed_at)
+            if not state:
+                store.append(self.target.ip_to_check, False, changed_at)
+        return ElectricityChecker(self.target, AsyncMock(), store=store)
+
+    def test_state_is_restored(self, store):
+        e_checker = self.checker_before_restart(store, True, self.now - 3900, self.now - 600)
+
+        probe_ticks(e_checker.detector, True, False, True)
+
+        assert_that(e_checker.previous_e_state, equal_to(True))
+        assert_that(e_checker.status_message(), equal_to("🔋Є світло (вже 1 год. 5 хв.)"))
+        assert_that(sent_messages(e_checker), equal_to([]))
+
+    def test_outage_started_while_bot_was_down(self, store):
+        e_checker = self.checker_before_restart(store, True, self.now - 3900, self.now - 600)
+
+        probe_ticks(e_checker.detector, False, False)
+
+        # outage is counted from the last time power was seen
+        assert_that(store.outage_start(self.target.ip_to_check), equal_to(self.now - 600))
+        assert_that(
+            sent_messages(e_checker), contains_exactly("🪫Відключено електропостачання\n(світло було 0 год. 55 хв.)")
+        )
+        assert_that(
+            store.runtime_state(self.target.ip_to_check), has_properties(state=False, changed_at=self.now - 600)
+        )
+
+    def test_outage_started_after_restart(self, store):
+        e_checker = self.checker_before_restart(store, True, self.now - 3900, self.now - 600)
+
+        probe_ticks(e_checker.detector, True, False, False)
+
+        assert_that(store.outage_start(self.target.ip_to_check), equal_to(self.now))
+
+    def test_outage_ended_while_bot_was_down(self, store):
+        e_checker = self.checker_before_restart(store, False, self.now - 3900, self.now - 600)
+
+        probe_ticks(e_checker.detector, True, True)
+
+        assert_that(store.intervals(self.target.ip_to_check), contains_exactly((self.now - 3900, self.now)))
+        assert_that(sent_messages(e_checker), contains_exactly("🔋Є світло\n(світла не було 1 год. 5 хв.)"))
+
+    def test_first_state_is_saved(self, store):
+        e_checker = ElectricityChecker(self.target, AsyncMock(), store=store)
+
+        probe_ticks(e_checker.detector, True)
+
+        assert_that(store.runtime_state(self.target.ip_to_check), equal_to((True, None, self.now)))
+
+    def test_seen_at_is_saved_once_a_while(self, store):
+        e_checker = self.checker_before_restart(store, True, self.now - 3900, self.now - 600)
+
+        with (
+            override_settings(state_snapshot_interval=60),
+            patch.object(store, "save_seen_at", wraps=store.save_seen_at) as save_seen_at_mock,
+        ):
+            for seconds in range(0, 120, 30):
+                with freeze_time(DATETIME_TO_MOCK + timedelta(seconds=seconds)):
+                    probe_ticks(e_checker.detector, True)
+
+        assert_that([call.args[1] for call in save_seen_at_mock.call_args_list], equal_to([self.now, self.now + 60]))
+        assert_that(store.runtime_state(self.target.ip_to_check).seen_at, equal_to(self.now + 60))
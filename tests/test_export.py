@@ -0,0 +1,187 @@
+import csv
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+from datetime import date, datetime
+from unittest.mock import patch
+
+import pyarrow.parquet as pq
+import pytest
+from conftest import local_timestamp
+from freezegun import freeze_time
+from hamcrest import assert_that, contains_exactly, equal_to, has_length, less_than, starts_with
+
+from electricitybot.bot import UKRAINE_TZ
+from electricitybot.export import DEFAULT_STORAGE_PATH, FIELDS, interval_rows, main, write_csv
+from electricitybot.settings import Settings
+from electricitybot.storage import OutageStore
+
+TARGET = "10.0.0.1"
+NOW = UKRAINE_TZ.localize(datetime.fromisoformat("2022-04-15 12:00:00"))
+
+
+@pytest.fixture
+def storage_path(tmp_path):
+    store = OutageStore(str(tmp_path / "outages.sqlite3"))
+    for target, start, end in (
+        (TARGET, "2022-04-13 23:00:00", "2022-04-14 01:30:00"),
+        (TARGET, "2022-04-15 10:00:00", None),
+        ("10.0.0.2", "2022-04-14 10:00:00", "2022-04-14 10:30:00"),
+    ):
+        store.append(target, False, local_timestamp(start))
+        if end:
+            store.append(target, True, local_timestamp(end))
+    store.close()
+    return store.path
+
+
+@freeze_time(NOW)
+class TestExport:
+
+    def test_intervals_csv(self, storage_path, tmp_path):
+        output = tmp_path / "outages.csv"
+
+        main(["intervals", "--storage", storage_path, "-o", str(output)])
+
+        with open(output, newline="") as output_file:
+            assert_that(
+                list(csv.reader(output_file)),
+                contains_exactly(
+                    ["target", "start", "end", "outage_seconds"],
+                    [TARGET, "2022-04-13T23:00:00+03:00", "2022-04-14T01:30:00+03:00", "9000.0"],
+                    [TARGET, "2022-04-15T10:00:00+03:00", "", ""],
+                    ["10.0.0.2", "2022-04-14T10:00:00+03:00", "2022-04-14T10:30:00+03:00", "1800.0"],
+                ),
+            )
+
+    def test_daily_jsonl(self, storage_path, capsys):
+        main(
+            [
+                "daily",
+                "--format",
+                "jsonl",
+                "--storage",
+                storage_path,
+                "--target",
+                TARGET,
+                "--since",
+                "2022-04-14",
+                "--until",
+                "2022-04-16",
+            ]
+        )
+
+        assert_that(
+            [json.loads(line) for line in capsys.readouterr().out.splitlines()],
+            contains_exactly(
+                {
+                    "target": TARGET,
+                    "day": "2022-04-14",
+                    "outage_seconds": 5400.0,
+                    "outage_count": 1,
+                    "longest_outage": 5400.0,
+                },
+                {
+                    "target": TARGET,
+                    "day": "2022-04-15",
+                    "outage_seconds": 7200.0,
+                    "outage_count": 1,
+                    "longest_outage": 7200.0,
+                },
+            ),
+        )
+
+    def test_parquet(self, storage_path, tmp_path):
+        intervals, daily = tmp_path / "outages.parquet", tmp_path / "daily.parquet"
+
+        main(["intervals", "--format", "parquet", "--storage", storage_path, "-o", str(intervals)])
+        main(["daily", "--format", "parquet", "--storage", storage_path, "-o", str(daily)])
+
+        intervals_table, daily_table = pq.read_table(intervals), pq.read_table(daily)
+        assert_that(intervals_table.column_names, contains_exactly("target", "start", "end", "outage_seconds"))
+        assert_that(intervals_table.column("outage_seconds").to_pylist(), contains_exactly(9000.0, None, 1800.0))
+        assert_that(
+            intervals_table.column("start")[0].as_py(), equal_to(UKRAINE_TZ.localize(datetime(2022, 4, 13, 23)))
+        )
+        assert_that(
+            daily_table.column("day").to_pylist(),
+            contains_exactly(date(2022, 4, 13), date(2022, 4, 14), date(2022, 4, 15), date(2022, 4, 14)),
+        )
+
+    def test_storage_path_from_environment(self, storage_path, tmp_path, monkeypatch):
+        output = tmp_path / "daily.csv"
+        monkeypatch.setenv("STORAGE_PATH", storage_path)
+
+        main(["daily", "-o", str(output)])
+
+        assert_that(output.read_text().splitlines(), has_length(5))
+
+    def test_default_storage_path_is_the_bot_one(self):
+        assert_that(DEFAULT_STORAGE_PATH, equal_to(Settings.model_fields["storage_path"].default))
+
+    def test_missing_storage_is_not_created(self, tmp_path):
+        missing = tmp_path / "mistyped.sqlite3"
+
+        with pytest.raises(SystemExit, match="Can not open"):
+            main(["intervals", "--storage", str(missing)])
+
+        assert_that(missing.exists(), equal_to(False))
+
+    def test_storage_is_not_changed(self, storage_path, tmp_path):
+        before = os.stat(storage_path).st_mtime_ns
+
+        main(["intervals", "--storage", storage_path, "-o", str(tmp_path / "outages.csv")])
+
+        assert_that(os.stat(storage_path).st_mtime_ns, equal_to(before))
+
+    def test_bot_settings_are_not_needed(self, storage_path, tmp_path):
+        env = {name: value for name, value in os.environ.items() if name not in ("API_TOKEN", "CHAT_ID", "IP_TO_CHECK")}
+
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys; from electricitybot.export import main; sys.exit(main(sys.argv[1:]))",
+                "daily",
+                "--storage",
+                storage_path,
+            ],
+            env=env,
+            cwd=tmp_path,
+            capture_output=True,
+            text=True,
+        )
+
+        assert_that(result.returncode, equal_to(0))
+        assert_that(result.stdout, starts_with("target,day,"))
+
+    def test_parquet_needs_output_file(self, storage_path):
+        with pytest.raises(SystemExit):
+            main(["intervals", "--format", "parquet", "--storage", storage_path])
+
+    def test_parquet_without_pyarrow(self, storage_path, tmp_path):
+        with patch.dict(sys.modules, {"pyarrow": None}), pytest.raises(SystemExit, match="needs pyarrow"):
+            main(["intervals", "--format", "parquet", "--storage", storage_path, "-o", str(tmp_path / "out.parquet")])
+
+
+class TestStreaming:
+
+    def test_memory_does_not_depend_on_history_size(self, tmp_path):
+        store = OutageStore(str(tmp_path / "large.sqlite3"))
+        with store._connection:
+            store._connection.executemany(
+                "INSERT INTO power_events (target, time, state) VALUES (?, ?, ?)",
+                ((TARGET, float(at), at % 2) for at in range(10_000)),
+            )
+
+        tracemalloc.start()
+        with open(os.devnull, "w") as output:
+            write_csv(interval_rows(store, [TARGET], date(1970, 1, 1), date(2022, 4, 16)), FIELDS["intervals"], output)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        store.close()
+
+        # rows of 5000 intervals kept in a list would take few MiB
+        assert_that(peak, less_than(256 * 1024))
@@ -0,0 +1,68 @@
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pytest
+from hamcrest import assert_that, contains_exactly, equal_to, greater_than, has_length
+
+from electricitybot.bot import PowerOutageInterval, UKRAINE_TZ
+from electricitybot.history import OutageHistory
+
+
+def history(*intervals) -> OutageHistory:
+    return OutageHistory([start for start, _ in intervals], [np.nan if end is None else end for _, end in intervals])
+
+
+class TestOutageHistory:
+
+    def test_from_events(self):
+        events = [(50, 1), (100, 0), (150, 0), (200, 1), (250, 1), (300, 0)]
+
+        outages = OutageHistory.from_events(events)
+
+        assert_that(outages.tolist(), contains_exactly((100, 200), (300, None)))
+        assert_that(repr(outages), equal_to("OutageHistory([(100.0, 200.0), (300.0, None)])"))
+
+    def test_from_events_since(self):
+        events = [(100, 0), (200, 1), (300, 0), (400, 1)]
+
+        assert_that(OutageHistory.from_events(events, since=200).tolist(), contains_exactly((300, 400)))
+
+    def test_from_no_events(self):
+        assert_that(OutageHistory.from_events([]), has_length(0))
+
+    @pytest.mark.parametrize("batch_size", [1, 2, 3, 1024])
+    def test_iter_events(self, batch_size):
+        events = [(50, 1), (100, 0), (150, 0), (200, 1), (250, 1), (300, 0), (350, 0), (400, 1), (500, 0)]
+
+        assert_that(
+            list(OutageHistory.iter_events(events, since=150, batch_size=batch_size)),
+            equal_to(OutageHistory.from_events(events, since=150).tolist()),
+        )
+        assert_that(list(OutageHistory.iter_events(events[:1], batch_size=batch_size)), equal_to([]))
+
+    def test_closed_and_clipped(self):
+        outages = history((100, 200), (300, 400), (500, None))
+
+        assert_that(outages.closed().tolist(), equal_to([[100, 200], [300, 400]]))
+        assert_that(outages.clipped(150, 550).tolist(), equal_to([[150, 200], [300, 400], [500, 550]]))
+        assert_that(outages.clipped().tolist(), equal_to([[100, 200], [300, 400], [500, np.inf]]))
+
+    def test_memory_of_years_of_history(self):
+        starts = (1_600_000_000 + np.arange(20_000) * 15_000.0).tolist()
+
+        tracemalloc.start()
+        intervals = [
+            PowerOutageInterval(
+                datetime.fromtimestamp(start, UKRAINE_TZ), datetime.fromtimestamp(start + 3600, UKRAINE_TZ)
+            )
+            for start in starts
+        ]
+        objects_memory = tracemalloc.get_traced_memory()[0]
+        del intervals
+        outages = OutageHistory(starts, np.array(starts) + 3600)
+        columns_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        assert_that(len(outages), equal_to(20_000))
+        assert_that(objects_memory, greater_than(8 * columns_memory))
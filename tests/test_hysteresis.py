@@ -0,0 +1,37 @@
+import pytest
+from hamcrest import assert_that, equal_to
+
+from electricitybot.hysteresis import Hysteresis
+
+
+def states(hysteresis: Hysteresis, *results: bool) -> list[bool]:
+    return [hysteresis.update(result) for result in results]
+
+
+class TestHysteresis:
+
+    def test_first_probe_sets_state(self):
+        assert_that(states(Hysteresis(), False), equal_to([False]))
+
+    def test_two_of_three(self):
+        hysteresis = Hysteresis(window=3, threshold=2)
+
+        assert_that(
+            states(hysteresis, True, False, True, True, True, False, False, True, False, False),
+            equal_to([True, True, True, True, True, True, False, False, False, False]),
+        )
+
+    def test_window_of_one_follows_probes(self):
+        assert_that(
+            states(Hysteresis(window=1, threshold=1), True, False, True, True), equal_to([True, False, True, True])
+        )
+
+    def test_all_of_window(self):
+        hysteresis = Hysteresis(window=3, threshold=3)
+
+        assert_that(states(hysteresis, True, False, False, True, False, False, False), equal_to([True] * 6 + [False]))
+
+    @pytest.mark.parametrize("window, threshold", [(3, 0), (2, 3)])
+    def test_invalid_threshold(self, window, threshold):
+        with pytest.raises(ValueError):
+            Hysteresis(window, threshold)
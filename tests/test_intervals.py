@@ -0,0 +1,187 @@
+from datetime import date
+from time import perf_counter
+
+import numpy as np
+import pytest
+from conftest import local_timestamp
+from hamcrest import assert_that, close_to, contains_exactly, equal_to, has_length, less_than
+
+from electricitybot.bot import UKRAINE_TZ
+from electricitybot.intervals import (
+    daily_stats,
+    DailyStats,
+    day_start,
+    DayParts,
+    hourly_outage_hours,
+    merge_daily_stats,
+    outage_daily_stats,
+    split_by_days,
+    wall_clock_hours,
+)
+
+HOUR = 3600
+
+
+def parts_by_day(parts: DayParts) -> dict[date, list[tuple[float, float]]]:
+    days = {}
+    for day_index, start, end in zip(parts.day_index, parts.start, parts.end):
+        days.setdefault(parts.days[day_index], []).append((float(start), float(end)))
+    return days
+
+
+class TestIntervals:
+
+    def test_day_start(self):
+        assert_that(day_start(date(2022, 4, 15), UKRAINE_TZ), equal_to(local_timestamp("2022-04-15 00:00:00")))
+
+    def test_split_by_days_within_day(self):
+        interval = (local_timestamp("2022-04-15 10:00:00"), local_timestamp("2022-04-15 11:00:00"))
+
+        assert_that(parts_by_day(split_by_days([interval], UKRAINE_TZ)), equal_to({date(2022, 4, 15): [interval]}))
+
+    def test_split_by_days_across_midnight(self):
+        start = local_timestamp("2022-04-14 23:00:00")
+        end = local_timestamp("2022-04-16 01:00:00")
+        days = parts_by_day(split_by_days([(start, end)], UKRAINE_TZ))
+
+        assert_that(
+            days,
+            equal_to(
+                {
+                    date(2022, 4, 14): [(start, start + HOUR)],
+                    date(2022, 4, 15): [(start + HOUR, start + 25 * HOUR)],
+                    date(2022, 4, 16): [(start + 25 * HOUR, end)],
+                }
+            ),
+        )
+
+    def test_split_by_days_ending_at_midnight(self):
+        start = local_timestamp("2022-04-14 23:00:00")
+        end = local_timestamp("2022-04-15 00:00:00")
+
+        assert_that(
+            parts_by_day(split_by_days([(start, end)], UKRAINE_TZ)), equal_to({date(2022, 4, 14): [(start, end)]})
+        )
+
+    def test_split_by_days_on_dst_change(self):
+        # clocks moved forward on 2022-03-27, so that day is 23 hours long
+        start = local_timestamp("2022-03-26 12:00:00")
+        end = local_timestamp("2022-03-28 12:00:00")
+        days = parts_by_day(split_by_days([(start, end)], UKRAINE_TZ))
+
+        assert_that(days[date(2022, 3, 27)], contains_exactly((start + 12 * HOUR, start + 35 * HOUR)))
+
+    def test_split_by_days_clips_to_range(self):
+        intervals = [
+            (local_timestamp("2022-04-13 10:00:00"), local_timestamp("2022-04-13 11:00:00")),
+            (local_timestamp("2022-04-13 23:00:00"), local_timestamp("2022-04-14 01:00:00")),
+            (local_timestamp("2022-04-15 23:00:00"), local_timestamp("2022-04-16 01:00:00")),
+            (local_timestamp("2022-04-14 00:00:00"), local_timestamp("2022-04-14 00:00:00")),
+        ]
+        parts = split_by_days(intervals, UKRAINE_TZ, date(2022, 4, 14), date(2022, 4, 15))
+
+        assert_that(parts.days, contains_exactly(date(2022, 4, 14), date(2022, 4, 15)))
+        assert_that(
+            parts_by_day(parts),
+            equal_to(
+                {
+                    date(2022, 4, 14): [
+                        (local_timestamp("2022-04-14 00:00:00"), local_timestamp("2022-04-14 01:00:00")),
+                        (local_timestamp("2022-04-14 00:00:00"), local_timestamp("2022-04-14 00:00:00")),
+                    ],
+                    date(2022, 4, 15): [
+                        (local_timestamp("2022-04-15 23:00:00"), local_timestamp("2022-04-16 00:00:00")),
+                    ],
+                }
+            ),
+        )
+
+    def test_availability(self):
+        intervals = [(local_timestamp("2022-03-27 10:00:00"), local_timestamp("2022-03-27 12:00:00"))]
+        parts = split_by_days(intervals, UKRAINE_TZ, date(2022, 3, 26), date(2022, 3, 27))
+
+        assert_that(parts.outage_seconds().tolist(), contains_exactly(0, 2 * HOUR))
+        assert_that(parts.availability().tolist(), contains_exactly(100, close_to(100 * 21 / 23, 1e-9)))
+
+    def test_wall_clock_hours(self):
+        intervals = [
+            (local_timestamp("2022-03-26 10:30:00"), local_timestamp("2022-03-26 11:00:00")),
+            (local_timestamp("2022-03-27 10:30:00"), local_timestamp("2022-03-27 11:00:00")),
+        ]
+        parts = split_by_days(intervals, UKRAINE_TZ)
+
+        assert_that(wall_clock_hours(parts, parts.start, UKRAINE_TZ).tolist(), contains_exactly(10.5, 10.5))
+
+    def test_hourly_outage_hours(self):
+        intervals = [
+            (local_timestamp("2022-04-14 10:15:00"), local_timestamp("2022-04-14 11:00:00")),
+            (local_timestamp("2022-04-14 10:00:00"), local_timestamp("2022-04-14 10:30:00")),
+            (local_timestamp("2022-04-14 23:30:00"), local_timestamp("2022-04-15 01:30:00")),
+        ]
+        parts = split_by_days(intervals, UKRAINE_TZ)
+
+        outage_hours = hourly_outage_hours(parts, UKRAINE_TZ)
+
+        assert_that(outage_hours.shape, equal_to((2, 24)))
+        # overlapping outages do not make an hour longer than an hour
+        assert_that(outage_hours[0, 9:12].tolist(), contains_exactly(0, 1, 0))
+        assert_that(outage_hours[0, 23], equal_to(0.5))
+        assert_that(outage_hours[1, :3].tolist(), contains_exactly(1, 0.5, 0))
+        assert_that(outage_hours.sum(), equal_to(3))
+
+    def test_hourly_outage_hours_on_dst_change(self):
+        # clocks moved forward at 03:00 on 2022-03-27, outage is placed by local start time like weekly chart bar
+        intervals = [(local_timestamp("2022-03-27 02:30:00"), local_timestamp("2022-03-27 04:30:00"))]
+        parts = split_by_days(intervals, UKRAINE_TZ)
+
+        assert_that(hourly_outage_hours(parts, UKRAINE_TZ)[0, :5].tolist(), contains_exactly(0, 0, 0.5, 0.5, 0))
+
+    def test_daily_stats(self):
+        intervals = [
+            (local_timestamp("2022-04-14 10:00:00"), local_timestamp("2022-04-14 11:00:00")),
+            (local_timestamp("2022-04-14 23:00:00"), local_timestamp("2022-04-15 02:00:00")),
+        ]
+
+        assert_that(
+            daily_stats(intervals, UKRAINE_TZ),
+            contains_exactly(
+                DailyStats(date(2022, 4, 14), 2 * HOUR, 2, HOUR),
+                DailyStats(date(2022, 4, 15), 2 * HOUR, 1, 2 * HOUR),
+            ),
+        )
+
+    def test_daily_stats_without_intervals(self):
+        assert_that(daily_stats([], UKRAINE_TZ), equal_to([]))
+
+    def test_daily_stats_of_many_intervals(self):
+        # a year of outages every 15 minutes
+        starts = local_timestamp("2022-01-01 00:00:00") + np.arange(35_000) * 900.0
+        intervals = np.column_stack([starts, starts + 600])
+
+        started_at = perf_counter()
+        stats = daily_stats(intervals, UKRAINE_TZ)
+
+        assert_that(perf_counter() - started_at, less_than(0.5))
+        assert_that(stats, has_length(365))
+        assert_that(stats[0], equal_to(DailyStats(date(2022, 1, 1), 96 * 600, 96, 600)))
+
+    @pytest.mark.parametrize(
+        "start, end",
+        [
+            ("2022-04-14 10:00:00", "2022-04-14 11:00:00"),
+            ("2022-04-14 10:00:00", "2022-04-14 10:00:00"),
+            ("2022-04-14 23:00:00", "2022-04-15 00:00:00"),
+            ("2022-04-14 00:00:00", "2022-04-17 02:00:00"),
+            ("2022-10-29 22:00:00", "2022-10-31 01:00:00"),
+        ],
+    )
+    def test_outage_daily_stats(self, start, end):
+        start, end = local_timestamp(start), local_timestamp(end)
+
+        assert_that(outage_daily_stats(start, end, UKRAINE_TZ), equal_to(daily_stats([(start, end)], UKRAINE_TZ)))
+
+    def test_merge_daily_stats(self):
+        assert_that(
+            merge_daily_stats(DailyStats(date(2022, 4, 14), HOUR, 1, HOUR), DailyStats(date(2022, 4, 14), 30, 2, 20)),
+            equal_to(DailyStats(date(2022, 4, 14), HOUR + 30, 3, HOUR)),
+        )
@@ -0,0 +1,132 @@
+import struct
+import subprocess
+import sys
+import zlib
+from datetime import date
+
+from hamcrest import assert_that, equal_to, not_
+
+from electricitybot.chart import build_chart, build_report
+from electricitybot.lite_chart import (
+    Canvas,
+    heatmap_color,
+    HEATMAP_STOPS,
+    load_fonts,
+    NO_DATA,
+    NORMAL_FONT,
+    render_chart,
+)
+from tests.test_chart import FIRST_DAY, LAST_DAY, week_intervals, year_intervals
+
+
+def png_size(png: bytes) -> tuple[int, int]:
+    return struct.unpack(">II", png[16:24])
+
+
+def png_pixels(png: bytes) -> bytes:
+    # only one IDAT chunk is written
+    idat_end = 41 + struct.unpack(">I", png[33:37])[0]
+    return zlib.decompress(png[41:idat_end])
+
+
+class TestLiteChart:
+
+    def test_build_chart(self):
+        chart = build_chart(
+            week_intervals(), FIRST_DAY, LAST_DAY, title="Статистика світла за тиждень", renderer="lite"
+        )
+
+        assert_that(chart[:8], equal_to(b"\x89PNG\r\n\x1a\n"))
+        assert_that(png_size(chart), equal_to((1400, 1000)))
+        assert_that(len(png_pixels(chart)), equal_to((1400 * 3 + 1) * 1000))
+
+    def test_render_is_deterministic(self):
+        first_chart = build_chart(week_intervals(), FIRST_DAY, LAST_DAY, renderer="lite")
+
+        assert_that(
+            build_chart(week_intervals(outage_hours=5), FIRST_DAY, LAST_DAY, renderer="lite"),
+            not_(equal_to(first_chart)),
+        )
+        assert_that(build_chart(week_intervals(), FIRST_DAY, LAST_DAY, renderer="lite"), equal_to(first_chart))
+
+    def test_empty_week(self):
+        chart = render_chart([], "Статистика світла за тиждень")
+
+        assert_that(png_size(chart), equal_to((1400, 1000)))
+
+    def test_text_uses_fallback_glyph(self):
+        font = load_fonts()[NORMAL_FONT]
+
+        assert_that(font.glyph("😀"), equal_to(font.glyph("?")))
+
+    def test_text_outside_canvas_is_skipped(self):
+        canvas = Canvas(10, 10, (255, 255, 255))
+
+        canvas.text(0, -30, "Світло")
+
+        assert_that(canvas.pixels, equal_to(bytearray(b"\xff" * 300)))
+
+    def test_fill_rect_is_clipped(self):
+        canvas = Canvas(2, 2, (255, 255, 255))
+
+        canvas.fill_rect(-5, -5, 1, 1, (0, 0, 0))
+        canvas.fill_rect(5, 0, 10, 2, (0, 0, 0))
+
+        assert_that(canvas.pixels, equal_to(bytearray(b"\x00" * 3 + b"\xff" * 9)))
+
+    def test_hline_blends_dashes(self):
+        canvas = Canvas(4, 1, (200, 100, 0))
+
+        canvas.hline(0, 4, 0, (0, 0, 100), alpha=0.5, dash=(1, 1))
+
+        assert_that(canvas.pixels, equal_to(bytearray([100, 50, 50, 200, 100, 0, 100, 50, 50, 200, 100, 0])))
+
+    def test_does_not_import_matplotlib(self):
+        code = (
+            "import sys\n"
+            "from electricitybot.chart import build_chart\n"
+            "from datetime import date\n"
+            "build_chart([(1649376000, 1649383200)], date(2022, 4, 8), date(2022, 4, 8), renderer='lite')\n"
+            "print('matplotlib' in sys.modules)\n"
+        )
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+
+        assert_that(result.stdout.strip(), equal_to("False"))
+
+
+class TestLiteReport:
+
+    def test_build_report(self):
+        report = build_report(week_intervals(), FIRST_DAY, LAST_DAY, renderer="lite")
+
+        assert_that(png_size(report), equal_to((1400, 1000)))
+        assert_that(len(png_pixels(report)), equal_to((1400 * 3 + 1) * 1000))
+
+    def test_render_is_deterministic(self):
+        first_report = build_report(week_intervals(), FIRST_DAY, LAST_DAY, renderer="lite")
+
+        assert_that(
+            build_report(week_intervals(outage_hours=5), FIRST_DAY, LAST_DAY, renderer="lite"),
+            not_(equal_to(first_report)),
+        )
+        assert_that(build_report(week_intervals(), FIRST_DAY, LAST_DAY, renderer="lite"), equal_to(first_report))
+
+    def test_report_does_not_depend_on_outage_order(self):
+        intervals = year_intervals(5000)
+        first_day, last_day = date(2022, 1, 1), date(2022, 12, 31)
+
+        assert_that(
+            build_report(intervals[::-1], first_day, last_day, renderer="lite"),
+            equal_to(build_report(intervals, first_day, last_day, renderer="lite")),
+        )
+
+    def test_empty_report(self):
+        report = build_report([], FIRST_DAY, FIRST_DAY, renderer="lite", hourly_since=LAST_DAY)
+
+        assert_that(png_size(report), equal_to((1400, 1000)))
+
+    def test_heatmap_color(self):
+        assert_that(
+            [heatmap_color(percent) for percent in (-5, 0, 50, 100, float("nan"))],
+            equal_to([HEATMAP_STOPS[0], HEATMAP_STOPS[0], HEATMAP_STOPS[1], HEATMAP_STOPS[2], NO_DATA]),
+        )
@@ -0,0 +1,178 @@
+import asyncio
+from datetime import date
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from conftest import free_port
+from hamcrest import assert_that, contains_exactly, contains_string, equal_to, starts_with
+from telegram.error import Forbidden
+
+from electricitybot.bot import ElectricityMonitor
+from electricitybot.chart import build_chart
+from electricitybot.metrics import (
+    CHART_RENDER,
+    Counter,
+    format_labels,
+    handle_scrape,
+    Histogram,
+    PROBE_RESULTS,
+    Registry,
+    serve_metrics,
+    TELEGRAM_ERRORS,
+    timed,
+)
+from electricitybot.outbox import Outbox
+from electricitybot.probe import system_ping
+from electricitybot.settings import override_settings
+from electricitybot.storage import OutageStore
+
+
+async def scrape(port: int, path: str) -> str:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response.decode()
+
+
+async def scrape_server(path: str) -> str:
+    server = await asyncio.start_server(handle_scrape, "127.0.0.1", 0)
+    async with server:
+        return await scrape(server.sockets[0].getsockname()[1], path)
+
+
+class TestExposition:
+
+    def test_counter(self):
+        registry = Registry()
+        counter = registry.counter("probes_total", "Probes made.", ("method", "result"))
+        counter.inc("tcp", "success")
+        counter.inc("tcp", "success", amount=2)
+        counter.inc("icmp", "failure")
+
+        assert_that(
+            registry.exposition(),
+            equal_to(
+                "# HELP probes_total Probes made.\n"
+                "# TYPE probes_total counter\n"
+                'probes_total{method="icmp",result="failure"} 1\n'
+                'probes_total{method="tcp",result="success"} 3\n'
+            ),
+        )
+
+    def test_histogram(self):
+        histogram = Histogram("render_seconds", "Render time.", buckets=(0.1, 1))
+        for value in (0.05, 0.5, 0.5, 3):
+            histogram.observe(value)
+
+        assert_that(
+            histogram.samples(),
+            contains_exactly(
+                'render_seconds_bucket{le="0.1"} 1',
+                'render_seconds_bucket{le="1.0"} 3',
+                'render_seconds_bucket{le="+Inf"} 4',
+                "render_seconds_sum 4.05",
+                "render_seconds_count 4",
+            ),
+        )
+
+    def test_label_escaping(self):
+        assert_that(format_labels(("chat",), ('@"a"\\b\n',)), equal_to('{chat="@\\"a\\"\\\\b\\n"}'))
+
+    def test_counter_without_labels(self):
+        counter = Counter("restarts_total", "Restarts.")
+        counter.inc()
+
+        assert_that(counter.samples(), contains_exactly("restarts_total 1"))
+
+    def test_timed(self):
+        histogram = Histogram("call_seconds", "Call time.", ("operation",))
+
+        @timed(histogram, "fail")
+        def fail():
+            raise ValueError
+
+        with pytest.raises(ValueError):
+            fail()
+
+        assert_that(histogram.samples()[-1], equal_to('call_seconds_count{operation="fail"} 1'))
+
+
+class TestEndpoint:
+
+    def test_metrics(self):
+        response = asyncio.run(scrape_server("/metrics?format=text"))
+
+        assert_that(response, starts_with("HTTP/1.1 200 OK\r\n"))
+        assert_that(response, contains_string("Content-Type: text/plain; version=0.0.4"))
+        assert_that(response, contains_string("# TYPE electricitybot_probes_total counter\n"))
+
+    @pytest.mark.parametrize("path", ["/", "/metrics/other"])
+    def test_not_found(self, path):
+        assert_that(asyncio.run(scrape_server(path)), starts_with("HTTP/1.1 404 Not Found\r\n"))
+
+    def test_serve_metrics(self):
+        port = free_port()
+
+        async def serve_and_scrape():
+            server = asyncio.create_task(serve_metrics("127.0.0.1", port))
+            await asyncio.sleep(0.05)
+            response = await scrape(port, "/metrics")
+            server.cancel()
+            return response
+
+        assert_that(asyncio.run(serve_and_scrape()), starts_with("HTTP/1.1 200 OK\r\n"))
+
+    def test_monitor_serves_metrics(self):
+        port = free_port()
+
+        async def serve_and_scrape(monitor):
+            serve = asyncio.create_task(monitor.serve())
+            await asyncio.sleep(0.05)
+            response = await scrape(port, "/metrics")
+            serve.cancel()
+            await asyncio.gather(serve, return_exceptions=True)
+            return response
+
+        with (
+            override_settings(metrics_port=port, send_weekly_stats=False, max_probe_interval=60),
+            patch("telegram.Bot", Mock(return_value=AsyncMock())),
+            patch("electricitybot.detector.TargetDetector.probe_once", AsyncMock(return_value=True)),
+            patch("electricitybot.ElectricityChecker.save_stat", Mock()),
+        ):
+            monitor = ElectricityMonitor()
+            response = monitor._loop.run_until_complete(serve_and_scrape(monitor))
+
+        assert_that(response, starts_with("HTTP/1.1 200 OK\r\n"))
+
+
+class TestInstrumentation:
+
+    def test_ping(self):
+        before = PROBE_RESULTS.values.get(("ping", "success"), 0)
+
+        with patch("subprocess.run", Mock(return_value=Mock(returncode=0, stdout=b""))):
+            system_ping("10.0.0.1")
+
+        assert_that(PROBE_RESULTS.values[("ping", "success")], equal_to(before + 1))
+
+    def test_chart(self):
+        before = sum(CHART_RENDER.values.get(("lite",), ([0], 0))[0])
+
+        build_chart([], date(2022, 4, 9), date(2022, 4, 15), renderer="lite")
+
+        assert_that(sum(CHART_RENDER.values[("lite",)][0]), equal_to(before + 1))
+
+    def test_telegram_error(self, tmp_path):
+        store = OutageStore(str(tmp_path / "outages.sqlite3"))
+        tg_bot = AsyncMock()
+        tg_bot.send_message.side_effect = Forbidden("Bot was blocked by the user")
+        before = TELEGRAM_ERRORS.values.get(("send_message", "Forbidden"), 0)
+        outbox = Outbox(tg_bot, store)
+        outbox.put("send_message", chat_id="@building", text="🔋Є світло")
+
+        asyncio.run(outbox.flush())
+        store.close()
+
+        assert_that(TELEGRAM_ERRORS.values[("send_message", "Forbidden")], equal_to(before + 1))
@@ -0,0 +1,333 @@
+import asyncio
+from datetime import timedelta
+from time import time
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from freezegun import freeze_time
+from hamcrest import assert_that, close_to, contains_exactly, equal_to, has_entries, has_item, has_properties, none
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+from electricitybot.outbox import Outbox, UPLOADS_TO_KEEP
+from electricitybot.storage import OutageStore
+
+TARGET = "10.0.0.1"
+
+
+@pytest.fixture
+def tg_bot():
+    tg_bot = AsyncMock()
+    tg_bot.send_message.return_value = Mock(message_id=42)
+    return tg_bot
+
+
+def flush(outbox: Outbox):
+    asyncio.run(outbox.flush())
+
+
+class TestOutbox:
+
+    def test_put_and_flush(self, store, tg_bot):
+        outbox = Outbox(tg_bot, store)
+        outbox.put("send_message", chat_id="@building", text="🔋Є світло")
+        outbox.put("send_photo", chat_id="@building", caption="📊Статистика", photo=b"\x89PNG")
+
+        flush(outbox)
+
+        tg_bot.send_message.assert_awaited_once_with(chat_id="@building", text="🔋Є світло")
+        tg_bot.send_photo.assert_awaited_once_with(chat_id="@building", caption="📊Статистика", photo=b"\x89PNG")
+        assert_that(store.outbox_size(), equal_to(0))
+
+    def test_queue_survives_restart(self, store, tg_bot):
+        Outbox(AsyncMock(), store).put("send_photo", chat_id="@building", photo=b"\x89PNG")
+        store.close()
+
+        reopened_store = OutageStore(store.path)
+        flush(Outbox(tg_bot, reopened_store))
+
+        tg_bot.send_photo.assert_awaited_once_with(chat_id="@building", photo=b"\x89PNG")
+        reopened_store.close()
+
+    @freeze_time("2022-04-15 09:34:01")
+    @pytest.mark.parametrize("ptb_timedelta", ["0", "1"])
+    def test_retry_after(self, store, tg_bot, ptb_timedelta, monkeypatch):
+        # retry_after is int by default and timedelta when opted in to future behaviour
+        monkeypatch.setenv("PTB_TIMEDELTA", ptb_timedelta)
+        tg_bot.send_message.side_effect = RetryAfter(timedelta(seconds=30))
+        outbox = Outbox(tg_bot, store)
+        outbox.put("send_message", chat_id="@building", text="🔋Є світло")
+
+        flush(outbox)
+        flush(outbox)
+
+        tg_bot.send_message.assert_awaited_once()
+        assert_that(store.outbox_head(), has_properties(attempts=1, not_before=time() + 30))
+
+    def test_network_error_backoff(self, store, tg_bot):
+        tg_bot.send_message.side_effect = TimedOut()
+        outbox = Outbox(tg_bot, store, retry_delay=1, max_retry_delay=5)
+        outbox.put("send_message", chat_id="@building", text="🔋Є світло")
+
+        delays = []
+        for _ in range(5):
+            asyncio.run(outbox.deliver(store.outbox_head()))
+            delays.append(store.outbox_head().not_before - time())
+
+        assert_that(delays, contains_exactly(*[close_to(delay, 0.1) for delay in (1, 2, 4, 5, 5)]))
+
+    def test_forbidden_call_is_dropped(self, store, tg_bot, caplog):
+        tg_bot.send_message.side_effect = Forbidden("Bot was blocked by the user")
+        outbox = Outbox(tg_bot, store)
+        outbox.put("send_message", chat_id="@building", text="🔋Є світло")
+
+        flush(outbox)
+
+        assert_that(store.outbox_head(), none())
+        assert_that(caplog.messages[-1], equal_to("Failed to deliver send_message to @building, dropping it"))
+
+    def test_bad_request_is_dropped(self, store, tg_bot, caplog):
+        tg_bot.send_message.side_effect = BadRequest("Chat not found")
+        outbox = Outbox(tg_bot, store)
+        outbox.put("send_message", chat_id="@building", text="🔋Є світло")
+
+        flush(outbox)
+
+        assert_that(store.outbox_head(), none())
+        assert_that(caplog.messages[-1], equal_to("Telegram rejected send_message to @building, dropping it"))
+
+    def test_pending_state_messages_are_coalesced(self, store, tg_bot):
+        outbox = Outbox(tg_bot, store)
+        outbox.put("send_message", TARGET, chat_id="@building", text="🪫Відключено електропостачання")
+        outbox.put("send_message", "10.0.0.2", chat_id="@other-building", text="🪫Відключено електропостачання")
+        outbox.put("send_message", TARGET, chat_id="@building", text="🔋Є світло")
+
+        flush(outbox)
+
+        assert_that(
+            tg_bot.send_message.await_args_list,
+            contains_exactly(
+                has_properties(kwargs={"chat_id": "@building", "text": "🔋Є світло"}),
+                has_properties(kwargs={"chat_id": "@other-building", "text": "🪫Відключено електропостачання"}),
+            ),
+        )
+
+    def test_recent_message_is_edited(self, store, tg_bot):
+        outbox = Outbox(tg_bot, store, coalesce_window=120)
+        outbox.put("send_message", TARGET, chat_id="@building", text="🪫Відключено електропостачання")
+        flush(outbox)
+
+        outbox.put("send_message", TARGET, chat_id="@building", text="🔋Є світло")
+        flush(outbox)
+
+        tg_bot.send_message.assert_awaited_once()
+        tg_bot.edit_message_text.assert_awaited_once_with(chat_id="@building", message_id=42, text="🔋Є світло")
+
+    def test_old_message_is_not_edited(self, store, tg_bot):
+        outbox = Outbox(tg_bot, store, coalesce_window=120)
+        with freeze_time("2022-04-15 09:00:00"):
+            outbox.put("send_message", TARGET, chat_id="@building", text="🪫Відключено електропостачання")
+            flush(outbox)
+
+        with freeze_time("2022-04-15 09:02:01"):
+            outbox.put("send_message", TARGET, chat_id="@building", text="🔋Є світло")
+            flush(outbox)
+
+        assert_that(tg_bot.send_message.await_count, equal_to(2))
+        tg_bot.edit_message_text.assert_not_awaited()
+
+    def test_message_that_can_not_be_edited_is_sent(self, store, tg_bot):
+        tg_bot.edit_message_text.side_effect = BadRequest("Message can't be edited")
+        outbox = Outbox(tg_bot, store)
+        outbox.put("send_message", TARGET, chat_id="@building", text="🪫Відключено електропостачання")
+        flush(outbox)
+
+        outbox.put("send_message", TARGET, chat_id="@building", text="🔋Є світло")
+        flush(outbox)
+
+        assert_that(tg_bot.send_message.await_count, equal_to(2))
+        assert_that(store.outbox_size(), equal_to(0))
+
+    def test_not_modified_message(self, store, tg_bot):
+        tg_bot.edit_message_text.side_effect = BadRequest("Message is not modified")
+        outbox = Outbox(tg_bot, store)
+        outbox.put("send_message", TARGET, chat_id="@building", text="🔋Є світло")
+        flush(outbox)
+
+        outbox.put("send_message", TARGET, chat_id="@building", text="🔋Є світло")
+        flush(outbox)
+
+        tg_bot.send_message.assert_awaited_once()
+        assert_that(store.outbox_size(), equal_to(0))
+
+    def test_message_updated_while_delivered_stays_queued(self, store, tg_bot):
+        outbox = Outbox(tg_bot, store)
+
+        async def send_message(**kwargs):
+            outbox.put("send_message", TARGET, chat_id="@building", text="🔋Є світло")
+            return Mock(message_id=42)
+
+        tg_bot.send_message.side_effect = send_message
+        outbox.put("send_message", TARGET, chat_id="@building", text="🪫Відключено електропостачання")
+
+        flush(outbox)
+
+        assert_that(store.outbox_head(), has_properties(kwargs={"chat_id": "@building", "text": "🔋Є світло"}))
+
+    def test_deliver_forever(self, store, tg_bot):
+        tg_bot.send_message.side_effect = [RetryAfter(timedelta(milliseconds=100)), Mock(message_id=42)]
+        outbox = Outbox(tg_bot, store)
+
+        async def deliver_for_a_while():
+            delivery = asyncio.create_task(outbox.deliver_forever())
+            await asyncio.sleep(0.05)
+            outbox.put("send_message", chat_id="@building", text="🔋Є світло")
+            await asyncio.sleep(0.3)
+            delivery.cancel()
+
+        asyncio.run(deliver_for_a_while())
+
+        assert_that(tg_bot.send_message.await_count, equal_to(2))
+        assert_that(store.outbox_size(), equal_to(0))
+
+    def test_network_error_is_retried(self, store, tg_bot):
+        tg_bot.send_message.side_effect = [NetworkError("Connection reset"), Mock(message_id=42)]
+        outbox = Outbox(tg_bot, store, retry_delay=0)
+        outbox.put("send_message", chat_id="@building", text="🔋Є світло")
+
+        flush(outbox)
+        flush(outbox)
+
+        assert_that(tg_bot.send_message.await_count, equal_to(2))
+        assert_that(store.outbox_size(), equal_to(0))
+
+
+def photo_message(file_id: str) -> Mock:
+    return Mock(photo=[Mock(file_id=f"{file_id}-thumbnail"), Mock(file_id=file_id)])
+
+
+def deliver_for_a_while(outbox: Outbox, seconds: float):
+    async def deliver():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(outbox.deliver_forever(), seconds)
+
+    asyncio.run(deliver())
+
+
+class TestFanOut:
+
+    def test_chats_are_delivered_concurrently_in_order(self, store, tg_bot):
+        delivered = []
+
+        async def send_message(chat_id, text):
+            await asyncio.sleep(0.1 if chat_id == "@slow" else 0)
+            delivered.append((chat_id, text))
+            return Mock(message_id=42)
+
+        tg_bot.send_message.side_effect = send_message
+        outbox = Outbox(tg_bot, store, max_concurrency=4)
+        for text in ("🪫Відключено електропостачання", "🔋Є світло"):
+            for chat_id in ("@slow", "@building", "@district"):
+                outbox.put("send_message", chat_id=chat_id, text=text)
+
+        deliver_for_a_while(outbox, 0.15)
+
+        assert_that(
+            delivered,
+            contains_exactly(
+                ("@building", "🪫Відключено електропостачання"),
+                ("@district", "🪫Відключено електропостачання"),
+                ("@building", "🔋Є світло"),
+                ("@district", "🔋Є світло"),
+                ("@slow", "🪫Відключено електропостачання"),
+            ),
+        )
+        assert_that(store.outbox_size(), equal_to(1))
+
+    def test_max_concurrency(self, store, tg_bot):
+        in_progress = []
+
+        async def send_message(chat_id, text):
+            in_progress.append(chat_id)
+            await asyncio.sleep(0.05)
+            return Mock(message_id=42)
+
+        tg_bot.send_message.side_effect = send_message
+        outbox = Outbox(tg_bot, store, max_concurrency=2)
+        for index in range(4):
+            outbox.put("send_message", chat_id=f"@building-{index}", text="🔋Є світло")
+
+        deliver_for_a_while(outbox, 0.03)
+
+        assert_that(in_progress, contains_exactly("@building-0", "@building-1"))
+
+    def test_photo_is_uploaded_once(self, store, tg_bot):
+        async def send_photo(**kwargs):
+            await asyncio.sleep(0.01)
+            return photo_message("chart-file-id")
+
+        tg_bot.send_photo.side_effect = send_photo
+        outbox = Outbox(tg_bot, store, max_concurrency=8)
+        for chat_id in ("@building", "@district", "@ops"):
+            outbox.put("send_photo", chat_id=chat_id, caption="📊Статистика", photo=b"\x89PNG")
+
+        deliver_for_a_while(outbox, 0.1)
+
+        assert_that(
+            tg_bot.send_photo.await_args_list,
+            contains_exactly(
+                has_properties(kwargs={"chat_id": "@building", "caption": "📊Статистика", "photo": b"\x89PNG"}),
+                has_properties(kwargs={"chat_id": "@district", "caption": "📊Статистика", "photo": "chart-file-id"}),
+                has_properties(kwargs={"chat_id": "@ops", "caption": "📊Статистика", "photo": "chart-file-id"}),
+            ),
+        )
+        assert_that(store.outbox_size(), equal_to(0))
+
+    def test_photo_is_uploaded_again_when_first_upload_failed(self, store, tg_bot):
+        async def send_photo(chat_id, photo):
+            await asyncio.sleep(0.01)
+            if chat_id == "@building":
+                raise TimedOut()
+            return photo_message("chart-file-id")
+
+        tg_bot.send_photo.side_effect = send_photo
+        outbox = Outbox(tg_bot, store, max_concurrency=8, retry_delay=10)
+        for chat_id in ("@building", "@district", "@ops"):
+            outbox.put("send_photo", chat_id=chat_id, photo=b"\x89PNG")
+
+        deliver_for_a_while(outbox, 0.1)
+
+        assert_that(
+            [call.kwargs["photo"] for call in tg_bot.send_photo.await_args_list],
+            contains_exactly(b"\x89PNG", b"\x89PNG", "chart-file-id"),
+        )
+        assert_that(store.outbox_head(), has_properties(attempts=1, kwargs=has_entries(chat_id="@building")))
+
+    def test_only_recent_uploads_are_kept(self, store, tg_bot):
+        tg_bot.send_photo.side_effect = lambda chat_id, photo: photo_message(f"file-id-{photo!r}")
+        outbox = Outbox(tg_bot, store)
+        for index in range(UPLOADS_TO_KEEP + 1):
+            outbox.put("send_photo", chat_id="@building", photo=str(index).encode())
+        outbox.put("send_photo", chat_id="@district", photo=b"0")
+        outbox.put("send_photo", chat_id="@district", photo=str(UPLOADS_TO_KEEP).encode())
+
+        flush(outbox)
+
+        assert_that(
+            [call.kwargs["photo"] for call in tg_bot.send_photo.await_args_list[-2:]],
+            contains_exactly(b"0", f"file-id-{str(UPLOADS_TO_KEEP).encode()!r}"),
+        )
+
+    def test_unexpected_error_does_not_stop_delivery(self, store, tg_bot, caplog):
+        tg_bot.send_message.side_effect = [ValueError, Mock(message_id=42)]
+        outbox = Outbox(tg_bot, store, max_concurrency=1)
+        outbox.put("send_message", chat_id="@building", text="🔋Є світло")
+        outbox.put("send_message", chat_id="@district", text="🔋Є світло")
+
+        deliver_for_a_while(outbox, 0.1)
+
+        assert_that(store.outbox_head(), none())
+        assert_that(
+            [call.kwargs["chat_id"] for call in tg_bot.send_message.await_args_list],
+            contains_exactly("@building", "@district"),
+        )
+        assert_that(caplog.messages, has_item("Failed to deliver send_message to @building, dropping it"))
@@ -1,4 +1,6 @@
+import pickle
 from datetime import datetime, timedelta
+from unittest.mock import patch
 
 from freezegun import freeze_time
 from hamcrest import assert_that, equal_to, has_properties
@@ -30,3 +32,26 @@ class TestPowerOutageInterval:
         assert_that(
             repr(interval), equal_to(f"{PowerOutageInterval.__name__} (start_time={start_time}, end_time={end_time})")
         )
+
+    def test_pickle(self):
+        interval = PowerOutageInterval(datetime(2022, 4, 15, 10), datetime(2022, 4, 15, 12))
+
+        assert_that(
+            pickle.loads(pickle.dumps(interval)),
+            has_properties(start_time=interval.start_time, end_time=interval.end_time),
+        )
+
+    def test_unpickle_previous_version(self):
+        class PreviousPowerOutageInterval:
+            # pickled with __dict__ before __slots__ were added
+            __module__ = "electricitybot.bot"
+            __qualname__ = "PowerOutageInterval"
+
+            def __init__(self, start_time, end_time=None):
+                self._start_time = start_time
+                self._end_time = end_time
+
+        with patch("electricitybot.bot.PowerOutageInterval", PreviousPowerOutageInterval):
+            pickled = pickle.dumps([PreviousPowerOutageInterval(datetime(2022, 4, 15, 10))])
+
+        assert_that(pickle.loads(pickled)[0], has_properties(start_time=datetime(2022, 4, 15, 10), end_time=None))
@@ -0,0 +1,154 @@
+import asyncio
+import struct
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from conftest import free_port
+from hamcrest import assert_that, close_to, equal_to, greater_than, has_properties, instance_of, none
+
+from electricitybot import ElectricityChecker
+from electricitybot.probe import (
+    build_echo_request,
+    checksum,
+    icmp_echo,
+    ICMP_ECHO_REPLY,
+    ICMP_ECHO_REQUEST,
+    open_icmp_socket,
+    parse_echo_reply,
+    Prober,
+    ProbeResult,
+    resolve,
+    system_ping,
+    tcp_connect,
+)
+from electricitybot.settings import override_settings, Target
+
+
+def icmp_allowed() -> bool:
+    try:
+        open_icmp_socket().close()
+    except PermissionError:
+        return False
+    return True
+
+
+async def with_local_server(coroutine_factory):
+    server = await asyncio.start_server(lambda reader, writer: writer.close(), "127.0.0.1", 0)
+    async with server:
+        port = server.sockets[0].getsockname()[1]
+        return await coroutine_factory(port)
+
+
+def is_rtt():
+    return close_to(0.5, 0.5)
+
+
+class TestIcmpPacket:
+
+    def test_checksum_of_valid_packet_is_zero(self):
+        assert_that(checksum(build_echo_request(0x1234, 7)), equal_to(0))
+
+    def test_checksum_odd_length(self):
+        assert_that(checksum(b"\x01"), equal_to(0xFEFF))
+
+    def test_build_echo_request(self):
+        packet = build_echo_request(0x1234, 7, b"payload")
+
+        icmp_type, _, _, identifier, sequence = struct.unpack("!BBHHH", packet[:8])
+
+        assert_that((icmp_type, identifier, sequence), equal_to((ICMP_ECHO_REQUEST, 0x1234, 7)))
+        assert_that(packet[8:], equal_to(b"payload"))
+
+    @pytest.mark.parametrize("has_ip_header", [True, False])
+    def test_parse_echo_reply(self, has_ip_header):
+        reply = struct.pack("!BBHHH", ICMP_ECHO_REPLY, 0, 0, 0x1234, 7)
+        if has_ip_header:
+            reply = b"\x45" + b"\x00" * 19 + reply
+
+        assert_that(parse_echo_reply(reply, has_ip_header), equal_to((0x1234, 7)))
+
+    @pytest.mark.parametrize("data", [build_echo_request(1, 1), b"\x00\x00"])
+    def test_parse_echo_reply_ignores_other_packets(self, data):
+        assert_that(parse_echo_reply(data, has_ip_header=False), none())
+
+
+class TestProbeFunctions:
+
+    @pytest.mark.parametrize("host", ["127.0.0.1", "localhost"])
+    def test_resolve(self, host):
+        assert_that(asyncio.run(resolve(host)), equal_to("127.0.0.1"))
+
+    def test_tcp_connect_to_listening_port(self):
+        rtt = asyncio.run(with_local_server(lambda port: tcp_connect("127.0.0.1", port, 1)))
+
+        assert_that(rtt, is_rtt())
+
+    def test_tcp_connect_refused_means_host_is_up(self):
+        rtt = asyncio.run(tcp_connect("127.0.0.1", free_port(), 1))
+
+        assert_that(rtt, is_rtt())
+
+    @pytest.mark.parametrize(
+        "returncode, stdout, expected",
+        [
+            (0, b"64 bytes from 10.0.0.1: icmp_seq=1 ttl=64 time=12.5 ms\n", ProbeResult(True, 0.0125)),
+            (0, b"64 bytes from 10.0.0.1: icmp_seq=1 ttl=64 time<1 ms\n", ProbeResult(True, 0.001)),
+            (0, b"", ProbeResult(True)),
+            (1, b"", ProbeResult(False)),
+        ],
+    )
+    def test_system_ping(self, returncode, stdout, expected):
+        with patch("subprocess.run", Mock(return_value=Mock(returncode=returncode, stdout=stdout))) as run_mock:
+            assert_that(system_ping("10.0.0.1"), equal_to(expected))
+
+        run_mock.assert_called_once_with(["ping", "-c", "1", "10.0.0.1"], capture_output=True)
+
+    @pytest.mark.parametrize("error", [OSError, asyncio.TimeoutError])
+    def test_tcp_connect_unreachable(self, error):
+        with patch("electricitybot.probe.asyncio.open_connection", Mock(side_effect=error)):
+            assert_that(asyncio.run(tcp_connect("127.0.0.1", 80, 0.2)), none())
+
+    @pytest.mark.skipif(not icmp_allowed(), reason="ICMP sockets are not allowed")
+    def test_icmp_echo_localhost(self):
+        assert_that(asyncio.run(icmp_echo("127.0.0.1", 1, 1)), is_rtt())
+
+    @pytest.mark.skipif(not icmp_allowed(), reason="ICMP sockets are not allowed")
+    @patch("electricitybot.probe.parse_echo_reply", Mock(return_value=None))
+    def test_icmp_echo_without_reply(self):
+        assert_that(asyncio.run(icmp_echo("127.0.0.1", 0.2, 1)), none())
+
+
+class TestProber:
+
+    def test_unknown_method(self):
+        with pytest.raises(ValueError):
+            Prober("carrier-pigeon")
+
+    def test_probe_tcp(self):
+        result = asyncio.run(with_local_server(lambda port: Prober("tcp", 1, port).probe("127.0.0.1")))
+
+        assert_that(result, has_properties(success=True, rtt=greater_than(0)))
+
+    @patch("electricitybot.probe.icmp_echo", AsyncMock(return_value=0.01))
+    def test_probe_icmp(self):
+        assert_that(asyncio.run(Prober("icmp").probe("127.0.0.1")), equal_to(ProbeResult(True, 0.01)))
+
+    @patch("electricitybot.probe.icmp_echo", AsyncMock(side_effect=PermissionError))
+    @patch("electricitybot.probe.tcp_connect", AsyncMock(return_value=None))
+    def test_probe_icmp_falls_back_to_tcp(self):
+        prober = Prober("icmp")
+
+        assert_that(asyncio.run(prober.probe("127.0.0.1")), equal_to(ProbeResult(False, None)))
+        assert_that(prober.method, equal_to("tcp"))
+
+
+class TestElectricityCheckerProbe:
+
+    def test_probe_once_with_prober(self):
+        with override_settings(probe_method="tcp", tcp_probe_port=free_port()), patch("telegram.Bot", Mock()):
+            e_checker = ElectricityChecker(Target(ip_to_check="127.0.0.1", chat_id="@building"))
+            result = asyncio.run(e_checker.detector.probe_once())
+
+        assert_that(e_checker.detector.prober, instance_of(Prober))
+        assert_that(result, equal_to(True))
+        assert_that(e_checker.detector.last_probe_result, has_properties(success=True))
@@ -0,0 +1,157 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from hamcrest import assert_that, close_to, contains_exactly, equal_to, has_properties
+
+from electricitybot.probe_log import HEADER_SIZE, ProbeLog, ProbeSummary, RECORD_DTYPE
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "probes.ring")
+
+
+def fill(probe_log: ProbeLog, count: int, start: float = 0):
+    for index in range(count):
+        probe_log.append(start + index, index % 4 != 3, 0.001 * (index % 10) if index % 4 != 3 else None)
+
+
+class TestProbeLog:
+
+    def test_file_size_is_fixed(self, path):
+        probe_log = ProbeLog(path, capacity=16)
+        fill(probe_log, 100)
+
+        assert_that(os.path.getsize(path), equal_to(HEADER_SIZE + 16 * RECORD_DTYPE.itemsize))
+        assert_that(len(probe_log), equal_to(16))
+        probe_log.close()
+
+    def test_records_before_buffer_is_full(self, path):
+        probe_log = ProbeLog(path, capacity=16)
+        assert_that(probe_log.records(), has_properties(size=0))
+
+        fill(probe_log, 5)
+
+        assert_that(probe_log.records()["time"].tolist(), equal_to([0, 1, 2, 3, 4]))
+        assert_that(probe_log.records()["success"].tolist(), equal_to([1, 1, 1, 0, 1]))
+        assert_that(probe_log.records(1, 3)["time"].tolist(), equal_to([1, 2]))
+        probe_log.close()
+
+    def test_newest_records_are_kept(self, path):
+        probe_log = ProbeLog(path, capacity=16)
+
+        fill(probe_log, 40)
+
+        # oldest slot may be being overwritten by the writer, so it is not read
+        assert_that(probe_log.records()["time"].tolist(), equal_to(list(range(25, 40))))
+        probe_log.close()
+
+    def test_survives_reopen(self, path):
+        probe_log = ProbeLog(path, capacity=16)
+        fill(probe_log, 20)
+        probe_log.close()
+
+        reopened_log = ProbeLog(path, capacity=1024)
+        reopened_log.append(20, True, 0.002)
+
+        assert_that(reopened_log.capacity, equal_to(16))
+        assert_that(reopened_log.records()["time"].tolist(), equal_to(list(range(6, 21))))
+        reopened_log.close()
+
+    def test_records_overwritten_while_read_are_dropped(self, path):
+        writer = ProbeLog(path, capacity=16)
+        fill(writer, 20)
+        reader = ProbeLog(path, readonly=True)
+        slots = reader._records
+
+        class WrittenWhileRead:
+            def __getitem__(self, index):
+                copied = slots[index]
+                fill(writer, 3, start=20)
+                return copied
+
+        reader._records = WrittenWhileRead()
+
+        assert_that(reader.records()["time"].tolist(), equal_to(list(range(8, 20))))
+        reader.close()
+        writer.close()
+
+    def test_read_from_another_process(self, path):
+        probe_log = ProbeLog(path, capacity=16)
+        fill(probe_log, 10)
+
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys; from electricitybot.probe_log import ProbeLog; "
+                "print(ProbeLog(sys.argv[1], readonly=True).records()['time'].tolist())",
+                path,
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        assert_that(output.stdout.strip(), equal_to(str([float(at) for at in range(10)])))
+        probe_log.close()
+
+    def test_not_a_probe_log(self, path):
+        with open(path, "wb") as probe_log_file:
+            probe_log_file.write(b"\x00" * 64)
+
+        with pytest.raises(ValueError):
+            ProbeLog(path)
+
+    def test_created_by_another_process_meanwhile(self, path):
+        probe_log = ProbeLog(path, capacity=16)
+        fill(probe_log, 3)
+
+        ProbeLog._create(path, 1024)
+
+        assert_that(ProbeLog(path).records()["time"].tolist(), equal_to([0, 1, 2]))
+        assert_that(os.listdir(os.path.dirname(path)), contains_exactly("probes.ring"))
+        probe_log.close()
+
+
+class TestSummary:
+
+    def test_summary(self, path):
+        probe_log = ProbeLog(path, capacity=1024)
+        fill(probe_log, 40, start=1000)
+
+        summary = probe_log.summary(1000, 1040)
+
+        replies = [0.001 * (index % 10) for index in range(40) if index % 4 != 3]
+        assert_that(summary, has_properties(start=1000, probes=40, loss=0.25))
+        assert_that(summary.rtt_p50, close_to(np.percentile(replies, 50), 1e-6))
+        assert_that(summary.rtt_p95, close_to(np.percentile(replies, 95), 1e-6))
+        probe_log.close()
+
+    def test_summary_without_replies(self, path):
+        probe_log = ProbeLog(path, capacity=16)
+        probe_log.append(100, False)
+
+        assert_that(probe_log.summary(0, 200), equal_to(ProbeSummary(0, 1, 1.0, None, None)))
+        assert_that(probe_log.summary(200, 300), equal_to(ProbeSummary(200, 0, 0.0, None, None)))
+        probe_log.close()
+
+    def test_hourly(self, path):
+        probe_log = ProbeLog(path, capacity=1024)
+        for at in np.arange(3600, 3 * 3600, 600).tolist():
+            probe_log.append(at, at < 7200, 0.01)
+
+        hourly = probe_log.hourly(3600, 3 * 3600)
+
+        assert_that(
+            hourly,
+            contains_exactly(
+                has_properties(start=3600, probes=6, loss=0, rtt_p50=close_to(0.01, 1e-6)),
+                ProbeSummary(7200, 6, 1.0, None, None),
+            ),
+        )
+        assert_that(probe_log.hourly(0, 3600), equal_to([]))
+        probe_log.close()
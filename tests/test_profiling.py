@@ -0,0 +1,129 @@
+import asyncio
+import os
+import signal
+import tracemalloc
+from unittest.mock import patch
+
+import pytest
+from hamcrest import assert_that, contains_exactly, contains_string, equal_to, has_length, not_, starts_with
+
+from electricitybot import profiling
+from electricitybot.profiling import install_signal_handler, profiled, profiler, REPORT_SUFFIX
+from electricitybot.settings import override_settings
+
+kept = []
+
+
+@profiled
+def allocating_tick(count: int) -> int:
+    kept.append([object() for _ in range(count)])
+    return count
+
+
+@profiled
+async def async_tick() -> str:
+    await asyncio.sleep(0)
+    return "done"
+
+
+def reports(directory) -> list[str]:
+    return sorted(name for name in os.listdir(directory) if name.endswith(REPORT_SUFFIX))
+
+
+@pytest.fixture(autouse=True)
+def fresh_profiler(tmp_path):
+    profiler.calls.clear()
+    with override_settings(profiling=True, profile_dir=str(tmp_path / "profiles"), profile_every=1, profile_keep=50):
+        yield
+    profiler.toggled = False
+    kept.clear()
+
+
+class TestTickProfiler:
+
+    def test_report(self, tmp_path):
+        assert_that(allocating_tick(10_000), equal_to(10_000))
+
+        (name,) = reports(tmp_path / "profiles")
+        report = (tmp_path / "profiles" / name).read_text()
+        assert_that(name, contains_string("-allocating_tick"))
+        assert_that(report, starts_with("tick: allocating_tick\n"))
+        assert_that(report, contains_string("wall: "))
+        # the list kept by the tick is the largest allocation
+        assert_that(report, contains_string(f"top allocation sites:\n  {__file__}:"))
+        assert_that(report, contains_string("(<listcomp>)"))
+        allocation_sites = report.split("top allocation sites:")[1].split("\n\n")[0]
+        assert_that(allocation_sites, not_(contains_string(profiling.__file__)))
+        assert_that(tracemalloc.is_tracing(), equal_to(False))
+
+    def test_async_tick(self, tmp_path):
+        assert_that(asyncio.run(async_tick()), equal_to("done"))
+
+        assert_that(reports(tmp_path / "profiles"), contains_exactly(contains_string("-async_tick")))
+
+    def test_ticks_are_sampled(self, tmp_path):
+        with override_settings(profile_every=3):
+            for _ in range(7):
+                allocating_tick(1)
+
+        assert_that(reports(tmp_path / "profiles"), has_length(2))
+
+    def test_nothing_is_profiled_by_default(self, tmp_path):
+        with override_settings(profiling=False):
+            allocating_tick(1)
+
+        assert_that(os.path.exists(tmp_path / "profiles"), equal_to(False))
+
+    def test_old_reports_are_removed(self, tmp_path):
+        with override_settings(profile_keep=3):
+            for _ in range(5):
+                allocating_tick(1)
+
+        assert_that(reports(tmp_path / "profiles"), has_length(3))
+
+    def test_one_tick_is_profiled_at_a_time(self, tmp_path):
+        async def both():
+            await asyncio.gather(async_tick(), async_tick())
+
+        asyncio.run(both())
+
+        assert_that(reports(tmp_path / "profiles"), has_length(1))
+
+    def test_tracing_started_by_others_is_kept(self):
+        tracemalloc.start()
+        try:
+            allocating_tick(1)
+            assert_that(tracemalloc.is_tracing(), equal_to(True))
+        finally:
+            tracemalloc.stop()
+
+    def test_tick_goes_on_when_report_is_not_written(self, tmp_path):
+        (tmp_path / "profiles").write_text("not a directory")
+
+        assert_that(allocating_tick(1), equal_to(1))
+        assert_that(profiler.busy, equal_to(False))
+
+    def test_signal_toggles_profiling(self, tmp_path):
+        previous_handler = signal.getsignal(signal.SIGUSR2)
+        install_signal_handler()
+        try:
+            with override_settings(profiling=False):
+                os.kill(os.getpid(), signal.SIGUSR2)
+                allocating_tick(1)
+                os.kill(os.getpid(), signal.SIGUSR2)
+                allocating_tick(1)
+        finally:
+            signal.signal(signal.SIGUSR2, previous_handler)
+
+        assert_that(reports(tmp_path / "profiles"), has_length(1))
+
+    def test_bot_ticks_are_profiled(self, tmp_path):
+        from electricitybot.bot import ElectricityChecker
+
+        with patch("telegram.Bot"), override_settings(send_weekly_stats=False):
+            asyncio.run(ElectricityChecker().stats_tick())
+
+        assert_that(
+            reports(tmp_path / "profiles"),
+            contains_exactly(contains_string("-ElectricityChecker.stats_tick")),
+        )
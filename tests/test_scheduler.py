@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+from hamcrest import assert_that, close_to, contains_exactly, equal_to, has_length
+
+from electricitybot.scheduler import AdaptiveInterval, run_every
+
+
+class Done(BaseException):
+    pass
+
+
+def run_job(durations: list[float], interval) -> list[float]:
+    """
+    Runs job that takes `durations` seconds one by one under `run_every` and returns start times
+    relative to the first run.
+    """
+    starts = []
+
+    async def job():
+        if len(starts) == len(durations):
+            raise Done
+        starts.append(asyncio.get_running_loop().time())
+        await asyncio.sleep(durations[len(starts) - 1])
+
+    with pytest.raises(Done):
+        asyncio.run(run_every(interval, job))
+
+    return [start - starts[0] for start in starts]
+
+
+class TestRunEvery:
+
+    def test_runs_at_fixed_rate(self):
+        starts = run_job([0.03, 0.01, 0.04, 0.0], interval=0.05)
+
+        assert_that(starts, contains_exactly(*[close_to(0.05 * i, 0.02) for i in range(4)]))
+
+    def test_skips_missed_runs(self):
+        starts = run_job([0.01, 0.12, 0.01, 0.0], interval=0.05)
+
+        # second run took more than two intervals, so third run starts at the next slot after it
+        assert_that(
+            starts, contains_exactly(close_to(0, 0.02), close_to(0.05, 0.02), close_to(0.2, 0.02), close_to(0.25, 0.02))
+        )
+
+    def test_interval_is_asked_after_every_run(self):
+        intervals = iter([0.02, 0.08, 0.04, 0.04])
+
+        starts = run_job([0.0] * 4, interval=lambda: next(intervals))
+
+        assert_that(starts, contains_exactly(*[close_to(start, 0.015) for start in (0, 0.02, 0.1, 0.14)]))
+
+    def test_failed_run_does_not_stop_next_ones(self, caplog):
+        runs = []
+
+        async def job():
+            runs.append(len(runs))
+            if len(runs) == 3:
+                raise Done
+            raise ValueError
+
+        with pytest.raises(Done):
+            asyncio.run(run_every(0.01, job))
+
+        assert_that(runs, has_length(3))
+        assert_that(caplog.messages.count("job failed"), equal_to(2))
+
+
+class TestAdaptiveInterval:
+
+    def test_grows_while_calm(self):
+        interval = AdaptiveInterval(fast=5, initial=60, slow=200, growth=1.5)
+
+        values = []
+        for calm in (True, True, True, False, True):
+            interval.update(calm)
+            values.append(interval())
+
+        assert_that(values, contains_exactly(90, 135, 200, 5, 7.5))
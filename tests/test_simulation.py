@@ -0,0 +1,142 @@
+import asyncio
+import os
+import subprocess
+import sys
+from datetime import date
+
+import pytest
+from conftest import local_timestamp
+from hamcrest import assert_that, close_to, contains_exactly, empty, equal_to, has_length, is_not, less_than_or_equal_to
+
+from electricitybot.intervals import DailyStats
+from electricitybot.settings import override_settings
+from electricitybot.simulation import main, Simulation, Timeline, VirtualClock, VirtualTimeLoop
+
+
+@pytest.fixture(autouse=True)
+def schedule():
+    with override_settings(
+        stats_day_of_week=1, stats_hour=12, hysteresis_window=3, hysteresis_threshold=2, send_weekly_stats=True
+    ):
+        yield
+
+
+class TestTimeline:
+
+    def test_state_and_outages(self):
+        timeline = Timeline([(100, True), (200, False), (230, True), (400, False)], initial=False)
+
+        assert_that(
+            [timeline.state_at(at) for at in (50, 100, 200, 300, 500)], equal_to([False, True, False, True, False])
+        )
+        assert_that(timeline.outages(), contains_exactly((float("-inf"), 100), (200, 230), (400, None)))
+        assert_that(timeline.outages(min_length=60), contains_exactly((float("-inf"), 100), (400, None)))
+
+    def test_noise(self):
+        timeline = Timeline([], noise=0.5, seed=1)
+
+        assert_that(sum(timeline.probe(at) for at in range(1000)), close_to(500, 50))
+
+    def test_generate(self):
+        timeline = Timeline.generate(0, 30 * 86400, seed=3)
+
+        assert_that(timeline.outages(), has_length(len(timeline.times) // 2))
+        assert_that(timeline.times, equal_to(sorted(timeline.times)))
+
+
+class TestSimulation:
+
+    def test_outages_across_midnight_dst_and_week(self):
+        # 2025-10-26 is Sunday with DST change, 25 hours long in Kyiv; stats are sent on Mondays at noon
+        outages = [
+            ("2025-10-22 23:30:00", "2025-10-23 01:00:00"),
+            ("2025-10-24 10:00:00", "2025-10-24 10:00:40"),
+            ("2025-10-25 22:00:00", "2025-10-27 02:00:00"),
+            ("2025-11-02 23:00:00", "2025-11-03 12:30:00"),
+            ("2025-11-04 23:00:00", "2025-11-05 01:00:00"),
+        ]
+        timeline = Timeline.from_outages([(local_timestamp(start), local_timestamp(end)) for start, end in outages])
+        simulation = Simulation(
+            timeline, local_timestamp("2025-10-20 00:00:00"), local_timestamp("2025-11-05 00:00:00")
+        )
+
+        report = simulation.run()
+
+        # a probe a minute while power holds, few more at fast interval around every change
+        assert_that(report.probes, close_to(16 * 24 * 60, 200))
+        assert_that(report.missed, empty())
+        assert_that(report.false_alarms, empty())
+        # 40 seconds flap is caught by fast probes after the first failed one
+        assert_that(report.detected, has_length(5))
+        assert_that(report.detected[-1][1], equal_to(None))
+        assert_that(report.max_delay, less_than_or_equal_to(2 * 60))
+        assert_that(report.stats_error, close_to(0, 1e-6))
+        assert_that(report.charts, equal_to(2))
+        assert_that(report.messages, equal_to(9))
+
+        stats = simulation.store.daily_stats(simulation.checker.key, date(2025, 10, 26), date(2025, 10, 27))
+        assert_that(stats, contains_exactly(DailyStats(date(2025, 10, 26), 25 * 3600, 1, 25 * 3600)))
+
+    def test_random_month(self):
+        since = local_timestamp("2025-03-01 00:00:00")
+        timeline = Timeline.generate(since, since + 30 * 86400, seed=7)
+
+        report = Simulation(timeline, since, since + 30 * 86400).run()
+
+        assert_that(report.missed, empty())
+        assert_that(report.false_alarms, empty())
+        assert_that(report.stats_error, close_to(0, 1e-6))
+        assert_that(report.charts, equal_to(4))
+        assert_that(report.probes_per_second, equal_to(report.probes / report.wall_seconds))
+
+    def test_false_alarms(self):
+        since = local_timestamp("2025-03-01 00:00:00")
+        timeline = Timeline([], noise=0.2, seed=1)
+
+        report = Simulation(timeline, since, since + 86400).run()
+
+        assert_that(report.expected, empty())
+        assert_that(report.false_alarms, equal_to(report.detected))
+        assert_that(report.false_alarms, is_not(empty()))
+
+    def test_virtual_time_loop(self):
+        clock = VirtualClock(local_timestamp("2025-10-26 03:30:00"))
+        loop = VirtualTimeLoop(clock)
+
+        async def wait():
+            await asyncio.sleep(3600)
+            # executor jobs run right away, virtual time does not move meanwhile
+            return await asyncio.to_thread(clock.time)
+
+        try:
+            assert_that(loop.run_until_complete(wait()), equal_to(local_timestamp("2025-10-26 04:30:00")))
+            with pytest.raises(ZeroDivisionError):
+                loop.run_until_complete(asyncio.to_thread(divmod, 1, 0))
+        finally:
+            loop.close()
+
+    @pytest.mark.parametrize(
+        "argv, status",
+        [
+            ([], 0),
+            (["--noise", "0.2"], 1),
+            (["--noise", "0.2", "--max-false-alarms", "1000"], 0),
+        ],
+    )
+    def test_main(self, capsys, argv, status):
+        assert_that(main(["--since", "2025-10-25", "--days", "3", "--seed", "2", *argv]), equal_to(status))
+
+        assert_that(capsys.readouterr().out.splitlines(), has_length(3))
+
+    def test_bot_settings_are_not_needed(self, tmp_path):
+        env = {name: value for name, value in os.environ.items() if name not in ("API_TOKEN", "CHAT_ID", "IP_TO_CHECK")}
+
+        result = subprocess.run(
+            [sys.executable, "-m", "electricitybot.simulation", "--days", "1"],
+            env=env,
+            cwd=tmp_path,
+            capture_output=True,
+            text=True,
+        )
+
+        assert_that(result.returncode, equal_to(0))
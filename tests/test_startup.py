@@ -0,0 +1,64 @@
+import json
+import subprocess
+import sys
+
+from hamcrest import assert_that, empty, less_than
+
+# measured about 0.4 s and 38 MiB, chart and Telegram modules loaded at start took 0.7 s and 53 MiB
+IMPORT_TIME_BUDGET = 0.6
+RSS_BUDGET = 45 * 1024 * 1024
+RUNS = 3
+# loaded on first chart or first message, not when the bot starts
+LAZY_MODULES = ("matplotlib", "telegram", "httpx", "electricitybot.chart", "electricitybot.lite_chart")
+
+STARTUP = """
+import json, resource, sys
+
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+from electricitybot.bot import ElectricityMonitor, run_bot
+
+ElectricityMonitor()
+rss = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) * 1024
+print(json.dumps({"rss": rss, "modules": sorted(sys.modules)}))
+"""
+
+
+def import_seconds(importtime_log: str) -> float:
+    """
+    Cumulative time of top level imports of the package in `python -X importtime` log.
+    """
+    seconds = 0.0
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if name.startswith(" electricitybot"):
+            seconds += int(cumulative) / 1_000_000
+    return seconds
+
+
+def start() -> tuple[float, int, list[str]]:
+    """
+    Imports `run_bot` and builds monitor it runs in a fresh interpreter, with settings of the test environment.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP], capture_output=True, text=True, check=True
+    )
+    startup = json.loads(result.stdout)
+    return import_seconds(result.stderr), startup["rss"], startup["modules"]
+
+
+class TestStartup:
+
+    def test_startup_budget(self):
+        # best of a few runs, so a busy machine does not fail the budget
+        runs = [start() for _ in range(RUNS)]
+
+        assert_that(min(seconds for seconds, _, _ in runs), less_than(IMPORT_TIME_BUDGET))
+        assert_that(min(rss for _, rss, _ in runs), less_than(RSS_BUDGET))
+
+    def test_charts_and_telegram_are_not_loaded_at_start(self):
+        _, _, modules = start()
+
+        packages = tuple(f"{module}." for module in LAZY_MODULES)
+        assert_that([module for module in modules if module in LAZY_MODULES or module.startswith(packages)], empty())
@@ -0,0 +1,354 @@
+import shelve
+from datetime import date, datetime, timedelta
+
+import pytest
+from conftest import local_timestamp
+from freezegun import freeze_time
+from hamcrest import assert_that, contains_exactly, empty, equal_to, has_length
+
+from electricitybot.bot import PowerOutageInterval, UKRAINE_TZ
+from electricitybot.intervals import DailyStats
+from electricitybot.storage import OutageStore
+
+TARGET = "10.0.0.1"
+
+
+def add_events(store, *events):
+    for at, state in events:
+        store.append(TARGET, state, at)
+
+
+class TestOutageStore:
+
+    def test_wal_journal(self, store):
+        assert_that(store._connection.execute("PRAGMA journal_mode").fetchone()[0], equal_to("wal"))
+
+    def test_history_survives_reopen(self, store):
+        add_events(store, (100, False), (200, True))
+        store.close()
+
+        reopened_store = OutageStore(store.path)
+
+        assert_that(reopened_store.intervals(TARGET), contains_exactly((100, 200)))
+        reopened_store.close()
+
+    def test_last_event(self, store):
+        assert_that(store.last_event(TARGET), equal_to(None))
+
+        add_events(store, (100, False), (200, True), (300, False))
+
+        assert_that(store.last_event(TARGET), equal_to((300, False)))
+
+    def test_targets_are_separated(self, store):
+        add_events(store, (100, False), (200, True))
+        store.append("10.0.0.2", False, 150)
+
+        assert_that(store.intervals("10.0.0.2"), contains_exactly((150, None)))
+
+    @pytest.mark.parametrize(
+        "since, until, expected",
+        [
+            (None, None, [(100, 200), (300, 400), (500, None)]),
+            (150, 450, [(100, 200), (300, 400)]),
+            (200, 450, [(300, 400)]),
+            (350, 360, [(300, None)]),
+            (410, 490, []),
+            (600, None, [(500, None)]),
+        ],
+    )
+    def test_intervals(self, store, since, until, expected):
+        add_events(store, (100, False), (200, True), (300, False), (400, True), (500, False))
+
+        assert_that(store.intervals(TARGET, since, until), equal_to(expected))
+        assert_that(list(store.iter_intervals(TARGET, since, until)), equal_to(expected))
+
+    def test_intervals_ignore_repeated_events(self, store):
+        add_events(store, (100, True), (200, False), (250, False), (300, True), (350, True))
+
+        assert_that(store.intervals(TARGET), contains_exactly((200, 300)))
+        assert_that(list(store.iter_intervals(TARGET)), contains_exactly((200, 300)))
+
+    def test_targets(self, store):
+        add_events(store, (100, False))
+        with store._connection:
+            store._add_daily_stats("10.0.0.2", [DailyStats(date(2022, 4, 15), 60, 1, 60)])
+
+        assert_that(store.targets(), contains_exactly(TARGET, "10.0.0.2"))
+
+    def test_has_history(self, store):
+        assert_that(store.has_history(TARGET), equal_to(False))
+
+        with store._connection:
+            store._add_daily_stats(TARGET, [DailyStats(date(2022, 4, 15), 60, 1, 60)])
+        store.append("10.0.0.2", False, 100)
+
+        assert_that(
+            [store.has_history(target) for target in (TARGET, "10.0.0.2", "10.0.0.3")], equal_to([True, True, False])
+        )
+
+    def test_values(self, store):
+        assert_that(store.get_value(TARGET, "stats_last_sent_date"), equal_to(None))
+
+        store.set_value(TARGET, "stats_last_sent_date", "2022-04-15")
+        store.set_value(TARGET, "stats_last_sent_date", "2022-04-22")
+
+        assert_that(store.get_value(TARGET, "stats_last_sent_date"), equal_to("2022-04-22"))
+        assert_that(store.get_value("10.0.0.2", "stats_last_sent_date"), equal_to(None))
+
+    @freeze_time(datetime.fromtimestamp(1000))
+    @pytest.mark.parametrize(
+        "since, until, expected",
+        [
+            (None, None, [(100, 200), (300, 1000)]),
+            (150, 350, [(150, 200), (300, 350)]),
+        ],
+    )
+    def test_clipped_intervals(self, store, since, until, expected):
+        add_events(store, (100, False), (200, True), (300, False))
+
+        assert_that(store.clipped_intervals(TARGET, since, until), equal_to(expected))
+
+
+class TestRetention:
+    cutoff = local_timestamp("2022-04-15 00:00:00")
+
+    def test_compact(self, store):
+        add_events(
+            store,
+            (local_timestamp("2022-04-13 10:00:00"), False),
+            (local_timestamp("2022-04-13 12:00:00"), True),
+            (local_timestamp("2022-04-14 10:00:00"), False),
+            (local_timestamp("2022-04-14 10:30:00"), True),
+            (local_timestamp("2022-04-14 23:00:00"), False),
+            (local_timestamp("2022-04-15 01:00:00"), True),
+        )
+
+        store.compact(TARGET, self.cutoff)
+
+        assert_that(
+            store._connection.execute("SELECT time, state FROM power_events ORDER BY time").fetchall(),
+            contains_exactly((self.cutoff, 0), (self.cutoff + 3600, 1)),
+        )
+        assert_that(
+            store.daily_stats(TARGET, date(2022, 4, 1), date(2022, 5, 1)),
+            contains_exactly(
+                DailyStats(date(2022, 4, 13), 7200, 1, 7200),
+                DailyStats(date(2022, 4, 14), 5400, 2, 3600),
+                DailyStats(date(2022, 4, 15), 3600, 1, 3600),
+            ),
+        )
+
+    def test_compact_is_idempotent(self, store):
+        add_events(store, (self.cutoff - 7200, False), (self.cutoff - 3600, True), (self.cutoff + 3600, False))
+
+        store.compact(TARGET, self.cutoff)
+        store.compact(TARGET, self.cutoff)
+
+        assert_that(
+            store._connection.execute("SELECT time, state FROM power_events ORDER BY time").fetchall(),
+            contains_exactly((self.cutoff + 3600, 0)),
+        )
+        assert_that(
+            store.daily_stats(TARGET, date(2022, 4, 14), date(2022, 4, 15)),
+            contains_exactly(DailyStats(date(2022, 4, 14), 3600, 1, 3600)),
+        )
+
+    def test_compact_outage_ending_at_cutoff(self, store):
+        add_events(store, (self.cutoff - 3600, False), (self.cutoff, True))
+
+        store.compact(TARGET, self.cutoff)
+
+        assert_that(store.intervals(TARGET), empty())
+
+    def test_daily_stats_with_day_compacted_in_the_middle(self, store):
+        add_events(store, (self.cutoff + 3600, False), (self.cutoff + 7200, True), (self.cutoff + 10800, False))
+        store.compact(TARGET, self.cutoff + 9000)
+        store.append(TARGET, True, self.cutoff + 14400)
+
+        assert_that(
+            store.daily_stats(TARGET, date(2022, 4, 15), date(2022, 4, 16)),
+            contains_exactly(DailyStats(date(2022, 4, 15), 7200, 2, 3600)),
+        )
+
+
+class TestDailyStats:
+    day = date(2022, 4, 15)
+
+    def test_outage_is_added_when_it_ends(self, store):
+        add_events(
+            store,
+            (local_timestamp("2022-04-14 23:00:00"), False),
+            (local_timestamp("2022-04-15 01:00:00"), True),
+            (local_timestamp("2022-04-15 10:00:00"), False),
+            (local_timestamp("2022-04-15 10:30:00"), True),
+        )
+
+        assert_that(
+            store._connection.execute("SELECT day, outage_seconds, outage_count FROM daily_stats").fetchall(),
+            contains_exactly(("2022-04-14", 3600, 1), ("2022-04-15", 5400, 2)),
+        )
+
+    def test_repeated_events_are_added_once(self, store):
+        add_events(
+            store,
+            (local_timestamp("2022-04-15 10:00:00"), False),
+            (local_timestamp("2022-04-15 10:10:00"), False),
+            (local_timestamp("2022-04-15 11:00:00"), True),
+            (local_timestamp("2022-04-15 12:00:00"), True),
+        )
+
+        assert_that(
+            store.daily_stats(TARGET, self.day, self.day + timedelta(days=1)),
+            contains_exactly(DailyStats(self.day, 3600, 1, 3600)),
+        )
+
+    def test_outage_start(self, store):
+        assert_that(store.outage_start(TARGET), equal_to(None))
+
+        add_events(store, (100, False), (200, True), (200, False), (250, False))
+        assert_that(store.outage_start(TARGET), equal_to(200))
+
+        add_events(store, (300, True))
+        assert_that(store.outage_start(TARGET), equal_to(None))
+
+    @freeze_time(UKRAINE_TZ.localize(datetime.fromisoformat("2022-04-15 12:00:00")))
+    def test_outage_going_on_is_counted_up_to_now(self, store):
+        add_events(store, (local_timestamp("2022-04-14 22:00:00"), False))
+
+        assert_that(
+            store.daily_stats(TARGET, date(2022, 4, 14), date(2022, 4, 16)),
+            contains_exactly(DailyStats(date(2022, 4, 14), 7200, 1, 7200), DailyStats(self.day, 43200, 1, 43200)),
+        )
+        assert_that(
+            store.daily_stats(
+                TARGET, self.day, self.day + timedelta(days=1), now=local_timestamp("2022-04-15 01:00:00")
+            ),
+            contains_exactly(DailyStats(self.day, 3600, 1, 3600)),
+        )
+        assert_that(store.daily_stats(TARGET, date(2022, 4, 13), date(2022, 4, 14)), empty())
+
+    @freeze_time(UKRAINE_TZ.localize(datetime.fromisoformat("2022-04-15 01:00:00")))
+    def test_outage_going_on_is_merged_in_order_of_days(self, store):
+        add_events(store, (local_timestamp("2022-04-13 23:00:00"), False))
+        with store._connection:
+            store._add_daily_stats(
+                TARGET, [DailyStats(self.day, 600, 1, 600), DailyStats(date(2022, 4, 16), 60, 1, 60)]
+            )
+
+        assert_that(
+            list(store.iter_daily_stats(TARGET, date(2022, 4, 13), date(2022, 4, 17))),
+            contains_exactly(
+                DailyStats(date(2022, 4, 13), 3600, 1, 3600),
+                DailyStats(date(2022, 4, 14), 86400, 1, 86400),
+                DailyStats(self.day, 4200, 2, 3600),
+                DailyStats(date(2022, 4, 16), 60, 1, 60),
+            ),
+        )
+
+    def test_outage_going_on_at_compaction(self, store):
+        add_events(store, (local_timestamp("2022-04-14 23:00:00"), False))
+
+        store.compact(TARGET, local_timestamp("2022-04-15 00:00:00"))
+        add_events(store, (local_timestamp("2022-04-15 02:00:00"), True))
+
+        assert_that(
+            store.daily_stats(TARGET, date(2022, 4, 14), date(2022, 4, 16)),
+            contains_exactly(DailyStats(date(2022, 4, 14), 3600, 1, 3600), DailyStats(self.day, 7200, 1, 7200)),
+        )
+
+
+class TestMigrateShelve:
+    start_time = UKRAINE_TZ.localize(datetime.fromisoformat("2022-04-15 12:34:01"))
+
+    def create_shelve(self, tmp_path, closed_only: bool = False):
+        shelve_name = str(tmp_path / "power_outage_intervals")
+        with shelve.open(shelve_name) as db:
+            db["intervals"] = [
+                PowerOutageInterval(self.start_time, self.start_time + timedelta(hours=1)),
+                *([] if closed_only else [PowerOutageInterval(self.start_time + timedelta(hours=2))]),
+            ]
+            db["stats_last_sent_date"] = date(2022, 4, 11)
+        return shelve_name
+
+    def test_migrate_shelve(self, store, tmp_path):
+        store.migrate_shelve(TARGET, self.create_shelve(tmp_path))
+
+        assert_that(
+            store.intervals(TARGET),
+            contains_exactly(
+                (self.start_time.timestamp(), (self.start_time + timedelta(hours=1)).timestamp()),
+                ((self.start_time + timedelta(hours=2)).timestamp(), None),
+            ),
+        )
+        assert_that(store.get_value(TARGET, "stats_last_sent_date"), equal_to("2022-04-11"))
+        assert_that(
+            store._connection.execute("SELECT day, outage_seconds FROM daily_stats").fetchall(),
+            contains_exactly(("2022-04-15", 3600)),
+        )
+
+    def test_migrate_shelve_once(self, store, tmp_path):
+        shelve_name = self.create_shelve(tmp_path)
+        store.migrate_shelve(TARGET, shelve_name)
+        store.migrate_shelve(TARGET, shelve_name)
+
+        assert_that(store.intervals(TARGET), has_length(2))
+
+    def test_migrate_shelve_after_compaction(self, store, tmp_path):
+        shelve_name = self.create_shelve(tmp_path, closed_only=True)
+        store.migrate_shelve(TARGET, shelve_name)
+        store.compact(TARGET, (self.start_time + timedelta(days=1)).timestamp())
+
+        store.migrate_shelve(TARGET, shelve_name)
+
+        assert_that(store.intervals(TARGET), empty())
+        assert_that(
+            store._connection.execute("SELECT day, outage_seconds, outage_count FROM daily_stats").fetchall(),
+            contains_exactly(("2022-04-15", 3600, 1)),
+        )
+
+    def test_migrate_empty_shelve(self, store, tmp_path):
+        shelve_name = str(tmp_path / "power_outage_intervals")
+        with shelve.open(shelve_name):
+            pass
+
+        store.migrate_shelve(TARGET, shelve_name)
+
+        assert_that(store.intervals(TARGET), empty())
+        assert_that(store.get_value(TARGET, "stats_last_sent_date"), equal_to(None))
+
+    def test_migrate_without_shelve(self, store, tmp_path):
+        store.migrate_shelve(TARGET, str(tmp_path / "power_outage_intervals"))
+
+        assert_that(store.intervals(TARGET), empty())
+
+
+class TestStateChanges:
+
+    def test_queue_is_shared_between_connections(self, store):
+        probe_store = OutageStore(store.path)
+        probe_store.push_state_change(TARGET, True, 100)
+        probe_store.push_state_change(TARGET, False, 200)
+
+        changes = store.state_changes()
+        store.ack_state_change(changes[0].id)
+
+        assert_that(changes, contains_exactly((changes[0].id, TARGET, True, 100), (changes[1].id, TARGET, False, 200)))
+        assert_that(probe_store.state_changes(), contains_exactly(changes[1]))
+        probe_store.close()
+
+
+class TestRuntimeState:
+
+    def test_runtime_state(self, store):
+        assert_that(store.runtime_state(TARGET), equal_to(None))
+
+        with freeze_time("2022-04-15 12:00:00"):
+            store.save_runtime_state(TARGET, False, 1650020000.0)
+        saved_at = datetime.fromisoformat("2022-04-15 12:00:00+00:00").timestamp()
+
+        assert_that(store.runtime_state(TARGET), equal_to((False, 1650020000.0, saved_at)))
+
+        store.save_seen_at(TARGET, saved_at + 60)
+
+        assert_that(store.runtime_state(TARGET).seen_at, equal_to(saved_at + 60))
+        assert_that(store.runtime_state("10.0.0.2"), equal_to(None))